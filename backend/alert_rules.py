@@ -0,0 +1,227 @@
+"""Declarative alert rules evaluated against in-memory per-animal state.
+
+Rules are plain dicts (see DEFAULT_RULES) compiled once into ``Rule``
+objects. For every fix the engine checks each rule against the animal's
+cached values and remembers, per animal and rule, whether the condition is
+active. Alerts are produced only when that state changes:
+
+- ``trigger``   the condition became true (suppressed inside the cooldown)
+- ``escalate``  an active condition crossed its escalation threshold
+- ``resolve``   the condition cleared; the clear threshold gives hysteresis
+                (a rule with ``"clear_message": ""`` resolves silently)
+
+so a dying collar reporting every 30 s raises one LOW_BATTERY alert, not
+one per packet. Evaluating a fix costs O(rules) and never touches the
+database.
+"""
+import json
+import operator
+import threading
+from collections import namedtuple
+from datetime import timedelta
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+TRIGGER = "trigger"
+ESCALATE = "escalate"
+RESOLVE = "resolve"
+
+DEFAULT_RULES = [
+    {
+        "name": "exit",
+        "alert_type": "EXIT",
+        "field": "status",
+        "op": "==",
+        "threshold": "OUT",
+        "message": "ALERT: {name} has LEFT the farm boundary!",
+        "clear_message": "{name} is back inside the farm boundary",
+    },
+    {
+        "name": "low_battery",
+        "alert_type": "LOW_BATTERY",
+        "field": "battery_level",
+        "op": "<",
+        "threshold": 20,
+        "clear": 25,
+        "escalate": 10,
+        "cooldown": 3600,
+        "message": "LOW BATTERY: {name} has {value:g}%",
+        "escalate_message": "CRITICAL BATTERY: {name} has {value:g}%",
+        "clear_message": "BATTERY OK: {name} is back to {value:g}%",
+    },
+    {
+        "name": "low_signal",
+        "alert_type": "LOW_SIGNAL",
+        "field": "signal_strength",
+        "op": "<",
+        "threshold": 20,
+        "clear": 30,
+        "cooldown": 1800,
+        "message": "LOW SIGNAL: {name} is at {value:g}%",
+        "clear_message": "SIGNAL RESTORED: {name} is back to {value:g}%",
+    },
+]
+
+# One alert the caller should write
+AlertEvent = namedtuple("AlertEvent", ["kind", "rule", "alert_type", "message"])
+
+
+class Rule:
+    """A compiled rule; see DEFAULT_RULES for the accepted keys"""
+
+    def __init__(self, name, alert_type, field, op, threshold, message,
+                 clear=None, escalate=None, cooldown=0,
+                 escalate_message=None, clear_message=None):
+        if op not in OPERATORS:
+            raise ValueError(f"Rule {name}: unknown operator {op!r}")
+        self.name = name
+        self.alert_type = alert_type
+        self.field = field
+        self.compare = OPERATORS[op]
+        self.threshold = threshold
+        self.clear = threshold if clear is None else clear
+        self.escalate = escalate
+        self.cooldown = timedelta(seconds=cooldown)
+        self.message = message
+        self.escalate_message = escalate_message or message
+        if clear_message is None:
+            clear_message = f"RESOLVED: {{name}} {field} is back to {{value}}"
+        self.clear_message = clear_message
+
+    def event(self, kind, animal, value):
+        if kind == TRIGGER:
+            template, alert_type = self.message, self.alert_type
+        elif kind == ESCALATE:
+            template, alert_type = self.escalate_message, self.alert_type
+        else:
+            template, alert_type = self.clear_message, f"{self.alert_type}_CLEARED"
+        return AlertEvent(kind, self.name, alert_type, template.format(name=animal.name, value=value))
+
+
+def compile_rules(specs):
+    """Compile rule dicts, raising ValueError on a malformed rule"""
+    rules = []
+    for spec in specs:
+        try:
+            rules.append(Rule(**spec))
+        except TypeError as e:
+            raise ValueError(f"Invalid alert rule {spec.get('name')!r}: {e}")
+    if len({r.name for r in rules}) != len(rules):
+        raise ValueError("Alert rule names must be unique")
+    return rules
+
+
+def load_rules(path=None):
+    """Rules from a JSON file (a list of rule dicts), or the defaults"""
+    if not path:
+        return compile_rules(DEFAULT_RULES)
+    with open(path) as f:
+        return compile_rules(json.load(f))
+
+
+class _RuleState:
+    __slots__ = ("active", "escalated", "notified", "last_fired")
+
+    def __init__(self, active=False):
+        self.active = active
+        self.escalated = False
+        # False while a trigger inside the cooldown was swallowed
+        self.notified = active
+        self.last_fired = None
+
+
+class AlertEngine:
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._states = {}
+        self._lock = threading.Lock()
+        self.evaluations = 0
+        self.fired = 0
+        self.suppressed = 0
+
+    def prime(self, animal):
+        """Adopt an unseen animal's current values as its baseline, silently.
+
+        Called before a fix is applied, so conditions that were already true
+        (and alerted on before a restart or a bulk update) do not fire again.
+        """
+        with self._lock:
+            if animal.id in self._states:
+                return
+            states = []
+            for rule in self.rules:
+                value = getattr(animal, rule.field, None)
+                states.append(_RuleState(value is not None and rule.compare(value, rule.threshold)))
+            self._states[animal.id] = states
+
+    def evaluate(self, animal, now):
+        """Check every rule against the animal's values; returns AlertEvents"""
+        events = []
+        with self._lock:
+            states = self._states.get(animal.id)
+            if states is None:
+                states = self._states[animal.id] = [_RuleState() for _ in self.rules]
+            self.evaluations += 1
+
+            for rule, state in zip(self.rules, states):
+                value = getattr(animal, rule.field, None)
+                if value is None:
+                    continue
+
+                if not state.active:
+                    if not rule.compare(value, rule.threshold):
+                        continue
+                    state.active = True
+                    if state.last_fired is not None and now - state.last_fired < rule.cooldown:
+                        state.notified = False
+                        self.suppressed += 1
+                        continue
+                    state.notified = True
+                    state.last_fired = now
+                    events.append(rule.event(TRIGGER, animal, value))
+                elif rule.compare(value, rule.clear):
+                    if (rule.escalate is not None and not state.escalated
+                            and rule.compare(value, rule.escalate)):
+                        state.escalated = True
+                        if not state.notified and now - state.last_fired < rule.cooldown:
+                            # The trigger was swallowed by the cooldown; so is its escalation
+                            self.suppressed += 1
+                            continue
+                        state.notified = True
+                        state.last_fired = now
+                        events.append(rule.event(ESCALATE, animal, value))
+                else:
+                    if state.notified and rule.clear_message:
+                        events.append(rule.event(RESOLVE, animal, value))
+                    state.active = False
+                    state.escalated = False
+
+            self.fired += len(events)
+        return events
+
+    def forget(self, *animal_ids):
+        """Drop state for animals changed outside the engine; they are primed again"""
+        with self._lock:
+            for animal_id in animal_ids:
+                self._states.pop(animal_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rules": [r.name for r in self.rules],
+                "animals": len(self._states),
+                "evaluations": self.evaluations,
+                "fired": self.fired,
+                "suppressed": self.suppressed
+            }
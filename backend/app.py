@@ -1,11 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from datetime import datetime
-import math
+from datetime import date, datetime, timedelta
+import atexit
+import json
 import os
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+import numpy as np
+from sqlalchemy import MetaData, Table, and_, bindparam, cast, delete, func, insert, inspect, or_, select, text, update
+from sqlalchemy.orm import joinedload
+
+from alert_rules import RESOLVE, AlertEngine, load_rules
+from events import EventHub, HubFull
+from geofence import CircleZone, GeofenceConfig, PolygonZone, get_config, get_zone_index, set_config, zone_from_dict
+from heatmap import HOUR, MAX_LEVEL, bin_positions, bucket_ranges, cell_center, cell_deg, cell_of, coarsen, level_for_zoom, tile_bounds
+from ingest import BINARY_CONTENT_TYPE, MAX_BATCH_FIXES, fix_from_json, fix_from_record, parse_timestamp, unpack_records
+from ingest_queue import ACK_AFTER_ENQUEUE, ACK_AFTER_FLUSH, QueueFull, WriteBehindQueue
+from maintenance import BATCH_SIZE, PAUSE_SECONDS, RETENTION, cutoff, hourly_rollups
+from metrics import RequestMetrics
+from movement import TOTAL_COLUMNS, Tail, empty_totals, fold_fixes, summarize
+from pagination import keyset_page, page_size
+from registry import AnimalState, DeviceRegistry
+from simplify import simplify_track
+from simulator import HerdSimulator
+from spatial import DEFAULT_CELL_DEG, ClusterIndex
+from storage import engine_options, ensure_indexes, tune_engine
+from trackstore import CHUNK_SECONDS, chunk_start, decode_fixes, encode_fixes, from_epoch, to_epoch, to_micro
 
 app = Flask(__name__)
-CORS(app)
+# Browsers on another origin may only read response headers that are exposed
+CORS(app, expose_headers=["ETag", "Link", "X-Next-Cursor", "X-Herd-Version"])
 
 # Database configuration
 # Use DATABASE_URL from environment (Render) or fallback to absolute path
@@ -19,11 +45,38 @@ else:
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
 # Initialize SQLAlchemy AFTER configuring the URI
 from flask_sqlalchemy import SQLAlchemy
 db = SQLAlchemy(app)
 
+with app.app_context():
+    tune_engine(db.engine)
+
+# ============ INSTRUMENTATION ============
+
+# SLOW_REQUEST_MS turns on the slow-request log (with each request's SQL)
+request_metrics = RequestMetrics(slow_ms=float(os.environ["SLOW_REQUEST_MS"]) if os.environ.get("SLOW_REQUEST_MS") else None)
+
+with app.app_context():
+    request_metrics.instrument_engine(db.engine)
+
+@app.before_request
+def start_request_metrics():
+    request_metrics.start()
+
+@app.after_request
+def record_request_metrics(response):
+    request_metrics.finish(
+        request.method,
+        request.url_rule.rule if request.url_rule else "unmatched",
+        response.status_code,
+        request.content_length,
+        None if response.is_streamed else response.calculate_content_length()
+    )
+    return response
+
 # ============ MODELS ============
 
 class User(db.Model):
@@ -44,7 +97,18 @@ class Animal(db.Model):
     battery_level = db.Column(db.Float, default=100)
     signal_strength = db.Column(db.Float, default=100)
     last_seen = db.Column(db.DateTime)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    version = db.Column(db.Integer, default=0, index=True)  # change version for delta sync
+
+class AnimalTombstone(db.Model):
+    """Records deleted animals so delta sync clients can drop them"""
+    animal_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, index=True)
+
+class SyncCounter(db.Model):
+    """Single-row, monotonically increasing herd change version"""
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Integer, default=0)
 
 class Geofence(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -52,20 +116,113 @@ class Geofence(db.Model):
     center_lat = db.Column(db.Float, default=-1.2921)
     center_lng = db.Column(db.Float, default=36.8219)
     radius_km = db.Column(db.Float, default=0.5)
+    version = db.Column(db.Integer, default=0)  # bumped on every fence or zone change
+
+class GeofenceZone(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    zone_type = db.Column(db.String(20), default="paddock")
+    shape = db.Column(db.String(10), default="circle")
+    center_lat = db.Column(db.Float)
+    center_lng = db.Column(db.Float)
+    radius_km = db.Column(db.Float)
+    points = db.Column(db.Text)  # JSON list of [lat, lng] for polygons
+
+    def to_zone(self):
+        if self.shape == "polygon":
+            return PolygonZone(self.name, json.loads(self.points), self.zone_type)
+        return CircleZone(self.name, self.center_lat, self.center_lng, self.radius_km, self.zone_type)
 
 class Alert(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    animal_id = db.Column(db.Integer, db.ForeignKey('animal.id'))
+    animal_id = db.Column(db.Integer, db.ForeignKey('animal.id'), index=True)
     alert_type = db.Column(db.String(20))
     message = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_read = db.Column(db.Boolean, default=False)
     animal = db.relationship('Animal', backref='alerts')
+    
+    # Serves the newest-first unread feed and its keyset pagination
+    __table_args__ = (db.Index('ix_alert_feed', 'is_read', 'created_at', 'id'),)
+
+class AlertCounter(db.Model):
+    """Unread alerts per type, kept in step with every alert insert and read"""
+    alert_type = db.Column(db.String(20), primary_key=True)
+    unread = db.Column(db.Integer, default=0)
+
+class PositionChunk(db.Model):
+    """A time partition of one animal's fixes, delta/varint encoded (see trackstore)"""
+    animal_id = db.Column(db.Integer, db.ForeignKey('animal.id'), primary_key=True)
+    start = db.Column(db.Integer, primary_key=True)  # epoch seconds
+    count = db.Column(db.Integer, default=0)
+    last_ts = db.Column(db.Integer)
+    last_lat = db.Column(db.Integer)  # micro-degrees
+    last_lng = db.Column(db.Integer)
+    data = db.Column(db.LargeBinary, default=b"")
+    
+    # Finds the oldest chunks for retention
+    __table_args__ = (db.Index('ix_position_chunk_start', 'start', 'animal_id'),)
+
+class PositionRollup(db.Model):
+    """One animal's fixes in one hour, downsampled from chunks past their retention"""
+    animal_id = db.Column(db.Integer, db.ForeignKey('animal.id'), primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True)  # epoch start of the hour
+    fixes = db.Column(db.Integer, default=0)
+    lat = db.Column(db.Float)  # mean position
+    lng = db.Column(db.Float)
+
+class OccupancyCell(db.Model):
+    """Fixes seen in one heatmap grid cell during one hour or day (see heatmap.py)"""
+    period = db.Column(db.Integer, primary_key=True)  # bucket length in seconds
+    bucket = db.Column(db.Integer, primary_key=True)  # epoch start of the bucket
+    lat_cell = db.Column(db.Integer, primary_key=True)
+    lng_cell = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, default=0)
+
+class AnimalDayStats(db.Model):
+    """One animal's movement totals for one UTC day, folded in on ingest (see movement.py)"""
+    animal_id = db.Column(db.Integer, db.ForeignKey('animal.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    fixes = db.Column(db.Integer, default=0)
+    distance_m = db.Column(db.Float, default=0)
+    moving_seconds = db.Column(db.Integer, default=0)
+    idle_seconds = db.Column(db.Integer, default=0)
+    inside_seconds = db.Column(db.Integer, default=0)
+    outside_seconds = db.Column(db.Integer, default=0)
+    max_speed_ms = db.Column(db.Float, default=0)
+    # The last fix folded in, where the next segment starts
+    last_ts = db.Column(db.Integer)
+    last_lat = db.Column(db.Float)
+    last_lng = db.Column(db.Float)
+    last_status = db.Column(db.String(10))
+    
+    # Serves the herd-wide view of one day
+    __table_args__ = (db.Index('ix_animal_day_stats_day', 'day', 'animal_id'),)
 
 # Create tables and default data
 with app.app_context():
     db.create_all()
     
+    # create_all() does not alter existing tables, so add columns introduced later
+    if "version" not in {c["name"] for c in inspect(db.engine).get_columns("animal")}:
+        db.session.execute(text("ALTER TABLE animal ADD COLUMN version INTEGER DEFAULT 0"))
+        db.session.commit()
+    if "version" not in {c["name"] for c in inspect(db.engine).get_columns("geofence")}:
+        db.session.execute(text("ALTER TABLE geofence ADD COLUMN version INTEGER DEFAULT 0"))
+        db.session.commit()
+    ensure_indexes(db.engine, db.metadata)
+    
+    if not AlertCounter.query.first():
+        # Counters are new (or were never populated): build them from the unread alerts
+        counts = db.session.query(Alert.alert_type, func.count()).filter_by(is_read=False).group_by(Alert.alert_type)
+        db.session.add_all(AlertCounter(alert_type=t, unread=n) for t, n in counts)
+        db.session.commit()
+    
+    if not db.session.get(SyncCounter, 1):
+        db.session.add(SyncCounter(id=1, value=0))
+        db.session.commit()
+    
     # Create default admin user if not exists
     if not User.query.filter_by(email='admin@farm.com').first():
         admin = User(email='admin@farm.com', password='admin123', name='Admin User')
@@ -80,25 +237,431 @@ with app.app_context():
         db.session.commit()
         print("Default geofence created")
 
-# Farm center coordinates
-FARM_CENTER_LAT = -1.2921
-FARM_CENTER_LNG = 36.8219
-FARM_RADIUS_KM = 0.5
+def herd_version():
+    return db.session.query(SyncCounter.value).filter_by(id=1).scalar() or 0
+
+# Versions claimed by this process that sync_device_cache() has not passed yet
+_own_versions = set()
+
+def next_version():
+    """Claim the next change version. Holds the counter row until the caller commits.
+    
+    Holding the row is what makes versions commit in order: a client that
+    synced up to version N can never miss a change stamped N or lower that
+    commits later. A sequence would not give that guarantee. The cost is
+    that every herd write serialises on this row. On SQLite writers are
+    serialised anyway. On Postgres the row is the write ceiling, so claim
+    the version as late in the transaction as possible (see commit_states).
+    """
+    version = db.session.execute(
+        update(SyncCounter).where(SyncCounter.id == 1).values(value=SyncCounter.value + 1).returning(SyncCounter.value)
+    ).scalar_one()
+    _own_versions.add(version)
+    return version
+
+def versioned_listing(serialize):
+    """Serve the herd with ETag revalidation and ``?since=<version>`` deltas.
+    
+    Without ``since`` the body is the full list, as before. With it, the body
+    is ``{"version", "animals", "deleted"}`` holding only animals changed and
+    IDs deleted after that version; clients apply ``deleted`` first.
+    """
+    since = request.args.get("since", type=int)
+    version = herd_version()
+    etag = f"herd-{version}" if since is None else f"herd-{version}-since-{since}"
+    
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    elif since is None:
+        response = jsonify([serialize(a) for a in Animal.query.all()])
+    else:
+        changed = Animal.query.filter(Animal.version > since).all()
+        deleted = db.session.query(AnimalTombstone.animal_id).filter(AnimalTombstone.version > since)
+        response = jsonify({
+            "version": version,
+            "animals": [serialize(a) for a in changed],
+            "deleted": [row.animal_id for row in deleted]
+        })
+    
+    response.set_etag(etag, weak=True)
+    response.headers["X-Herd-Version"] = str(version)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+# How often a worker checks whether another worker changed the fence
+GEOFENCE_CHECK_SECONDS = float(os.environ.get("GEOFENCE_CHECK_SECONDS", 2))
+_geofence_checked_at = datetime.min
+
+def build_geofence_config():
+    """A GeofenceConfig for the fence and zones as this session sees them"""
+    geo = Geofence.query.first()
+    zones = [z.to_zone() for z in GeofenceZone.query.all()]
+    return GeofenceConfig(geo.version or 0, geo.center_lat, geo.center_lng, geo.radius_km, zones)
+
+def load_geofence_config():
+    """Build a fresh GeofenceConfig from the database and make it active"""
+    return set_config(build_geofence_config())
+
+def bump_geofence_version():
+    """Mark the fence as changed; commit, then call load_geofence_config()"""
+    db.session.execute(update(Geofence).values(version=Geofence.version + 1))
+
+@app.before_request
+def refresh_geofence_config():
+    """Reload the fence if another worker changed it, checking at most every few seconds"""
+    global _geofence_checked_at
+    now = datetime.utcnow()
+    if now - _geofence_checked_at < timedelta(seconds=GEOFENCE_CHECK_SECONDS):
+        return
+    _geofence_checked_at = now
+    version = db.session.query(Geofence.version).limit(1).scalar() or 0
+    if version != get_config().version:
+        load_geofence_config()
+
+with app.app_context():
+    load_geofence_config()
 
 def check_geofence(lat, lng):
     try:
-        R = 6371
-        lat1_rad = math.radians(FARM_CENTER_LAT)
-        lat2_rad = math.radians(lat)
-        delta_lat = math.radians(lat - FARM_CENTER_LAT)
-        delta_lng = math.radians(lng - FARM_CENTER_LNG)
-        a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        distance = R * c
-        return "IN" if distance <= FARM_RADIUS_KM else "OUT"
+        return get_zone_index().status(lat, lng)
     except:
         return "IN"
 
+def check_geofence_many(lats, lngs):
+    """Vectorised check_geofence: an array of IN/OUT for arrays of lat/lng"""
+    inside = get_zone_index().inside_many(lats, lngs)
+    return np.where(inside, "IN", "OUT")
+
+def count_alerts(alert_types, delta=1):
+    """Adjust the unread counters for alerts inserted (delta=1) or read (delta=-1).
+    
+    Runs in the caller's transaction so counters and alerts commit together.
+    """
+    counts = Counter(alert_types)
+    if not counts:
+        return
+    db.session.execute(
+        text("INSERT INTO alert_counter (alert_type, unread) VALUES (:alert_type, :unread) "
+             "ON CONFLICT (alert_type) DO UPDATE SET unread = alert_counter.unread + excluded.unread"),
+        [{"alert_type": t, "unread": n * delta} for t, n in counts.items()]
+    )
+
+def insert_alerts(rows, names=None):
+    """Bulk insert alert rows (animal_id, alert_type, message) and count the unread ones.
+    
+    A row may set ``is_read`` to store a notice that should not wait in the
+    unread feed. Returns the new alerts serialised for the live stream;
+    ``names`` maps animal IDs to names for those payloads.
+    """
+    if not rows:
+        return []
+    inserted = db.session.execute(
+        insert(Alert).returning(Alert.id, Alert.animal_id, Alert.alert_type, Alert.message, Alert.created_at, Alert.is_read),
+        [dict({"is_read": False}, **row) for row in rows]
+    ).all()
+    count_alerts(a.alert_type for a in inserted if not a.is_read)
+    names = names or {}
+    return [alert_delta(a, names.get(a.animal_id)) for a in inserted]
+
+def exit_alert_rows(animals, message="ALERT: {name} has LEFT the farm boundary!"):
+    """EXIT alert rows for animals carrying ``id`` and ``name``"""
+    return [{"animal_id": a.id, "alert_type": "EXIT", "message": message.format(name=a.name)} for a in animals]
+
+def insert_exit_alerts(animals, message="ALERT: {name} has LEFT the farm boundary!"):
+    """Bulk insert EXIT alerts for rows carrying ``id`` and ``name``"""
+    return insert_alerts(exit_alert_rows(animals, message), {a.id: a.name for a in animals})
+
+def recheck_herd():
+    """Re-evaluate every animal against the current zones after a fence edit"""
+    rows = db.session.query(Animal.id, Animal.name, Animal.lat, Animal.lng, Animal.status).all()
+    if not rows:
+        return 0
+    
+    lats = np.array([r.lat for r in rows], dtype=float)
+    lngs = np.array([r.lng for r in rows], dtype=float)
+    statuses = check_geofence_many(lats, lngs)
+    
+    changed = [(r, str(s)) for r, s in zip(rows, statuses) if r.status != s]
+    new_alerts = []
+    if changed:
+        version = next_version()
+        db.session.execute(update(Animal), [{"id": r.id, "status": s, "version": version} for r, s in changed])
+        new_alerts = insert_exit_alerts([r for r, s in changed if r.status == "IN" and s == "OUT"])
+    db.session.commit()
+    
+    for r, s in changed:
+        device_registry.patch(r.id, status=s)
+    alert_engine.forget(*(r.id for r, s in changed))
+    publish_deltas([{"id": r.id, "status": s} for r, s in changed], new_alerts)
+    return len(changed)
+
+# ============ LIVE STREAM ============
+
+event_hub = EventHub()
+
+def animal_delta(animal):
+    """The fields of an animal that ingest changes, as pushed to the stream"""
+    return {
+        "id": animal.id,
+        "lat": animal.lat,
+        "lng": animal.lng,
+        "status": animal.status,
+        "battery_level": animal.battery_level,
+        "signal_strength": animal.signal_strength,
+        "last_seen": animal.last_seen.isoformat() if animal.last_seen else None
+    }
+
+def alert_delta(alert, animal_name=None):
+    return {
+        "id": alert.id,
+        "animal_id": alert.animal_id,
+        "animal_name": animal_name or "Unknown",
+        "alert_type": alert.alert_type,
+        "message": alert.message,
+        "created_at": alert.created_at.isoformat()
+    }
+
+def publish_deltas(positions=(), alerts=()):
+    """Push committed changes to every stream subscriber"""
+    if positions:
+        event_hub.publish("positions", list(positions))
+    if alerts:
+        event_hub.publish("alerts", list(alerts))
+
+def commit_and_publish(animals, new_alerts=()):
+    """Commit the session, then publish the given animals and serialised alerts.
+    
+    Animal payloads are built before the commit, so serialising them never
+    triggers a refresh query on expired instances.
+    """
+    positions = [animal_delta(a) for a in animals]
+    db.session.commit()
+    publish_deltas(positions, new_alerts)
+
+# ============ POSITION HISTORY ============
+
+CHUNKS = PositionChunk.__table__
+# What appending needs from an existing chunk; the data blob itself is not read
+CHUNK_TAIL = [CHUNKS.c[name] for name in ("animal_id", "start", "count", "last_ts", "last_lat", "last_lng")]
+
+# Creates the chunks a batch is about to extend, so every append is an UPDATE
+# of a row that exists. The upsert also takes SQLite's write lock, and on other
+# backends the tail SELECT locks the rows FOR UPDATE, so concurrent appends for
+# one animal queue up instead of both extending the tail they read.
+CLAIM_CHUNKS = text(
+    "INSERT INTO position_chunk (animal_id, start, count, data) VALUES (:animal_id, :start, 0, :data) "
+    "ON CONFLICT (animal_id, start) DO NOTHING"
+)
+
+def append_positions(positions):
+    """Append fixes to their animals' position chunks. The caller commits.
+    
+    Uses Core statements (one upsert to claim the chunks, one SELECT per
+    500 chunks, then one executemany of updates) rather than ORM objects,
+    as a gateway flush can touch thousands of chunks. The new bytes are
+    appended in SQL, so a chunk's data is never read back.
+    """
+    groups = {}
+    for animal_id, seen_at, lat, lng, _ in positions:
+        if lat is None or lng is None:
+            continue
+        ts = to_epoch(seen_at)
+        groups.setdefault((animal_id, chunk_start(ts)), []).append((ts, to_micro(lat), to_micro(lng)))
+    if not groups:
+        return
+    
+    db.session.execute(CLAIM_CHUNKS, [{"animal_id": a, "start": s, "data": b""} for a, s in sorted(groups)])
+    
+    # A batch spans one or two chunk periods; a plain IN per period is far
+    # cheaper than a row-value IN over (animal_id, start) pairs
+    animals_by_start = {}
+    for animal_id, start in groups:
+        animals_by_start.setdefault(start, []).append(animal_id)
+    existing = {}
+    for start, animal_ids in animals_by_start.items():
+        for ids in _chunks(sorted(animal_ids)):
+            rows = db.session.execute(
+                select(*CHUNK_TAIL).where(CHUNKS.c.start == start, CHUNKS.c.animal_id.in_(ids))
+                .order_by(CHUNKS.c.animal_id).with_for_update()
+            )
+            for row in rows:
+                existing[(row.animal_id, row.start)] = row
+    
+    updates = []
+    for (animal_id, start), fixes in groups.items():
+        row = existing[(animal_id, start)]
+        last_ts, last_lat, last_lng = fixes[-1]
+        # A chunk claimed by this batch has no tail yet
+        previous = (row.last_ts, row.last_lat, row.last_lng) if row.last_ts is not None else None
+        updates.append({
+            "chunk_animal_id": animal_id, "chunk_start": start, "count": row.count + len(fixes),
+            "last_ts": last_ts, "last_lat": last_lat, "last_lng": last_lng,
+            "tail": encode_fixes(fixes, previous)
+        })
+    
+    db.session.execute(CHUNKS.update().where(and_(
+        CHUNKS.c.animal_id == bindparam("chunk_animal_id"),
+        CHUNKS.c.start == bindparam("chunk_start")
+    )).values(data=cast(CHUNKS.c.data.op("||")(bindparam("tail")), db.LargeBinary)), updates)
+
+def record_occupancy(positions):
+    """Add fixes to the heatmap's per-cell counts. The caller commits."""
+    counts = bin_positions(positions)
+    if not counts:
+        return
+    db.session.execute(
+        text("INSERT INTO occupancy_cell (period, bucket, lat_cell, lng_cell, count) "
+             "VALUES (:period, :bucket, :lat_cell, :lng_cell, :count) "
+             "ON CONFLICT (period, bucket, lat_cell, lng_cell) DO UPDATE SET count = occupancy_cell.count + excluded.count"),
+        [{"period": p, "bucket": b, "lat_cell": y, "lng_cell": x, "count": n} for (p, b, y, x), n in counts.items()]
+    )
+
+DAY_STATS = AnimalDayStats.__table__
+# Claims the day rows a batch folds into, for the same reason as CLAIM_CHUNKS
+CLAIM_DAYS = text(
+    "INSERT INTO animal_day_stats (animal_id, day, " + ", ".join(TOTAL_COLUMNS) + ") "
+    "VALUES (:animal_id, :day" + ", 0" * len(TOTAL_COLUMNS) + ") "
+    "ON CONFLICT (animal_id, day) DO NOTHING"
+).bindparams(bindparam("day", type_=db.Date))
+
+def record_movement(positions):
+    """Fold fixes into each animal's daily movement stats. The caller commits.
+    
+    Like append_positions, only the stats rows of the days touched (and the
+    day before, for the first fix of a new day) are read, never the history,
+    and they are claimed and locked before they are read.
+    """
+    groups = {}
+    for animal_id, seen_at, lat, lng, status in positions:
+        if lat is None or lng is None:
+            continue
+        groups.setdefault((animal_id, seen_at.date()), []).append(Tail(to_epoch(seen_at), lat, lng, status))
+    if not groups:
+        return
+    
+    db.session.execute(CLAIM_DAYS, [{"animal_id": a, "day": d} for a, d in sorted(groups)])
+    
+    animals_by_day = {}
+    for animal_id, day in groups:
+        animals_by_day.setdefault(day, []).append(animal_id)
+    existing = {}
+    for day, animal_ids in animals_by_day.items():
+        for ids in _chunks(sorted(animal_ids)):
+            rows = db.session.execute(select(DAY_STATS).where(
+                DAY_STATS.c.day.in_([day, day - timedelta(days=1)]), DAY_STATS.c.animal_id.in_(ids)
+            ).order_by(DAY_STATS.c.animal_id, DAY_STATS.c.day).with_for_update())
+            for row in rows:
+                # Rows claimed by this batch have nothing folded in yet
+                if row.last_ts is not None:
+                    existing[(row.animal_id, row.day)] = row
+    
+    updates = []
+    tails = {}
+    for animal_id, day in sorted(groups):
+        row = existing.get((animal_id, day))
+        if row is not None:
+            totals = {column: getattr(row, column) for column in TOTAL_COLUMNS}
+            tail = Tail(row.last_ts, row.last_lat, row.last_lng, row.last_status)
+        else:
+            totals = empty_totals()
+            tail = tails.get(animal_id)
+            previous = existing.get((animal_id, day - timedelta(days=1)))
+            if tail is None and previous is not None:
+                tail = Tail(previous.last_ts, previous.last_lat, previous.last_lng, previous.last_status)
+        
+        tail = tails[animal_id] = fold_fixes(totals, tail, groups[(animal_id, day)])
+        updates.append(dict(totals, last_ts=tail.ts, last_lat=tail.lat, last_lng=tail.lng, last_status=tail.status,
+                            stats_animal_id=animal_id, stats_day=day))
+    
+    db.session.execute(DAY_STATS.update().where(and_(
+        DAY_STATS.c.animal_id == bindparam("stats_animal_id"),
+        DAY_STATS.c.day == bindparam("stats_day")
+    )), updates)
+
+def read_positions(animal_id, start, end):
+    """Decode the fixes of one animal between two epoch timestamps"""
+    chunks = PositionChunk.query.filter(
+        PositionChunk.animal_id == animal_id,
+        PositionChunk.start >= chunk_start(start),
+        PositionChunk.start <= end
+    ).order_by(PositionChunk.start)
+    for chunk in chunks:
+        yield from decode_fixes(chunk.data, start, end)
+
+# ============ DEVICE REGISTRY ============
+
+STATE_COLUMNS = [getattr(Animal, field) for field in AnimalState.FIELDS]
+
+def load_device_states(device_ids):
+    states = []
+    for chunk in _chunks(device_ids):
+        rows = db.session.query(*STATE_COLUMNS).filter(Animal.device_id.in_(chunk)).all()
+        states.extend(AnimalState(**row._asdict()) for row in rows)
+    return states
+
+device_registry = DeviceRegistry(load_device_states, max_size=int(os.environ.get("DEVICE_CACHE_SIZE", 50000)))
+
+with app.app_context():
+    _herd_seen = herd_version()
+    rows = db.session.query(*STATE_COLUMNS).limit(device_registry.max_size).all()
+    device_registry.warm(AnimalState(**row._asdict()) for row in rows)
+
+# Alert rules are compiled once; ALERT_RULES_FILE may point at a JSON list of rules
+alert_engine = AlertEngine(load_rules(os.environ.get("ALERT_RULES_FILE")))
+
+@app.before_request
+def sync_device_cache():
+    """Drop cached states of animals another process changed or deleted.
+    
+    Every path in this process that changes an animal invalidates its
+    cache entry itself. Writes from other processes (API workers, the
+    gateway, the simulator) only show in the herd version, so compare it
+    with the version last seen here and evict the animals stamped with a
+    version this process did not claim, plus any deleted since. Runs
+    before every request and every flush; costs one query when nothing
+    changed.
+    """
+    global _herd_seen
+    version = herd_version()
+    if version == _herd_seen:
+        return
+    own = [v for v in list(_own_versions) if v > _herd_seen]
+    changed = db.session.query(Animal.id).filter(Animal.version > _herd_seen, Animal.version.notin_(own))
+    deleted = db.session.query(AnimalTombstone.animal_id).filter(AnimalTombstone.version > _herd_seen)
+    ids = [row[0] for row in changed.union_all(deleted)]
+    for animal_id in ids:
+        device_registry.invalidate_animal(animal_id)
+    alert_engine.forget(*ids)
+    _own_versions.difference_update([v for v in list(_own_versions) if v <= version])
+    _herd_seen = version
+
+# Core executemany keyed on a bound id; far cheaper than an ORM bulk update per row
+STATE_UPDATE = Animal.__table__.update().where(Animal.__table__.c.id == bindparam("state_id"))
+
+def commit_states(states, positions=(), alerts=()):
+    """Write cached animal states back with one UPDATE, commit and publish.
+    
+    ``positions`` are (animal_id, datetime, lat, lng, status) fixes appended
+    to the position history, heatmap and movement stats, and ``alerts`` are
+    alert rows inserted, all in the same transaction. If anything fails the states are dropped from the
+    cache so the next lookup reloads them from the database.
+    """
+    try:
+        append_positions(positions)
+        record_occupancy(positions)
+        record_movement(positions)
+        new_alerts = insert_alerts(list(alerts), {s.id: s.name for s in states})
+        if states:
+            # Last, so the version row is held only for this statement and the commit
+            version = next_version()
+            db.session.execute(STATE_UPDATE, [dict(s.values(), state_id=s.id, version=version) for s in states])
+        commit_and_publish(states, new_alerts)
+    except Exception:
+        db.session.rollback()
+        device_registry.invalidate(*(s.device_id for s in states))
+        alert_engine.forget(*(s.id for s in states))
+        raise
+
 # ============ AUTH ROUTES ============
 
 @app.route("/api/login", methods=["POST"])
@@ -155,12 +718,18 @@ def animals():
             device_id=data.get("device_id", ""),
             ear_tag=data.get("ear_tag"),
             species=data.get("species", "cattle"),
-            lat=FARM_CENTER_LAT,
-            lng=FARM_CENTER_LNG,
-            status="IN"
+            lat=get_config().center_lat,
+            lng=get_config().center_lng,
+            status="IN",
+            version=next_version()
         )
         db.session.add(animal)
+        db.session.flush()
+        # SQLite can reuse the ID of the last deleted animal
+        AnimalTombstone.query.filter_by(animal_id=animal.id).delete()
         db.session.commit()
+        device_registry.invalidate(animal.device_id)
+        event_hub.publish("herd", {"added": [animal.id]})
         
         return jsonify({
             "success": True,
@@ -174,9 +743,8 @@ def animals():
             }
         })
     
-    # GET request - return all animals
-    animals_list = Animal.query.all()
-    return jsonify([{
+    # GET request - return all animals (or the changes since a version)
+    return versioned_listing(lambda a: {
         "id": a.id,
         "name": a.name,
         "device_id": a.device_id,
@@ -188,7 +756,7 @@ def animals():
         "battery_level": a.battery_level,
         "signal_strength": a.signal_strength,
         "last_seen": a.last_seen.isoformat() if a.last_seen else None
-    } for a in animals_list])
+    })
 
 @app.route("/api/animals/<int:id>", methods=["GET", "PUT", "DELETE"])
 def animal_detail(id):
@@ -229,73 +797,630 @@ def animal_detail(id):
         animal.species = data.get("species", animal.species)
         if new_device_id:
             animal.device_id = new_device_id
+        animal.version = next_version()
         db.session.commit()
+        device_registry.invalidate_animal(id)
+        device_registry.invalidate(animal.device_id)
+        alert_engine.forget(id)
+        event_hub.publish("herd", {"updated": [id]})
         return jsonify({"success": True})
     
     if request.method == "DELETE":
+        PositionChunk.query.filter_by(animal_id=id).delete()
+        PositionRollup.query.filter_by(animal_id=id).delete()
+        AnimalDayStats.query.filter_by(animal_id=id).delete()
+        db.session.merge(AnimalTombstone(animal_id=id, version=next_version()))
         db.session.delete(animal)
         db.session.commit()
+        device_registry.invalidate_animal(id)
+        alert_engine.forget(id)
+        event_hub.publish("herd", {"deleted": [id]})
         return jsonify({"success": True})
 
+@app.route("/api/animals/<int:id>/positions", methods=["GET"])
+def animal_positions(id):
+    """Position history for an animal, decoded only for the requested window"""
+    animal = Animal.query.get_or_404(id)
+    
+    try:
+        end = parse_timestamp(request.args.get("end")) or datetime.utcnow()
+        start = parse_timestamp(request.args.get("start")) or end - timedelta(days=1)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid start or end"}), 400
+    
+    positions = list(read_positions(animal.id, to_epoch(start), to_epoch(end)))
+    total = len(positions)
+    
+    # Optional simplification: zoom (map zoom level), tolerance (m) and/or max_points
+    zoom = request.args.get("zoom", type=float)
+    tolerance = request.args.get("tolerance", type=float)
+    max_points = request.args.get("max_points", type=int)
+    if zoom is not None or tolerance is not None or max_points is not None:
+        keep = simplify_track(
+            [p[1] for p in positions], [p[2] for p in positions],
+            zoom=zoom, tolerance_m=tolerance, max_points=max_points
+        )
+        positions = [positions[i] for i in keep]
+    
+    # Fixes past the position retention survive only as hourly rollups
+    first_hour = to_epoch(start) - to_epoch(start) % HOUR
+    rollups = PositionRollup.query.filter(
+        PositionRollup.animal_id == animal.id, PositionRollup.hour.between(first_hour, to_epoch(end))
+    ).order_by(PositionRollup.hour).all()
+    
+    return jsonify({
+        "animal_id": animal.id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "total_points": total,
+        "positions": [{
+            "lat": lat,
+            "lng": lng,
+            "timestamp": from_epoch(ts).isoformat()
+        } for ts, lat, lng in positions],
+        "hourly": [{
+            "lat": r.lat,
+            "lng": r.lng,
+            "fixes": r.fixes,
+            "timestamp": from_epoch(r.hour).isoformat()
+        } for r in rollups]
+    })
+
+@app.route("/api/animals/<int:id>/stats", methods=["GET"])
+def animal_stats(id):
+    """Daily movement stats between ?start= and ?end= dates (default: the last 7 days)"""
+    animal = Animal.query.get_or_404(id)
+    
+    try:
+        end = date.fromisoformat(request.args["end"]) if request.args.get("end") else datetime.utcnow().date()
+        start = date.fromisoformat(request.args["start"]) if request.args.get("start") else end - timedelta(days=6)
+    except ValueError:
+        return jsonify({"success": False, "message": "start and end must be YYYY-MM-DD dates"}), 400
+    if start > end or (end - start).days > 366:
+        return jsonify({"success": False, "message": "start must be before end, at most 366 days apart"}), 400
+    
+    rows = AnimalDayStats.query.filter(
+        AnimalDayStats.animal_id == animal.id, AnimalDayStats.day.between(start, end)
+    ).order_by(AnimalDayStats.day).all()
+    days = [summarize(row) for row in rows]
+    return jsonify({
+        "animal_id": animal.id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": days,
+        "total": {
+            "distance_m": round(sum(d["distance_m"] for d in days), 1),
+            "moving_seconds": sum(d["moving_seconds"] for d in days),
+            "idle_seconds": sum(d["idle_seconds"] for d in days),
+            "inside_seconds": sum(d["inside_seconds"] for d in days),
+            "outside_seconds": sum(d["outside_seconds"] for d in days),
+            "max_speed_ms": max((d["max_speed_ms"] for d in days), default=0)
+        }
+    })
+
+@app.route("/api/stats/daily", methods=["GET"])
+def daily_stats():
+    """Every animal's movement stats for one ?day= (default today), farthest walked first"""
+    try:
+        day = date.fromisoformat(request.args["day"]) if request.args.get("day") else datetime.utcnow().date()
+    except ValueError:
+        return jsonify({"success": False, "message": "day must be a YYYY-MM-DD date"}), 400
+    
+    rows = db.session.query(AnimalDayStats, Animal.name).join(Animal, Animal.id == AnimalDayStats.animal_id).filter(
+        AnimalDayStats.day == day
+    ).order_by(AnimalDayStats.distance_m.desc()).limit(page_size(request.args.get("limit"))).all()
+    return jsonify({
+        "day": day.isoformat(),
+        "animals": [dict(summarize(stats), animal_id=stats.animal_id, name=name) for stats, name in rows]
+    })
+
+# ============ SPATIAL QUERIES ============
+
+animal_index = ClusterIndex(float(os.environ.get("SPATIAL_CELL_DEG", DEFAULT_CELL_DEG)))
+# Upper bound on animals returned by one radius or bounding-box query
+SPATIAL_MAX_RESULTS = 5000
+
+def load_index_changes(since):
+    """Animals changed and IDs deleted after ``since`` (everything when None)"""
+    query = db.session.query(Animal.id, Animal.lat, Animal.lng, Animal.name, Animal.device_id, Animal.status)
+    deleted = []
+    if since is not None:
+        query = query.filter(Animal.version > since)
+        deleted = [row.animal_id for row in db.session.query(AnimalTombstone.animal_id).filter(AnimalTombstone.version > since)]
+    rows = [(r.id, r.lat, r.lng, {"name": r.name, "device_id": r.device_id, "status": r.status}) for r in query]
+    return rows, deleted
+
+def synced_index():
+    """The point index, caught up with every committed herd change"""
+    animal_index.sync(herd_version(), load_index_changes)
+    return animal_index
+
+def spatial_results(matches):
+    return [dict(payload, id=animal_id, lat=lat, lng=lng, distance_m=round(distance * 1000, 1))
+            for distance, animal_id, lat, lng, payload in matches]
+
+def query_point():
+    """(lat, lng) from ?lat=&lng=, or None if either is missing or out of range"""
+    lat = request.args.get("lat", type=float)
+    lng = request.args.get("lng", type=float)
+    if lat is None or lng is None or not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        return None
+    return lat, lng
+
+@app.route("/api/animals/nearby", methods=["GET"])
+def animals_nearby():
+    """Animals within ?radius_m= (default 200) of ?lat=&lng=, nearest first"""
+    point = query_point()
+    radius_m = request.args.get("radius_m", 200, type=float)
+    if point is None:
+        return jsonify({"success": False, "message": "Valid lat and lng required"}), 400
+    if not 0 < radius_m <= 100000:
+        return jsonify({"success": False, "message": "radius_m must be between 0 and 100000"}), 400
+    
+    matches = synced_index().within_radius(point[0], point[1], radius_m / 1000)
+    limit = max(1, min(request.args.get("limit", SPATIAL_MAX_RESULTS, type=int), SPATIAL_MAX_RESULTS))
+    return jsonify({
+        "count": len(matches),
+        "animals": spatial_results(matches[:limit])
+    })
+
+@app.route("/api/animals/within", methods=["GET"])
+def animals_within():
+    """Animals inside ?min_lat=&min_lng=&max_lat=&max_lng="""
+    bounds = [request.args.get(key, type=float) for key in ("min_lat", "min_lng", "max_lat", "max_lng")]
+    if None in bounds or bounds[0] > bounds[2] or bounds[1] > bounds[3]:
+        return jsonify({"success": False, "message": "min_lat, min_lng, max_lat and max_lng required"}), 400
+    
+    matches = synced_index().within_bbox(*bounds)
+    limit = max(1, min(request.args.get("limit", SPATIAL_MAX_RESULTS, type=int), SPATIAL_MAX_RESULTS))
+    return jsonify({
+        "count": len(matches),
+        "animals": [dict(payload, id=animal_id, lat=lat, lng=lng) for animal_id, lat, lng, payload in matches[:limit]]
+    })
+
+@app.route("/api/animals/nearest", methods=["GET"])
+def animals_nearest():
+    """The ?k= (default 5) animals nearest ?lat=&lng= or another animal (?animal_id=)"""
+    k = max(1, min(request.args.get("k", 5, type=int), 100))
+    max_m = request.args.get("max_m", type=float)
+    animal_id = request.args.get("animal_id", type=int)
+    index = synced_index()
+    
+    if animal_id is not None:
+        animal = db.session.get(Animal, animal_id)
+        if animal is None:
+            return jsonify({"success": False, "message": "Animal not found"}), 404
+        if animal.lat is None or animal.lng is None:
+            return jsonify({"success": False, "message": "Animal has no position"}), 400
+        point = (animal.lat, animal.lng)
+    else:
+        point = query_point()
+        if point is None:
+            return jsonify({"success": False, "message": "Valid lat and lng, or animal_id, required"}), 400
+    
+    matches = index.nearest(point[0], point[1], k, max_km=max_m / 1000 if max_m else None, exclude=animal_id)
+    return jsonify({
+        "lat": point[0],
+        "lng": point[1],
+        "animals": spatial_results(matches)
+    })
+
+# ============ MAP CLUSTERS ============
+
+def point_feature(lat, lng, properties):
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [round(lng, 6), round(lat, 6)]},
+        "properties": properties
+    }
+
+def cluster_response(zoom, bounds):
+    """GeoJSON clusters and lone animals in ``bounds``, revalidated by herd version"""
+    index = synced_index()
+    etag = f"map-{index.version}-{zoom}-{','.join(f'{b:.6f}' for b in bounds)}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        clusters, points = index.clusters(zoom, *bounds)
+        features = [point_feature(lat, lng, {
+            "cluster": True,
+            "cluster_id": key,
+            "point_count": count,
+            "out_count": out
+        }) for lat, lng, count, out, key in clusters]
+        features += [point_feature(lat, lng, dict(payload, id=animal_id)) for animal_id, lat, lng, payload in points]
+        response = jsonify({"type": "FeatureCollection", "zoom": zoom, "features": features})
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route("/api/map/clusters", methods=["GET"])
+def map_clusters():
+    """The herd as seen at ?zoom= inside ?bbox=west,south,east,north"""
+    zoom = request.args.get("zoom", type=int)
+    try:
+        west, south, east, north = (float(v) for v in request.args.get("bbox", "").split(","))
+    except ValueError:
+        return jsonify({"success": False, "message": "bbox=west,south,east,north required"}), 400
+    if zoom is None or not 0 <= zoom <= 22 or south > north or west > east:
+        return jsonify({"success": False, "message": "Valid zoom (0-22) and bbox required"}), 400
+    return cluster_response(zoom, (south, west, north, east))
+
+@app.route("/api/map/clusters/<int:z>/<int:x>/<int:y>", methods=["GET"])
+def map_cluster_tile(z, x, y):
+    """The clusters whose centroid falls in one web-map tile"""
+    if not 0 <= z <= 22 or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        return jsonify({"success": False, "message": "Invalid tile"}), 400
+    return cluster_response(z, tile_bounds(z, x, y))
+
+# ============ HEATMAP ============
+
+def heatmap_response(bounds, level):
+    """Occupancy counts in ``bounds`` (or everywhere) for ?start=&end=, merged to ``level``"""
+    try:
+        end = parse_timestamp(request.args.get("end")) or datetime.utcnow()
+        start = parse_timestamp(request.args.get("start")) or end - timedelta(days=1)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid start or end"}), 400
+    
+    hourly_cutoff = cutoff(RETENTION.hourly_days)
+    ranges = bucket_ranges(to_epoch(start), to_epoch(end), to_epoch(hourly_cutoff) if hourly_cutoff else None)
+    cells = []
+    if ranges:
+        query = db.session.query(
+            OccupancyCell.lat_cell, OccupancyCell.lng_cell, func.sum(OccupancyCell.count)
+        ).filter(or_(*(
+            and_(OccupancyCell.period == period, OccupancyCell.bucket >= first, OccupancyCell.bucket < last)
+            for period, first, last in ranges
+        )))
+        if bounds:
+            low_lat, low_lng = cell_of(bounds[0], bounds[1])
+            high_lat, high_lng = cell_of(bounds[2], bounds[3])
+            query = query.filter(OccupancyCell.lat_cell.between(low_lat, high_lat),
+                                 OccupancyCell.lng_cell.between(low_lng, high_lng))
+        cells = query.group_by(OccupancyCell.lat_cell, OccupancyCell.lng_cell).all()
+    
+    merged = coarsen(cells, level)
+    return jsonify({
+        "start": from_epoch(ranges[0][1]).isoformat() if ranges else start.isoformat(),
+        "end": from_epoch(ranges[-1][2]).isoformat() if ranges else end.isoformat(),
+        "level": level,
+        "cell_deg": cell_deg(level),
+        "max": max(merged.values(), default=0),
+        # [lat, lng, count] at each cell centre, as heatmap layers take them
+        "cells": [[*cell_center(y, x, level), n] for (y, x), n in merged.items()]
+    })
+
+@app.route("/api/heatmap", methods=["GET"])
+def heatmap():
+    """Where the herd spent its time: ?start=&end=, ?level= (0-10) and an optional bbox"""
+    level = request.args.get("level", 0, type=int)
+    if not 0 <= level <= MAX_LEVEL:
+        return jsonify({"success": False, "message": f"level must be between 0 and {MAX_LEVEL}"}), 400
+    
+    bounds = [request.args.get(key, type=float) for key in ("min_lat", "min_lng", "max_lat", "max_lng")]
+    if all(b is None for b in bounds):
+        bounds = None
+    elif None in bounds or bounds[0] > bounds[2] or bounds[1] > bounds[3]:
+        return jsonify({"success": False, "message": "min_lat, min_lng, max_lat and max_lng must be given together"}), 400
+    return heatmap_response(bounds, level)
+
+@app.route("/api/heatmap/tiles/<int:z>/<int:x>/<int:y>", methods=["GET"])
+def heatmap_tile(z, x, y):
+    """The heatmap for one web-map tile, at a cell size matched to its zoom"""
+    if not 0 <= z <= 22 or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        return jsonify({"success": False, "message": "Invalid tile"}), 400
+    return heatmap_response(tile_bounds(z, x, y), level_for_zoom(z))
+
 # ============ GPS / TRACKING ROUTES ============
 
-@app.route("/api/gps", methods=["POST"])
-def gps_update():
-    data = request.json or {}
-    device_id = data.get("device_id")
+def is_stale(animal, fix):
+    """True for a fix taken before the animal's last one"""
+    with animal.lock:
+        return bool(fix.timestamp and animal.last_seen and fix.timestamp < animal.last_seen)
+
+def apply_fix(animal, fix, alerts):
+    """Move a cached animal state to a GPS fix, appending its alert rows to ``alerts``.
     
-    if not device_id:
-        return jsonify({"success": False, "message": "Device ID required"}), 400
+    Alerts come from the rule engine, which only fires on a change of
+    condition. The state's lock is held throughout, so concurrent fixes for
+    one animal apply one at a time. Returns (zone names, position tuple) as
+    of this fix, or None for a fix older than the animal's last one. The
+    caller writes the state and alerts back and commits.
+    """
+    with animal.lock:
+        if is_stale(animal, fix):
+            return None
+        alert_engine.prime(animal)
+        
+        if fix.lat is not None:
+            animal.lat = fix.lat
+        if fix.lng is not None:
+            animal.lng = fix.lng
+        if fix.battery is not None:
+            animal.battery_level = fix.battery
+        if fix.signal is not None:
+            animal.signal_strength = fix.signal
+        animal.last_seen = fix.timestamp or datetime.utcnow()
+        
+        zone_index = get_zone_index()
+        zones = zone_index.lookup(animal.lat, animal.lng)
+        animal.status = zone_index.status(animal.lat, animal.lng, zones)
+        
+        for event in alert_engine.evaluate(animal, animal.last_seen):
+            # A resolution closes an alert rather than raising one, so it goes
+            # out on the live stream but never into the unread feed
+            alerts.append({"animal_id": animal.id, "alert_type": event.alert_type, "message": event.message,
+                           "is_read": event.kind == RESOLVE})
+        
+        return [z.name for z in zones], (animal.id, animal.last_seen, animal.lat, animal.lng, animal.status)
+
+def _chunks(items, size=500):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def apply_fixes(fixes):
+    """Apply a burst of fixes in one transaction.
     
-    animal = Animal.query.filter_by(device_id=device_id).first()
+    All device IDs are resolved up front through the device registry and
+    fixes are applied oldest first, so a late-arriving fix never moves an
+    animal back to an older position.
+    Returns one result dict per fix, in the order the fixes were given.
+    """
+    animals_by_device = device_registry.get_many(f.device_id for f in fixes)
     
-    if not animal:
-        return jsonify({"success": False, "message": "Device not registered"}), 404
+    received_at = datetime.utcnow()
+    order = sorted(range(len(fixes)), key=lambda i: fixes[i].timestamp or received_at)
     
-    old_status = animal.status
+    results = [None] * len(fixes)
+    moved = {}
+    positions = []
+    alerts = []
+    for i in order:
+        fix = fixes[i]
+        animal = animals_by_device.get(fix.device_id)
+        if not animal:
+            results[i] = {"device_id": fix.device_id, "success": False, "message": "Device not registered"}
+            continue
+        
+        applied = apply_fix(animal, fix, alerts)
+        if applied is None:
+            results[i] = {"device_id": fix.device_id, "success": False, "message": "Stale fix ignored"}
+            continue
+        
+        zones, position = applied
+        moved[animal.id] = animal
+        positions.append(position)
+        results[i] = {
+            "device_id": fix.device_id,
+            "success": True,
+            "animal_id": animal.id,
+            "status": position[4],
+            "lat": position[2],
+            "lng": position[3],
+            "zones": zones
+        }
     
-    animal.lat = data.get("lat", animal.lat)
-    animal.lng = data.get("lng", animal.lng)
-    animal.battery_level = data.get("battery", animal.battery_level)
-    animal.signal_strength = data.get("signal", animal.signal_strength)
-    animal.last_seen = datetime.utcnow()
+    commit_states(list(moved.values()), positions, alerts)
+    return results
+
+# Optional write-behind ingest: INGEST_MODE=write_behind queues fixes and a
+# background worker group-commits them. INGEST_DURABILITY chooses whether
+# requests are acknowledged once queued ("enqueue") or once committed ("flush").
+INGEST_MODE = os.environ.get("INGEST_MODE", "sync")
+INGEST_DURABILITY = os.environ.get("INGEST_DURABILITY", ACK_AFTER_FLUSH)
+INGEST_FLUSH_TIMEOUT = 10
+
+def flush_fixes(fixes):
+    """apply_fixes outside a request: for the write-behind queue and the gateway.
     
-    new_status = check_geofence(animal.lat, animal.lng)
-    animal.status = new_status
+    There is no before_request here, so pick up fence and herd changes made
+    by other processes first.
+    """
+    with app.app_context():
+        refresh_geofence_config()
+        sync_device_cache()
+        return apply_fixes(fixes)
+
+write_behind = None
+if INGEST_MODE == "write_behind":
+    write_behind = WriteBehindQueue(
+        flush_fixes,
+        max_size=int(os.environ.get("INGEST_QUEUE_SIZE", 20000)),
+        flush_size=int(os.environ.get("INGEST_FLUSH_SIZE", 1000)),
+        flush_interval=int(os.environ.get("INGEST_FLUSH_MS", 200)) / 1000
+    )
+    write_behind.start()
+    # Drain queued fixes on interpreter shutdown (gunicorn worker exit included)
+    atexit.register(write_behind.stop)
+
+def enqueue_fixes(fixes):
+    """Queue fixes for write-behind ingest.
     
-    if old_status == "IN" and new_status == "OUT":
-        alert = Alert(
-            animal_id=animal.id,
-            alert_type="EXIT",
-            message=f"ALERT: {animal.name} has LEFT the farm boundary!"
-        )
-        db.session.add(alert)
+    Fixes without a device timestamp are stamped now, so they keep their
+    arrival order. Returns (ticket, results). ``results`` holds the per-fix
+    results once committed. It is None when acknowledging after enqueue, or
+    when the flush takes longer than INGEST_FLUSH_TIMEOUT. The fixes still
+    commit then, and the ticket's token finds the outcome. Raises QueueFull.
+    """
+    received_at = datetime.utcnow()
+    fixes = [f if f.timestamp else f._replace(timestamp=received_at) for f in fixes]
+    ticket = write_behind.submit(fixes)
+    if INGEST_DURABILITY == ACK_AFTER_ENQUEUE or not ticket.wait(INGEST_FLUSH_TIMEOUT):
+        return ticket, None
+    if ticket.error:
+        raise ticket.error
+    return ticket, ticket.results
+
+def queued(ticket, **body):
+    """202 for fixes that are queued but not yet committed, with the token to check on them"""
+    return jsonify(dict(body, success=True, token=ticket.token, status_url=f"/api/gps/queue/{ticket.token}")), 202
+
+def backpressure(error):
+    response = jsonify({"success": False, "message": str(error)})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+@app.route("/api/gps/queue/<token>", methods=["GET"])
+def queued_fixes(token):
+    """The outcome of fixes acknowledged with 202: pending, committed (with per-fix results) or failed"""
+    ticket = write_behind.ticket(token) if write_behind else None
+    if ticket is None:
+        return jsonify({"success": False, "message": "Unknown or expired token"}), 404
+    if not ticket.done:
+        return jsonify({"success": True, "status": "pending"})
+    if ticket.error:
+        return jsonify({"success": False, "status": "failed", "message": str(ticket.error)})
+    return jsonify({"success": True, "status": "committed", "results": ticket.results})
+
+@app.route("/api/gps", methods=["POST"])
+def gps_update():
+    try:
+        if request.mimetype == BINARY_CONTENT_TYPE:
+            records = unpack_records(request.get_data())
+            if len(records) != 1:
+                raise ValueError("Expected exactly one fix record")
+            fix = fix_from_record(records[0])
+        else:
+            data = request.json or {}
+            if not data.get("device_id"):
+                return jsonify({"success": False, "message": "Device ID required"}), 400
+            fix = fix_from_json(data)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
     
-    if data.get("battery", 100) < 20:
-        alert = Alert(
-            animal_id=animal.id,
-            alert_type="LOW_BATTERY",
-            message=f"LOW BATTERY: {animal.name} has {data.get('battery')}%"
-        )
-        db.session.add(alert)
+    animal = device_registry.get(fix.device_id)
     
-    db.session.commit()
+    if not animal:
+        return jsonify({"success": False, "message": "Device not registered"}), 404
+    
+    if write_behind is None:
+        alerts = []
+        applied = apply_fix(animal, fix, alerts)
+        if applied is None:
+            return jsonify({"device_id": fix.device_id, "success": False, "message": "Stale fix ignored"}), 409
+        zones, position = applied
+        commit_states([animal], [position], alerts)
+        result = {"status": position[4], "lat": position[2], "lng": position[3], "zones": zones}
+    else:
+        # Answer a stale fix now, as the synchronous path does, rather than drop it at flush
+        if is_stale(animal, fix):
+            return jsonify({"device_id": fix.device_id, "success": False, "message": "Stale fix ignored"}), 409
+        try:
+            ticket, results = enqueue_fixes([fix])
+        except QueueFull as e:
+            return backpressure(e)
+        if results is None:
+            return queued(ticket, queued=True)
+        result = results[0]
+        if not result["success"]:
+            return jsonify(result), 409
     
     return jsonify({
         "success": True,
         "animal": {
             "id": animal.id,
             "name": animal.name,
-            "status": animal.status,
-            "lat": animal.lat,
-            "lng": animal.lng
+            "status": result["status"],
+            "lat": result["lat"],
+            "lng": result["lng"],
+            "zones": result["zones"]
         }
     })
 
+@app.route("/api/gps/batch", methods=["POST"])
+def gps_batch():
+    """Ingest a burst of buffered fixes from many devices in one request"""
+    if request.mimetype == BINARY_CONTENT_TYPE:
+        try:
+            raw_fixes = unpack_records(request.get_data())
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        parse_fix = fix_from_record
+    else:
+        data = request.json or {}
+        raw_fixes = data if isinstance(data, list) else data.get("fixes", [])
+        parse_fix = fix_from_json
+    
+    if not isinstance(raw_fixes, list) or not raw_fixes:
+        return jsonify({"success": False, "message": "fixes must be a non-empty list"}), 400
+    
+    if len(raw_fixes) > MAX_BATCH_FIXES:
+        return jsonify({"success": False, "message": f"At most {MAX_BATCH_FIXES} fixes per batch"}), 413
+    
+    fixes = []
+    positions = []
+    results = [None] * len(raw_fixes)
+    for i, raw in enumerate(raw_fixes):
+        try:
+            fixes.append(parse_fix(raw))
+            positions.append(i)
+        except ValueError as e:
+            device_id = raw.get("device_id") if isinstance(raw, dict) else None
+            results[i] = {"device_id": device_id, "success": False, "message": str(e)}
+    
+    if fixes and write_behind is not None:
+        # Reject unknown devices and stale fixes now; the registry makes this a cache lookup
+        known = device_registry.get_many(f.device_id for f in fixes)
+        to_queue = []
+        for i, fix in zip(positions, fixes):
+            animal = known.get(fix.device_id)
+            if animal is None:
+                results[i] = {"device_id": fix.device_id, "success": False, "message": "Device not registered"}
+            elif is_stale(animal, fix):
+                results[i] = {"device_id": fix.device_id, "success": False, "message": "Stale fix ignored"}
+            else:
+                to_queue.append((i, fix))
+        positions = [i for i, _ in to_queue]
+        fixes = [f for _, f in to_queue]
+        
+        if not fixes:
+            applied = []
+        else:
+            try:
+                ticket, applied = enqueue_fixes(fixes)
+            except QueueFull as e:
+                return backpressure(e)
+            if applied is None:
+                return queued(ticket, queued=len(fixes), rejected=len(results) - len(fixes), results=results)
+    elif fixes:
+        applied = apply_fixes(fixes)
+    else:
+        applied = []
+    
+    for i, result in zip(positions, applied):
+        results[i] = result
+    
+    accepted = sum(1 for r in results if r["success"])
+    return jsonify({
+        "success": True,
+        "accepted": accepted,
+        "rejected": len(results) - accepted,
+        "results": results
+    })
+
 @app.route("/api/alerts", methods=["GET"])
 def get_alerts():
-    alerts = Alert.query.filter_by(is_read=False).order_by(Alert.created_at.desc()).all()
-    return jsonify([{
+    """Unread alerts, newest first.
+    
+    Without ?limit= or ?cursor= every unread alert is returned, as clients
+    that do not page expect. With either, one page is returned. The body
+    stays a plain list, and the cursor for the next page is sent in the
+    X-Next-Cursor and Link headers.
+    """
+    paged = "limit" in request.args or "cursor" in request.args
+    limit = page_size(request.args.get("limit")) if paged else None
+    try:
+        alerts, next_cursor = keyset_page(
+            Alert.query.options(joinedload(Alert.animal)).filter_by(is_read=False), Alert.created_at, Alert.id,
+            cursor=request.args.get("cursor"), limit=limit
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    
+    response = jsonify([{
         "id": a.id,
         "animal_id": a.animal_id,
         "animal_name": a.animal.name if a.animal else "Unknown",
@@ -303,83 +1428,536 @@ def get_alerts():
         "message": a.message,
         "created_at": a.created_at.isoformat()
     } for a in alerts])
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.base_url}?{urlencode({"cursor": next_cursor, "limit": limit})}>; rel="next"'
+    return response
+
+@app.route("/api/alerts/summary", methods=["GET"])
+def alerts_summary():
+    """Unread counts by type and the newest alert id, from the maintained counters"""
+    by_type = {c.alert_type: c.unread for c in AlertCounter.query.filter(AlertCounter.unread > 0)}
+    return jsonify({
+        "unread": sum(by_type.values()),
+        "by_type": by_type,
+        "newest_id": db.session.query(func.max(Alert.id)).scalar()
+    })
 
 @app.route("/api/alerts/<int:id>/read", methods=["POST"])
 def mark_alert_read(id):
-    alert = Alert.query.get_or_404(id)
-    alert.is_read = True
+    read = db.session.execute(
+        update(Alert).where(Alert.id == id, Alert.is_read == False).values(is_read=True).returning(Alert.alert_type)
+    ).scalars().all()
+    if not read:
+        Alert.query.get_or_404(id)
+    count_alerts(read, delta=-1)
     db.session.commit()
+    event_hub.publish("alerts_read", {"ids": [id]})
     return jsonify({"success": True})
 
+@app.route("/api/alerts/read", methods=["POST"])
+def acknowledge_alerts():
+    """Mark every unread alert with id <= up_to (optionally of one type) as read"""
+    data = request.json or {}
+    up_to = data.get("up_to")
+    if not isinstance(up_to, int) or isinstance(up_to, bool):
+        return jsonify({"success": False, "message": "up_to must be an alert id"}), 400
+    
+    query = update(Alert).where(Alert.is_read == False, Alert.id <= up_to)
+    if data.get("alert_type"):
+        query = query.where(Alert.alert_type == data["alert_type"])
+    read = db.session.execute(query.values(is_read=True).returning(Alert.alert_type)).scalars().all()
+    count_alerts(read, delta=-1)
+    db.session.commit()
+    
+    event_hub.publish("alerts_read", {"ids": [], "up_to": up_to, "alert_type": data.get("alert_type")})
+    return jsonify({"success": True, "acknowledged": len(read)})
+
 # ============ GEOFENCE ROUTES ============
 
 @app.route("/api/geofence", methods=["GET", "POST"])
 def geofence():
     if request.method == "POST":
         data = request.json or {}
-        geo = Geofence.query.first()
-        if not geo:
-            geo = Geofence()
-            db.session.add(geo)
+        try:
+            farm = zone_from_dict({
+                "name": "farm",
+                "lat": data.get("lat", -1.2921),
+                "lng": data.get("lng", 36.8219),
+                "radius": data.get("radius", 0.5)
+            })
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
         
-        geo.center_lat = data.get("lat", -1.2921)
-        geo.center_lng = data.get("lng", 36.8219)
-        geo.radius_km = data.get("radius", 0.5)
+        geo = Geofence.query.first()
+        geo.center_lat = farm.lat
+        geo.center_lng = farm.lng
+        geo.radius_km = farm.radius_km
+        bump_geofence_version()
+        # Every worker rebuilds its snapshot from this row, so build it before committing
+        config = build_geofence_config()
         db.session.commit()
+        set_config(config)
         
         return jsonify({"success": True, "geofence": {
-            "lat": geo.center_lat,
-            "lng": geo.center_lng,
-            "radius": geo.radius_km
-        }})
+            "lat": config.center_lat,
+            "lng": config.center_lng,
+            "radius": config.radius_km,
+            "version": config.version
+        }, "animals_updated": recheck_herd()})
     
-    geo = Geofence.query.first()
+    config = get_config()
     return jsonify({
-        "lat": geo.center_lat if geo else -1.2921,
-        "lng": geo.center_lng if geo else 36.8219,
-        "radius": geo.radius_km if geo else 0.5
+        "lat": config.center_lat,
+        "lng": config.center_lng,
+        "radius": config.radius_km,
+        "version": config.version
     })
 
-# ============ SIMULATION ============
+@app.route("/api/geofence/zones", methods=["GET", "POST"])
+def geofence_zones():
+    if request.method == "POST":
+        data = request.json or {}
+        try:
+            zone = zone_from_dict(data)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        
+        if zone.name == "farm" or GeofenceZone.query.filter_by(name=zone.name).first():
+            return jsonify({"success": False, "message": "Zone name already in use"}), 400
+        
+        row = GeofenceZone(name=zone.name, zone_type=zone.zone_type, shape=zone.shape)
+        if zone.shape == "polygon":
+            row.points = json.dumps(zone.points)
+        else:
+            row.center_lat = zone.lat
+            row.center_lng = zone.lng
+            row.radius_km = zone.radius_km
+        db.session.add(row)
+        bump_geofence_version()
+        db.session.commit()
+        load_geofence_config()
+        
+        return jsonify({
+            "success": True,
+            "zone": dict(zone.to_dict(), id=row.id),
+            "animals_updated": recheck_herd()
+        })
+    
+    zones = GeofenceZone.query.all()
+    return jsonify([dict(z.to_zone().to_dict(), id=z.id) for z in zones])
 
-@app.route("/api/simulate/movement", methods=["POST"])
-def simulate_movement():
-    import random
+@app.route("/api/geofence/zones/<int:id>", methods=["DELETE"])
+def delete_geofence_zone(id):
+    zone = GeofenceZone.query.get_or_404(id)
+    db.session.delete(zone)
+    bump_geofence_version()
+    db.session.commit()
+    load_geofence_config()
+    return jsonify({"success": True, "animals_updated": recheck_herd()})
+
+@app.route("/api/geofence/lookup", methods=["GET"])
+def geofence_lookup():
+    """Return every zone containing a point"""
+    lat = request.args.get("lat", type=float)
+    lng = request.args.get("lng", type=float)
+    if lat is None or lng is None:
+        return jsonify({"success": False, "message": "lat and lng required"}), 400
     
-    animals = Animal.query.all()
-    exited_count = 0
+    zone_index = get_zone_index()
+    zones = zone_index.lookup(lat, lng)
+    return jsonify({
+        "status": zone_index.status(lat, lng, zones),
+        "zones": [z.to_dict() for z in zones]
+    })
+
+# ============ MAINTENANCE ============
+
+# Chunk rows are only deleted if no fix was appended since they were read
+CHUNK_DELETE = CHUNKS.delete().where(and_(
+    CHUNKS.c.animal_id == bindparam("chunk_animal_id"),
+    CHUNKS.c.start == bindparam("chunk_start"),
+    CHUNKS.c.count == bindparam("chunk_count")
+))
+
+def database_size():
+    """(file bytes, free-page bytes) of a SQLite database; (None, None) elsewhere"""
+    if db.engine.dialect.name != "sqlite":
+        return None, None
+    page_size, pages, free = (db.session.execute(text(f"PRAGMA {pragma}")).scalar()
+                              for pragma in ("page_size", "page_count", "freelist_count"))
+    return pages * page_size, free * page_size
+
+def vacuum_database():
+    """Rebuild a SQLite file to return free pages to the filesystem. Blocks writers meanwhile."""
+    if db.engine.dialect.name != "sqlite":
+        return {}
+    db.session.remove()
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    size, free = database_size()
+    return {"bytes_after": size, "free_bytes_after": free}
+
+def record_rollups(rows):
+    """Merge hourly rollup rows, weighting the mean positions by fixes. The caller commits."""
+    if not rows:
+        return
+    db.session.execute(
+        text("INSERT INTO position_rollup (animal_id, hour, fixes, lat, lng) "
+             "VALUES (:animal_id, :hour, :fixes, :lat, :lng) "
+             "ON CONFLICT (animal_id, hour) DO UPDATE SET "
+             "lat = (position_rollup.lat * position_rollup.fixes + excluded.lat * excluded.fixes) / (position_rollup.fixes + excluded.fixes), "
+             "lng = (position_rollup.lng * position_rollup.fixes + excluded.lng * excluded.fixes) / (position_rollup.fixes + excluded.fixes), "
+             "fixes = position_rollup.fixes + excluded.fixes"),
+        rows
+    )
+
+def compact_positions(before, batch_size, pause, report):
+    """Downsample position chunks that ended before epoch ``before`` to hourly rollups.
     
-    for animal in animals:
-        old_status = animal.status
+    Chunks are decoded before the transaction writes anything, so the write
+    lock is held only for the deletes and the rollup upsert.
+    """
+    totals = {"chunks": 0, "fixes": 0, "rollups": 0, "bytes": 0}
+    while True:
+        chunks = db.session.execute(
+            select(CHUNKS.c.animal_id, CHUNKS.c.start, CHUNKS.c.count, CHUNKS.c.data)
+            .where(CHUNKS.c.start <= before - CHUNK_SECONDS)
+            .order_by(CHUNKS.c.start, CHUNKS.c.animal_id).limit(batch_size)
+        ).all()
+        if not chunks:
+            return totals
+        decoded = [(c, list(decode_fixes(c.data))) for c in chunks]
         
-        lat_change = random.uniform(-0.001, 0.001)
-        lng_change = random.uniform(-0.001, 0.001)
+        fixes = []
+        for chunk, chunk_fixes in decoded:
+            params = {"chunk_animal_id": chunk.animal_id, "chunk_start": chunk.start, "chunk_count": chunk.count}
+            if db.session.execute(CHUNK_DELETE, params).rowcount:
+                fixes.extend((chunk.animal_id, ts, lat, lng) for ts, lat, lng in chunk_fixes)
+                totals["chunks"] += 1
+                totals["bytes"] += len(chunk.data)
+        rollups = hourly_rollups(fixes)
+        record_rollups(rollups)
+        db.session.commit()
         
-        animal.lat = max(-90, min(90, animal.lat + lat_change))
-        animal.lng = max(-180, min(180, animal.lng + lng_change))
-        animal.last_seen = datetime.utcnow()
-        animal.status = check_geofence(animal.lat, animal.lng)
+        totals["fixes"] += len(fixes)
+        totals["rollups"] += len(rollups)
+        report("positions", totals)
+        time.sleep(pause)
+
+ALERT_ARCHIVE_COLUMNS = (Alert.id, Alert.animal_id, Alert.alert_type, Alert.message, Alert.created_at, Alert.is_read)
+
+def purge_alerts(before, unread_before, batch_size, pause, archive, report):
+    """Archive and delete read alerts created before ``before``, and unread ones before ``unread_before``.
+    
+    Each batch is deleted with a guard on is_read, so an alert read while the
+    batch was prepared is left for the next pass, and the unread counters
+    are decremented for exactly the unread alerts that were deleted.
+    """
+    totals = {"deleted": 0, "unread": 0, "bytes": 0}
+    for is_read, created_before in ((True, before), (False, unread_before)):
+        if created_before is None:
+            continue
+        while True:
+            # Walks ix_alert_feed (is_read, created_at, id), oldest first
+            rows = db.session.execute(
+                select(*ALERT_ARCHIVE_COLUMNS)
+                .where(Alert.is_read == is_read, Alert.created_at < created_before)
+                .order_by(Alert.created_at, Alert.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            deleted = dict(db.session.execute(
+                delete(Alert).where(Alert.id.in_([r.id for r in rows]), Alert.is_read == is_read)
+                .returning(Alert.id, Alert.alert_type)
+            ).all())
+            if not is_read:
+                count_alerts(deleted.values(), delta=-1)
+            purged = [r._asdict() for r in rows if r.id in deleted]
+            if archive is not None:
+                archive.write(purged)
+            db.session.commit()
+            
+            totals["deleted"] += len(purged)
+            totals["unread"] += 0 if is_read else len(purged)
+            totals["bytes"] += sum(len(r["message"] or "") for r in purged)
+            report("alerts", totals)
+            time.sleep(pause)
+    return totals
+
+def prune_hourly_occupancy(before, pause, report):
+    """Delete hourly heatmap counts before epoch ``before``, one hour per transaction"""
+    totals = {"hours": 0, "cells": 0}
+    while True:
+        bucket = db.session.query(func.min(OccupancyCell.bucket)).filter(
+            OccupancyCell.period == HOUR, OccupancyCell.bucket < before
+        ).scalar()
+        if bucket is None:
+            return totals
+        deleted = db.session.execute(
+            delete(OccupancyCell).where(OccupancyCell.period == HOUR, OccupancyCell.bucket == bucket)
+        ).rowcount
+        db.session.commit()
         
-        if old_status == "IN" and animal.status == "OUT":
-            exited_count += 1
-            alert = Alert(
-                animal_id=animal.id,
-                alert_type="EXIT",
-                message=f"ALERT: {animal.name} has LEFT the farm boundary!"
+        totals["hours"] += 1
+        totals["cells"] += deleted
+        report("heatmap", totals)
+        time.sleep(pause)
+
+def legacy_table(name, columns):
+    """A legacy table that is not mapped here, reflected, if it exists with ``columns``"""
+    if name not in inspect(db.engine).get_table_names():
+        return None
+    table = Table(name, MetaData(), autoload_with=db.engine)
+    return table if set(columns) <= set(table.c.keys()) else None
+
+def purge_legacy(table, before, batch_size, pause, report, stage, rollup=False):
+    """Delete legacy rows with a timestamp before ``before``, rolling their fixes up if ``rollup``"""
+    totals = dict({"rows": 0}, **({"rollups": 0} if rollup else {}))
+    while True:
+        rows = db.session.execute(
+            select(table).where(table.c.timestamp < before).order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return totals
+        db.session.execute(delete(table).where(table.c.id.in_([r.id for r in rows])))
+        if rollup:
+            rollups = hourly_rollups(
+                (r.animal_id, to_epoch(r.timestamp), r.latitude, r.longitude)
+                for r in rows if r.latitude is not None and r.longitude is not None
             )
-            db.session.add(alert)
+            record_rollups(rollups)
+            totals["rollups"] += len(rollups)
+        db.session.commit()
+        
+        totals["rows"] += len(rows)
+        report(stage, totals)
+        time.sleep(pause)
+
+def run_maintenance(retention=RETENTION, batch_size=BATCH_SIZE, pause=PAUSE_SECONDS, archive=None, progress=None):
+    """One retention pass over the history tables (see maintenance.py); returns a summary.
     
-    db.session.commit()
+    ``archive`` (a maintenance.AlertArchive, or None to skip archiving)
+    receives purged alerts before their delete commits. ``progress(stage,
+    totals)`` is called after every batch.
+    """
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    size, free = database_size()
+    summary = {"database": {"bytes_before": size, "free_bytes_before": free}}
     
-    return jsonify({
+    def report(stage, totals):
+        if progress:
+            progress(stage, totals)
+    
+    if retention.positions_days is not None:
+        summary["positions"] = compact_positions(
+            to_epoch(cutoff(retention.positions_days, now)), batch_size, pause, report
+        )
+        tracking = legacy_table("tracking", ("id", "animal_id", "timestamp", "latitude", "longitude"))
+        if tracking is not None:
+            summary["tracking"] = purge_legacy(
+                tracking, cutoff(retention.positions_days, now), batch_size, pause, report, "tracking", rollup=True
+            )
+    
+    summary["alerts"] = purge_alerts(
+        cutoff(retention.alerts_days, now), cutoff(retention.unread_alerts_days, now), batch_size, pause, archive, report
+    )
+    
+    if retention.hourly_days is not None:
+        summary["heatmap"] = prune_hourly_occupancy(to_epoch(cutoff(retention.hourly_days, now)), pause, report)
+    
+    history = legacy_table("history", ("id", "timestamp"))
+    if history is not None and retention.history_days is not None:
+        summary["history"] = purge_legacy(history, cutoff(retention.history_days, now), batch_size, pause, report, "history")
+    
+    size, free = database_size()
+    summary["database"].update({
+        "bytes_after": size,
+        "free_bytes_after": free,
+        # Deleted pages join the free list and are reused before the file grows
+        "freed_bytes": None if free is None else max(free - summary["database"]["free_bytes_before"], 0)
+    })
+    summary["seconds"] = round(time.perf_counter() - started, 1)
+    return summary
+
+# ============ SIMULATION ============
+
+# Longer runs (100k animals x 1000 steps) belong to ``python simulator.py``
+SIMULATION_MAX_STEPS = int(os.environ.get("SIMULATION_MAX_STEPS", 100))
+SIMULATION_MODES = ("bulk", "ingest")
+# Bulk simulation commits about this many fixes at a time
+SIMULATION_FIXES_PER_COMMIT = 200000
+
+def simulate_herd(steps=1, step_seconds=30, seed=None, mode="bulk", device_prefix=None, progress=None):
+    """Move the herd ``steps`` times with HerdSimulator, writing every step.
+    
+    ``bulk`` writes final states, position history and EXIT alerts with bulk
+    statements, committing every few steps. The rule engine forgets the herd
+    instead of evaluating it, as after any bulk update. ``ingest`` feeds each
+    step's fixes through apply_fixes, so zones, alert rules and the live
+    stream behave as for real collars, at ingest speed.
+    Steps are ``step_seconds`` apart and end now. Steps that would not be
+    later than the herd's newest fix are dropped, so a run never writes a
+    fix dated in the future and may write fewer than ``steps`` (none if the
+    newest fix is within a step of now). ``progress(step, summary)`` is
+    called after every commit.
+    """
+    query = db.session.query(*STATE_COLUMNS)
+    if device_prefix:
+        query = query.filter(Animal.device_id.like(f"{device_prefix}%"))
+    herd = [AnimalState(**row._asdict()) for row in query.order_by(Animal.id)]
+    summary = {"animals": len(herd), "steps": 0, "fixes": 0, "accepted": 0, "exited": 0, "fixes_per_second": 0}
+    if not herd:
+        return summary
+    
+    config = get_config()
+    simulator = HerdSimulator(
+        [a.lat if a.lat is not None else config.center_lat for a in herd],
+        [a.lng if a.lng is not None else config.center_lng for a in herd],
+        (config.center_lat, config.center_lng),
+        config.radius_km,
+        battery=[a.battery_level if a.battery_level is not None else 100.0 for a in herd],
+        signal=[a.signal_strength if a.signal_strength is not None else 100.0 for a in herd],
+        step_seconds=step_seconds,
+        seed=seed
+    )
+    
+    interval = timedelta(seconds=step_seconds)
+    end = datetime.utcnow().replace(microsecond=0)
+    start = end - interval * (steps - 1)
+    newest = max((a.last_seen for a in herd if a.last_seen), default=None)
+    if newest and start <= newest:
+        skipped = (newest - start) // interval + 1
+        start += interval * skipped
+        steps = max(0, steps - skipped)
+    
+    statuses = {a.id: a.status for a in herd}
+    started = time.perf_counter()
+    
+    def report(step):
+        summary["steps"] = step
+        summary["fixes_per_second"] = summary["fixes"] / max(time.perf_counter() - started, 1e-9)
+        if progress:
+            progress(step, summary)
+    
+    if mode == "ingest":
+        device_ids = [a.device_id for a in herd]
+        for step in range(steps):
+            simulator.step()
+            for fixes in _chunks(simulator.fixes(device_ids, start + interval * step), MAX_BATCH_FIXES):
+                for result in apply_fixes(fixes):
+                    summary["fixes"] += 1
+                    if not result["success"]:
+                        continue
+                    summary["accepted"] += 1
+                    if statuses[result["animal_id"]] == "IN" and result["status"] == "OUT":
+                        summary["exited"] += 1
+                    statuses[result["animal_id"]] = result["status"]
+            report(step + 1)
+        return summary
+    
+    ids = [a.id for a in herd]
+    window = max(1, SIMULATION_FIXES_PER_COMMIT // len(herd))
+    for first in range(0, steps, window):
+        positions = []
+        exited = []
+        for step in range(first, min(first + window, steps)):
+            lats, lngs, battery, signal = simulator.step()
+            seen_at = start + interval * step
+            step_statuses = check_geofence_many(lats, lngs).tolist()
+            for a, status in zip(herd, step_statuses):
+                if statuses[a.id] == "IN" and status == "OUT":
+                    exited.append(a)
+                statuses[a.id] = status
+            positions.extend(zip(ids, [seen_at] * len(ids), lats.tolist(), lngs.tolist(), step_statuses))
+        
+        for a, lat, lng, level, strength in zip(herd, lats.tolist(), lngs.tolist(), battery.tolist(), signal.tolist()):
+            a.lat, a.lng, a.status = lat, lng, statuses[a.id]
+            a.battery_level, a.signal_strength, a.last_seen = round(level, 1), round(strength, 1), seen_at
+        commit_states(herd, positions, exit_alert_rows(exited))
+        
+        for a in herd:
+            device_registry.patch(a.id, **a.values())
+        alert_engine.forget(*ids)
+        summary["fixes"] += len(positions)
+        summary["accepted"] += len(positions)
+        summary["exited"] += len(exited)
+        report(step + 1)
+    return summary
+
+@app.route("/api/simulate/movement", methods=["POST"])
+def simulate_movement():
+    """Move the herd; the optional body sets steps, step_seconds, seed and mode"""
+    data = request.get_json(silent=True) or {}
+    try:
+        steps = int(data.get("steps", 1))
+        step_seconds = int(data.get("step_seconds", 300))
+        seed = None if data.get("seed") is None else int(data["seed"])
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "steps, step_seconds and seed must be integers"}), 400
+    mode = data.get("mode", "bulk")
+    
+    if not 1 <= steps <= SIMULATION_MAX_STEPS:
+        return jsonify({"success": False, "message": f"steps must be between 1 and {SIMULATION_MAX_STEPS}"}), 400
+    if step_seconds < 1:
+        return jsonify({"success": False, "message": "step_seconds must be positive"}), 400
+    if mode not in SIMULATION_MODES:
+        return jsonify({"success": False, "message": f"mode must be one of {', '.join(SIMULATION_MODES)}"}), 400
+    
+    summary = simulate_herd(steps, step_seconds, seed, mode)
+    return jsonify(dict(summary, **{
         "success": True,
-        "message": f"Simulated movement for {len(animals)} animals",
-        "exited": exited_count
+        "message": f"Simulated {summary['steps']} step(s) of movement for {summary['animals']} animals"
+    }))
+
+@app.route("/api/stream", methods=["GET"])
+def stream():
+    """Server-Sent Events feed of position, status and alert deltas"""
+    try:
+        subscriber = event_hub.subscribe()
+    except HubFull as e:
+        # Each stream pins a worker thread; past the cap, clients fall back to polling
+        response = jsonify({"success": False, "message": str(e)})
+        response.status_code = 503
+        response.headers["Retry-After"] = "30"
+        return response
+    
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            yield from subscriber.messages()
+        finally:
+            event_hub.unsubscribe(subscriber)
+    
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition of this worker's request, SQL, cache and queue metrics"""
+    body = request_metrics.render({
+        "device_cache": device_registry.stats(),
+        "alert_rules": alert_engine.stats(),
+        "spatial_index": animal_index.stats(),
+        "event_hub": event_hub.stats(),
+        "ingest_queue": write_behind.stats() if write_behind else None
     })
+    return Response(body, mimetype="text/plain; version=0.0.4")
 
 @app.route("/api/health", methods=["GET"])
 def health():
-    return jsonify({"status": "healthy", "timestamp": datetime.utcnow().isoformat()})
+    return jsonify({
+        "status": "healthy",
+        "timestamp": datetime.utcnow().isoformat(),
+        "device_cache": device_registry.stats(),
+        "alert_rules": alert_engine.stats(),
+        "spatial_index": animal_index.stats(),
+        "ingest_queue": write_behind.stats() if write_behind else None
+    })
 
 # ============ BLUETOOTH STATUS ROUTES ============
 
@@ -390,32 +1968,49 @@ def bluetooth_status():
     device_ids = data.get("device_ids", [])
     not_found_ids = data.get("not_found_ids", [])
     
+    # Resolve both lists at once; misses cost one IN (...) query per chunk
+    states = device_registry.get_many(list(device_ids) + list(not_found_ids))
+    now = datetime.utcnow()
+    
     updated = []
+    found = []
+    missing = []
     
     # Mark detected animals as IN
     for device_id in device_ids:
-        animal = Animal.query.filter_by(device_id=device_id).first()
+        animal = states.get(device_id)
         if animal:
-            animal.status = "IN"
-            animal.last_seen = datetime.utcnow()
+            animal.update(status="IN", last_seen=now)
             updated.append(device_id)
+            found.append(animal)
     
     # Mark not-found animals as OUT (potential escape)
     for device_id in not_found_ids:
-        animal = Animal.query.filter_by(device_id=device_id).first()
-        if animal and animal.status != "OUT":
+        animal = states.get(device_id)
+        if not animal:
+            continue
+        with animal.lock:
+            if animal.status == "OUT":
+                continue
             animal.status = "OUT"
-            
-            # Create exit alert
-            alert = Alert(
-                animal_id=animal.id,
-                alert_type="EXIT",
-                message=f"ALERT: {animal.name} is out of Bluetooth range! (May have escaped)"
-            )
-            db.session.add(alert)
-            updated.append(device_id)
+        updated.append(device_id)
+        missing.append(animal)
     
-    db.session.commit()
+    try:
+        version = next_version() if found or missing else None
+        for chunk in _chunks({a.id for a in found}):
+            db.session.execute(update(Animal).where(Animal.id.in_(chunk)).values(status="IN", last_seen=now, version=version))
+        for chunk in _chunks({a.id for a in missing}):
+            db.session.execute(update(Animal).where(Animal.id.in_(chunk)).values(status="OUT", version=version))
+        new_alerts = insert_exit_alerts(missing, "ALERT: {name} is out of Bluetooth range! (May have escaped)")
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        device_registry.invalidate(*states)
+        raise
+    alert_engine.forget(*(a.id for a in found + missing))
+    
+    publish_deltas([animal_delta(a) for a in found + missing], new_alerts)
     
     return jsonify({
         "success": True,
@@ -426,8 +2021,7 @@ def bluetooth_status():
 @app.route("/api/animals/ble-status", methods=["GET"])
 def ble_status():
     """Get all animals with their last known Bluetooth status"""
-    animals = Animal.query.all()
-    return jsonify([{
+    return versioned_listing(lambda a: {
         "id": a.id,
         "name": a.name,
         "device_id": a.device_id,
@@ -435,7 +2029,7 @@ def ble_status():
         "last_seen": a.last_seen.isoformat() if a.last_seen else None,
         "battery_level": a.battery_level,
         "signal_strength": a.signal_strength
-    } for a in animals])
+    })
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
@@ -0,0 +1,73 @@
+"""UDP load generator for gateway.py.
+
+Sends binary fix records for the BENCH-* devices that herd_bench.py seeds,
+as fast as possible or at a fixed rate. A share of the datagrams are sent
+twice to exercise deduplication. Watch the gateway's stats log for the
+applied rate.
+
+    python benchmarks/herd_bench.py --animals 10000 --mode client --requests 5 \\
+        --database-url sqlite:////tmp/gw.db
+    DATABASE_URL=sqlite:////tmp/gw.db python gateway.py --tcp-port 0 &
+    python benchmarks/gateway_load.py --devices 10000 --packets 200000
+"""
+import argparse
+import os
+import random
+import socket
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import Fix, pack_fixes  # noqa: E402
+
+FARM_LAT = -1.2921
+FARM_LNG = 36.8219
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5010)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--packets", type=int, default=100000, help="fix records to send")
+    parser.add_argument("--per-datagram", type=int, default=1, help="records per datagram")
+    parser.add_argument("--rate", type=float, default=0, help="records per second; 0 = unthrottled")
+    parser.add_argument("--duplicates", type=float, default=0.05, help="share of datagrams sent twice")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    # Seeded animals were last seen at seed time; stay after it so fixes are not stale
+    start_ts = datetime.utcnow().replace(microsecond=0) + timedelta(seconds=1)
+    sent = 0
+    started = time.perf_counter()
+    while sent < args.packets:
+        fixes = []
+        for _ in range(min(args.per_datagram, args.packets - sent)):
+            fixes.append(Fix(
+                device_id=f"BENCH-{rng.randrange(args.devices):06d}",
+                lat=FARM_LAT + rng.gauss(0, 0.004),
+                lng=FARM_LNG + rng.gauss(0, 0.004),
+                battery=rng.uniform(5, 100),
+                signal=rng.uniform(10, 100),
+                timestamp=start_ts + timedelta(seconds=(sent + len(fixes)) // args.devices)
+            ))
+        datagram = pack_fixes(fixes)
+        sock.sendto(datagram, (args.host, args.port))
+        if rng.random() < args.duplicates:
+            sock.sendto(datagram, (args.host, args.port))
+        sent += len(fixes)
+
+        if args.rate:
+            delay = sent / args.rate - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    elapsed = time.perf_counter() - started
+    print(f"Sent {sent} records in {elapsed:.2f}s ({sent / elapsed:.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
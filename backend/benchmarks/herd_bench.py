@@ -0,0 +1,336 @@
+"""Synthetic herd benchmark for the tracker API.
+
+Seeds a database with a synthetic herd, then drives the hot endpoints
+through the Flask test client (in process, with SQL statement counts) and/or
+a real gunicorn server (over HTTP), and writes throughput and latency
+percentiles per endpoint to a JSON file. See README.md in this directory.
+
+Run from the backend directory:
+
+    python benchmarks/herd_bench.py --animals 10000 --out bench.json
+    python benchmarks/herd_bench.py --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import event, insert
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FARM_LAT = -1.2921
+FARM_LNG = 36.8219
+DEVICE_PREFIX = "BENCH-"
+
+
+# ============ SCENARIOS ============
+
+def device_id(i):
+    return f"{DEVICE_PREFIX}{i:06d}"
+
+
+def scenarios(animals, rng):
+    """(name, method, path, body factory, share of --requests) per endpoint"""
+    def gps_update():
+        i = rng.randrange(animals)
+        return {
+            "device_id": device_id(i),
+            "lat": FARM_LAT + rng.gauss(0, 0.004),
+            "lng": FARM_LNG + rng.gauss(0, 0.004),
+            "battery": rng.uniform(5, 100),
+            "signal": rng.uniform(10, 100)
+        }
+
+    def bluetooth_status():
+        sample = rng.sample(range(animals), min(animals, 250))
+        split = len(sample) * 9 // 10
+        return {
+            "device_ids": [device_id(i) for i in sample[:split]],
+            "not_found_ids": [device_id(i) for i in sample[split:]]
+        }
+
+    def set_geofence():
+        return {"lat": FARM_LAT, "lng": FARM_LNG, "radius": rng.choice([0.45, 0.5, 0.55])}
+
+    return [
+        ("gps_update", "POST", "/api/gps", gps_update, 1.0),
+        ("bluetooth_status", "POST", "/api/bluetooth/status", bluetooth_status, 0.2),
+        ("list_animals", "GET", "/api/animals", None, 0.1),
+        ("get_alerts", "GET", "/api/alerts?limit=100", None, 0.5),
+        ("set_geofence", "POST", "/api/geofence", set_geofence, 0.05),
+    ]
+
+
+def summarize(latencies, elapsed, statements=None, errors=0):
+    ms = np.array(latencies) * 1000
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "sql_per_request": None,
+        "sql_max": None
+    }
+    if statements:
+        result["sql_per_request"] = round(sum(statements) / len(statements), 2)
+        result["sql_max"] = max(statements)
+    return result
+
+
+# ============ SETUP ============
+
+def import_app(database_url):
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.insert(0, BACKEND_DIR)
+    import app as tracker
+    return tracker
+
+
+def seed_herd(tracker, animals, rng):
+    """Bulk insert a synthetic herd, skipped if the database already has it"""
+    Animal = tracker.Animal
+    db = tracker.db
+    with tracker.app.app_context():
+        existing = Animal.query.filter(Animal.device_id.like(f"{DEVICE_PREFIX}%")).count()
+        if existing >= animals:
+            return existing
+
+        now = datetime.utcnow()
+        version = tracker.next_version()
+        rows = []
+        for i in range(existing, animals):
+            lat = FARM_LAT + rng.gauss(0, 0.003)
+            lng = FARM_LNG + rng.gauss(0, 0.003)
+            rows.append({
+                "name": f"Bench {i}",
+                "ear_tag": f"BT{i:06d}",
+                "species": "Cattle",
+                "device_id": device_id(i),
+                "lat": lat,
+                "lng": lng,
+                "status": tracker.check_geofence(lat, lng),
+                "battery_level": rng.uniform(20, 100),
+                "signal_strength": rng.uniform(30, 100),
+                "last_seen": now,
+                "version": version
+            })
+        for chunk in tracker._chunks(rows, 5000):
+            db.session.execute(insert(Animal), chunk)
+        db.session.commit()
+
+    # The registry was warmed before the herd existed
+    tracker.device_registry.clear()
+    tracker.alert_engine.clear()
+    return animals
+
+
+# ============ DRIVERS ============
+
+def run_test_client(tracker, plan, requests):
+    """Sequential requests through the Flask test client, counting SQL statements"""
+    client = tracker.app.test_client()
+    with tracker.app.app_context():
+        engine = tracker.db.engine
+    counter = [0]
+
+    def count(*args):
+        counter[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    results = {}
+    try:
+        for name, method, path, body, share in plan:
+            n = max(5, int(requests * share))
+            latencies, statements, errors = [], [], 0
+            started = time.perf_counter()
+            for _ in range(n):
+                payload = body() if body else None
+                counter[0] = 0
+                t0 = time.perf_counter()
+                response = client.open(path, method=method, json=payload)
+                latencies.append(time.perf_counter() - t0)
+                statements.append(counter[0])
+                if response.status_code >= 400:
+                    errors += 1
+            results[name] = summarize(latencies, time.perf_counter() - started, statements, errors)
+            print(f"  client   {name:18} {results[name]['p50_ms']:9.2f} ms p50  "
+                  f"{results[name]['throughput_rps']:9.1f} req/s  {results[name]['sql_per_request']} sql")
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(database_url, workers, threads):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url)
+    process = subprocess.Popen(
+        ["gunicorn", "app:app", "--worker-class", "gthread", "--workers", str(workers),
+         "--threads", str(threads), "--bind", f"127.0.0.1:{port}", "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            urllib.request.urlopen(base + "/api/health", timeout=1).read()
+            return process, base
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not become healthy")
+
+
+def http_request(base, method, path, payload):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(base + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+            ok = True
+    except urllib.error.HTTPError as e:
+        e.read()
+        ok = e.code < 400
+    except OSError:
+        ok = False
+    return time.perf_counter() - t0, ok
+
+
+def run_gunicorn(base, plan, requests, concurrency):
+    """Concurrent HTTP requests against a running gunicorn"""
+    results = {}
+    with ThreadPoolExecutor(concurrency) as pool:
+        for name, method, path, body, share in plan:
+            n = max(5, int(requests * share))
+            payloads = [body() if body else None for _ in range(n)]
+            started = time.perf_counter()
+            outcomes = list(pool.map(lambda p: http_request(base, method, path, p), payloads))
+            elapsed = time.perf_counter() - started
+            errors = sum(1 for _, ok in outcomes if not ok)
+            results[name] = summarize([t for t, _ in outcomes], elapsed, errors=errors)
+            print(f"  gunicorn {name:18} {results[name]['p50_ms']:9.2f} ms p50  "
+                  f"{results[name]['throughput_rps']:9.1f} req/s  {errors} errors")
+    return results
+
+
+# ============ REPORTING ============
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path, after_path):
+    """Print per-endpoint changes between two result files"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')}")
+    for mode, endpoints in after["results"].items():
+        for name, new in endpoints.items():
+            old = before["results"].get(mode, {}).get(name)
+            if not old:
+                continue
+            line = f"{mode:8} {name:18}"
+            for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+                if old[key]:
+                    line += f"  {key} {old[key]:>9} -> {new[key]:>9} ({(new[key] / old[key] - 1) * 100:+6.1f}%)"
+            if old.get("sql_per_request") is not None:
+                line += f"  sql {old['sql_per_request']} -> {new['sql_per_request']}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--animals", type=int, default=1000, help="herd size (100 to 100000)")
+    parser.add_argument("--requests", type=int, default=500, help="requests for gps_update; other endpoints are scaled down")
+    parser.add_argument("--mode", choices=("client", "gunicorn", "both"), default="both")
+    parser.add_argument("--database-url", help="SQLAlchemy URL; defaults to a fresh temporary SQLite file")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=16, help="HTTP clients in gunicorn mode")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if not 1 <= args.animals <= 100000:
+        parser.error("--animals must be between 1 and 100000")
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="herd-bench-"), "bench.db")
+
+    rng = random.Random(args.seed)
+    tracker = import_app(database_url)
+    print(f"Seeding {args.animals} animals into {database_url}")
+    seed_herd(tracker, args.animals, rng)
+    plan = scenarios(args.animals, rng)
+
+    results = {}
+    if args.mode in ("client", "both"):
+        results["client"] = run_test_client(tracker, plan, args.requests)
+    if args.mode in ("gunicorn", "both"):
+        process, base = start_gunicorn(database_url, args.workers, args.threads)
+        try:
+            results["gunicorn"] = run_gunicorn(base, plan, args.requests, args.concurrency)
+        finally:
+            process.terminate()
+            process.wait(30)
+
+    with tracker.app.app_context():
+        dialect = tracker.db.engine.dialect.name
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "animals": args.animals,
+            "requests": args.requests,
+            "database": dialect,
+            "workers": args.workers,
+            "threads": args.threads,
+            "concurrency": args.concurrency,
+            "python": platform.python_version()
+        },
+        "results": results
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""In-process fan-out hub for the /api/stream Server-Sent Events endpoint.
+
+Write paths publish small deltas after they commit. Each event is serialised
+once and the same string is handed to every subscriber queue, so one write
+reaches N open dashboards without N database reads or N JSON encodes.
+
+Under gunicorn's gthread worker every open stream holds one of the worker's
+threads for as long as it is connected. The hub therefore admits at most
+MAX_SUBSCRIBERS streams, well below the thread count, and refuses the rest,
+so dashboards can never starve the API of threads.
+"""
+import json
+import os
+import queue
+import threading
+
+# Events buffered per subscriber before it is considered too slow and dropped
+SUBSCRIBER_QUEUE_SIZE = 256
+# Open streams per worker; keep it below the worker's thread count (32 in the Procfile)
+MAX_SUBSCRIBERS = int(os.environ.get("STREAM_MAX_SUBSCRIBERS", 16))
+# Seconds between keepalive comments on an idle stream
+KEEPALIVE_SECONDS = 15
+
+
+def format_sse(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    def __init__(self, max_queue):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = False
+
+    def messages(self, keepalive=KEEPALIVE_SECONDS):
+        """Yield SSE chunks until the hub drops this subscriber"""
+        while not self.dropped:
+            try:
+                yield self.queue.get(timeout=keepalive)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+
+
+class HubFull(Exception):
+    """Raised by EventHub.subscribe when the hub already has max_subscribers"""
+
+
+class EventHub:
+    def __init__(self, max_queue=SUBSCRIBER_QUEUE_SIZE, max_subscribers=MAX_SUBSCRIBERS):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.published = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def subscribe(self):
+        subscriber = Subscriber(self.max_queue)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                raise HubFull(f"At most {self.max_subscribers} live streams per worker")
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        with self._lock:
+            message = format_sse(self._next_id, event, data)
+            self._next_id += 1
+            self.published += 1
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                # A stalled client: drop it, the browser reconnects and resyncs
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+                self.dropped += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "max_subscribers": self.max_subscribers,
+                "published": self.published,
+                "dropped": self.dropped,
+                "rejected": self.rejected
+            }
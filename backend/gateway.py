@@ -0,0 +1,338 @@
+"""Standalone asyncio ingest gateway for collars that speak raw UDP or TCP.
+
+Run from the backend directory next to the API, against the same database:
+
+    python gateway.py --udp-port 5010 --tcp-port 5011
+
+Two frame formats are accepted on both transports:
+
+- binary: the 30-byte records of ingest.BINARY_CONTENT_TYPE, any number per
+  datagram or back to back on a TCP stream
+- text: ``$device_id,lat,lng,battery,signal,timestamp`` lines, where trailing
+  fields may be empty or omitted. A datagram or connection starting with
+  ``$`` is read as text.
+
+Parsed fixes are deduplicated (collars retransmit on flaky links) and
+buffered. One flush runs at a time, on a worker thread, and hands each batch
+to ``app.flush_fixes``, which runs ``app.apply_fixes``, the ingest path the
+HTTP endpoints use. The gateway is a separate process with its own device
+cache and fence, so before each flush it reloads the fence if its version
+changed and evicts animals the API changed or deleted since the last flush.
+Fence edits therefore apply within GEOFENCE_CHECK_SECONDS, and fixes for a
+deleted animal are rejected from the next flush on. The event loop only
+parses and buffers. When the buffer is full, UDP datagrams are dropped and
+counted, and TCP connections stop being read until it drains.
+
+Live stream events are published in the gateway process, so connected
+dashboards pick these changes up through their poll and delta sync.
+"""
+import argparse
+import asyncio
+import logging
+import socket
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from ingest import FIX_RECORD, Fix, fix_from_record, fix_timestamp, parse_timestamp, unpack_records
+
+logger = logging.getLogger("gateway")
+
+TEXT_PREFIX = ord("$")
+UDP_RECEIVE_BUFFER = 8 * 1024 * 1024
+
+
+# ============ FRAME PARSING ============
+
+def _optional_float(value, name):
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}")
+
+
+def parse_text_frame(line):
+    """Build a Fix from one ``$device_id,lat,lng,battery,signal,timestamp`` line"""
+    try:
+        fields = line.decode("ascii").strip().lstrip("$").split(",")
+    except UnicodeDecodeError:
+        raise ValueError("Frame is not ASCII")
+    fields += [""] * (6 - len(fields))
+    if not fields[0]:
+        raise ValueError("Device ID required")
+
+    lat = _optional_float(fields[1], "lat")
+    lng = _optional_float(fields[2], "lng")
+    if lat is not None and not -90 <= lat <= 90:
+        raise ValueError("Invalid lat")
+    if lng is not None and not -180 <= lng <= 180:
+        raise ValueError("Invalid lng")
+
+    return Fix(
+        device_id=fields[0],
+        lat=lat,
+        lng=lng,
+        battery=_optional_float(fields[3], "battery"),
+        signal=_optional_float(fields[4], "signal"),
+        timestamp=fix_timestamp(parse_timestamp(fields[5] or None)),
+    )
+
+
+def parse_frames(data):
+    """Parse a datagram (or complete TCP chunk); returns (fixes, invalid_count)"""
+    fixes = []
+    invalid = 0
+    if data[:1] and data[0] == TEXT_PREFIX:
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                fixes.append(parse_text_frame(line))
+            except ValueError:
+                invalid += 1
+        return fixes, invalid
+
+    try:
+        records = unpack_records(data)
+    except ValueError:
+        return [], 1
+    for record in records:
+        try:
+            fixes.append(fix_from_record(record))
+        except ValueError:
+            invalid += 1
+    return fixes, invalid
+
+
+class Deduper:
+    """Remembers recent (device, timestamp, lat, lng) keys to drop retransmissions.
+
+    Fixes without a device timestamp cannot be told apart from a genuine
+    repeat and are always kept.
+    """
+
+    def __init__(self, max_size=200000):
+        self.max_size = max_size
+        self._seen = OrderedDict()
+
+    def is_duplicate(self, fix):
+        if fix.timestamp is None:
+            return False
+        key = (fix.device_id, fix.timestamp, fix.lat, fix.lng)
+        if key in self._seen:
+            return True
+        self._seen[key] = None
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+        return False
+
+
+# ============ BATCHING ============
+
+class Gateway:
+    def __init__(self, flush_fn, batch_size=2000, flush_interval=0.25, max_pending=100000, dedupe_size=200000):
+        # flush_fn(fixes) -> one result dict per fix; blocking, run off the event loop
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.deduper = Deduper(dedupe_size)
+
+        self._pending = []
+        self._ready = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="gateway-flush")
+
+        self.frames = 0
+        self.received = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.applied = 0
+        self.rejected = 0
+        self.batches = 0
+        self.failed = 0
+
+    @property
+    def full(self):
+        return len(self._pending) >= self.max_pending
+
+    def feed(self, data):
+        """Parse and buffer one frame's worth of bytes"""
+        fixes, invalid = parse_frames(data)
+        self.frames += 1
+        self.received += len(fixes)
+        self.invalid += invalid
+
+        for fix in fixes:
+            if self.deduper.is_duplicate(fix):
+                self.duplicates += 1
+            elif self.full:
+                self.dropped += 1
+            else:
+                self._pending.append(fix)
+
+        if len(self._pending) >= self.batch_size:
+            self._ready.set()
+        if self.full:
+            self._drained.clear()
+
+    async def wait_drained(self):
+        await self._drained.wait()
+
+    async def run(self):
+        """Flush loop: one batch at a time, at least every flush_interval"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._ready.clear()
+            if self._pending:
+                await self.flush(loop)
+
+    async def flush(self, loop=None):
+        loop = loop or asyncio.get_running_loop()
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            if not self.full:
+                self._drained.set()
+            try:
+                results = await loop.run_in_executor(self._executor, self.flush_fn, batch)
+            except Exception:
+                logger.exception("Gateway flush of %d fixes failed", len(batch))
+                self.failed += len(batch)
+            else:
+                accepted = sum(1 for r in results if r["success"])
+                self.applied += accepted
+                self.rejected += len(results) - accepted
+            self.batches += 1
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "received": self.received,
+            "invalid": self.invalid,
+            "duplicates": self.duplicates,
+            "dropped": self.dropped,
+            "pending": len(self._pending),
+            "applied": self.applied,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "batches": self.batches
+        }
+
+
+# ============ TRANSPORTS ============
+
+class UDPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, gateway):
+        self.gateway = gateway
+
+    def datagram_received(self, data, addr):
+        self.gateway.feed(data)
+
+
+class TCPProtocol(asyncio.Protocol):
+    """One collar connection: fixed-size binary records or ``$`` text lines"""
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.buffer = bytearray()
+        self.text = None
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer += data
+        if self.text is None:
+            self.text = self.buffer[0] == TEXT_PREFIX
+
+        if self.text:
+            end = self.buffer.rfind(b"\n") + 1
+        else:
+            end = len(self.buffer) - len(self.buffer) % FIX_RECORD.size
+        if end:
+            self.gateway.feed(bytes(self.buffer[:end]))
+            del self.buffer[:end]
+
+        if self.gateway.full:
+            self.transport.pause_reading()
+            asyncio.get_running_loop().create_task(self._resume_when_drained())
+
+    async def _resume_when_drained(self):
+        await self.gateway.wait_drained()
+        if not self.transport.is_closing():
+            self.transport.resume_reading()
+
+
+async def report(gateway, interval):
+    last = gateway.received
+    while True:
+        await asyncio.sleep(interval)
+        stats = gateway.stats()
+        rate = (stats["received"] - last) / interval
+        last = stats["received"]
+        logger.info("%.0f fixes/s %s", rate, stats)
+
+
+async def serve(args):
+    import app as tracker  # the Flask app: models, registry, zones and alert rules
+
+    gateway = Gateway(
+        tracker.flush_fixes,
+        batch_size=args.batch_size,
+        flush_interval=args.flush_ms / 1000,
+        max_pending=args.max_pending
+    )
+    loop = asyncio.get_running_loop()
+    servers = []
+    if args.udp_port:
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: UDPProtocol(gateway), local_addr=(args.host, args.udp_port)
+        )
+        # Absorb bursts while a flush holds the GIL; the kernel may cap this
+        transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER)
+        servers.append(transport)
+        logger.info("Listening for UDP on %s:%d", args.host, args.udp_port)
+    if args.tcp_port:
+        server = await loop.create_server(lambda: TCPProtocol(gateway), args.host, args.tcp_port)
+        servers.append(server)
+        logger.info("Listening for TCP on %s:%d", args.host, args.tcp_port)
+
+    reporter = loop.create_task(report(gateway, args.stats_seconds))
+    try:
+        await gateway.run()
+    finally:
+        reporter.cancel()
+        for server in servers:
+            server.close()
+        await gateway.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP/TCP ingest gateway for GPS collars")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--udp-port", type=int, default=5010, help="0 to disable")
+    parser.add_argument("--tcp-port", type=int, default=5011, help="0 to disable")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--flush-ms", type=int, default=250)
+    parser.add_argument("--max-pending", type=int, default=100000)
+    parser.add_argument("--stats-seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
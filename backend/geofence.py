@@ -0,0 +1,265 @@
+"""Geofence engine holding many named circle and polygon zones.
+
+Zones are registered in a uniform lat/lng grid keyed by their bounding boxes,
+so a point lookup only tests the handful of zones whose box overlaps the
+point's cell instead of every zone on the farm.
+"""
+import math
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = 111.32
+
+# Zones of this type mark places an animal must not be (OUT even inside a paddock)
+EXCLUSION = "exclusion"
+ZONE_TYPES = ("paddock", "water", "exclusion")
+
+# Grid cell size in degrees (~1.1 km at the equator)
+DEFAULT_CELL_DEG = 0.01
+# Zones covering more cells than this are checked on every lookup instead
+MAX_CELLS_PER_ZONE = 4096
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lng = math.radians(lng2 - lng1)
+    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_km_many(lat0, lng0, lats, lngs):
+    """Distances in km from one point to arrays of points"""
+    lats_rad = np.radians(lats)
+    delta_lat = lats_rad - math.radians(lat0)
+    delta_lng = np.radians(lngs) - math.radians(lng0)
+    a = np.sin(delta_lat/2)**2 + math.cos(math.radians(lat0)) * np.cos(lats_rad) * np.sin(delta_lng/2)**2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+
+class CircleZone:
+    shape = "circle"
+
+    def __init__(self, name, lat, lng, radius_km, zone_type="paddock"):
+        self.name = name
+        self.zone_type = zone_type
+        self.lat = lat
+        self.lng = lng
+        self.radius_km = radius_km
+
+        dlat = radius_km / KM_PER_DEGREE
+        dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        self.bbox = (lat - dlat, lng - dlng, lat + dlat, lng + dlng)
+
+    def contains(self, lat, lng):
+        return haversine_km(self.lat, self.lng, lat, lng) <= self.radius_km
+
+    def contains_many(self, lats, lngs):
+        return haversine_km_many(self.lat, self.lng, lats, lngs) <= self.radius_km
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "zone_type": self.zone_type,
+            "shape": self.shape,
+            "lat": self.lat,
+            "lng": self.lng,
+            "radius": self.radius_km
+        }
+
+
+class PolygonZone:
+    shape = "polygon"
+
+    def __init__(self, name, points, zone_type="paddock"):
+        self.name = name
+        self.zone_type = zone_type
+        self.points = [(float(lat), float(lng)) for lat, lng in points]
+
+        lats = [p[0] for p in self.points]
+        lngs = [p[1] for p in self.points]
+        self.bbox = (min(lats), min(lngs), max(lats), max(lngs))
+
+        # Edge arrays for ray casting: (lat1, lat2, lng1, lng per degree of lat)
+        self.edges = []
+        for i, (lat1, lng1) in enumerate(self.points):
+            lat2, lng2 = self.points[i - 1]
+            if lat1 == lat2:
+                continue
+            self.edges.append((lat1, lat2, lng1, (lng2 - lng1) / (lat2 - lat1)))
+
+    def contains(self, lat, lng):
+        inside = False
+        for lat1, lat2, lng1, slope in self.edges:
+            if (lat1 > lat) != (lat2 > lat):
+                if lng < lng1 + (lat - lat1) * slope:
+                    inside = not inside
+        return inside
+
+    def contains_many(self, lats, lngs):
+        # Loop over the (few) edges, vectorised over the (many) points
+        inside = np.zeros(len(lats), dtype=bool)
+        for lat1, lat2, lng1, slope in self.edges:
+            crosses = (lat1 > lats) != (lat2 > lats)
+            inside ^= crosses & (lngs < lng1 + (lats - lat1) * slope)
+        return inside
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "zone_type": self.zone_type,
+            "shape": self.shape,
+            "points": [list(p) for p in self.points]
+        }
+
+
+def zone_from_dict(data):
+    """Validate a zone definition from JSON, raising ValueError if it is invalid"""
+    if not isinstance(data, dict):
+        raise ValueError("Zone must be an object")
+
+    name = data.get("name")
+    if not name:
+        raise ValueError("Zone name required")
+
+    zone_type = data.get("zone_type", "paddock")
+    if zone_type not in ZONE_TYPES:
+        raise ValueError(f"zone_type must be one of {', '.join(ZONE_TYPES)}")
+
+    try:
+        if data.get("points") is not None:
+            points = data["points"]
+            if not isinstance(points, list) or len(points) < 3:
+                raise ValueError("Polygon must have at least 3 points")
+            valid = []
+            for point in points:
+                if not isinstance(point, (list, tuple)) or len(point) != 2:
+                    raise ValueError("Each point must be [lat, lng]")
+                valid.append(_valid_point(point[0], point[1]))
+            return PolygonZone(name, valid, zone_type)
+
+        lat, lng = _valid_point(data.get("lat"), data.get("lng"))
+        radius_km = float(data.get("radius"))
+        if not 0 < radius_km < math.inf:
+            raise ValueError("Radius must be positive")
+        return CircleZone(name, lat, lng, radius_km, zone_type)
+    except TypeError:
+        raise ValueError("Invalid coordinate format")
+
+
+def _valid_point(lat, lng):
+    lat = float(lat)
+    lng = float(lng)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("Invalid coordinates")
+    return lat, lng
+
+
+class ZoneIndex:
+    """Immutable uniform-grid index over a set of zones"""
+
+    def __init__(self, zones=(), cell_deg=DEFAULT_CELL_DEG):
+        self.zones = list(zones)
+        self.cell_deg = cell_deg
+        self.cells = {}
+        self.oversized = []
+
+        for zone in self.zones:
+            min_lat, min_lng, max_lat, max_lng = zone.bbox
+            row0, col0 = self._cell(min_lat, min_lng)
+            row1, col1 = self._cell(max_lat, max_lng)
+            if (row1 - row0 + 1) * (col1 - col0 + 1) > MAX_CELLS_PER_ZONE:
+                self.oversized.append(zone)
+                continue
+            for row in range(row0, row1 + 1):
+                for col in range(col0, col1 + 1):
+                    self.cells.setdefault((row, col), []).append(zone)
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def lookup(self, lat, lng):
+        """Return every zone containing the point"""
+        found = []
+        for candidates in (self.cells.get(self._cell(lat, lng), ()), self.oversized):
+            for zone in candidates:
+                min_lat, min_lng, max_lat, max_lng = zone.bbox
+                if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng and zone.contains(lat, lng):
+                    found.append(zone)
+        return found
+
+    def status(self, lat, lng, zones=None):
+        """IN when inside any zone and no exclusion zone, otherwise OUT"""
+        if zones is None:
+            zones = self.lookup(lat, lng)
+        if not zones or any(z.zone_type == EXCLUSION for z in zones):
+            return "OUT"
+        return "IN"
+
+    def inside_many(self, lats, lngs):
+        """Vectorised status(): True where a point is IN, for arrays of points"""
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        included = np.zeros(len(lats), dtype=bool)
+        excluded = np.zeros(len(lats), dtype=bool)
+
+        for zone in self.zones:
+            min_lat, min_lng, max_lat, max_lng = zone.bbox
+            candidates = np.flatnonzero(
+                (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+            )
+            if not candidates.size:
+                continue
+            hits = candidates[zone.contains_many(lats[candidates], lngs[candidates])]
+            if zone.zone_type == EXCLUSION:
+                excluded[hits] = True
+            else:
+                included[hits] = True
+
+        return included & ~excluded
+
+
+class GeofenceConfig:
+    """Immutable snapshot of the active fence: the farm circle plus named zones.
+
+    ``version`` comes from the database so every worker can tell whether its
+    snapshot is current. Readers grab the module-level reference once and
+    never see a half-applied change.
+    """
+
+    def __init__(self, version, center_lat, center_lng, radius_km, zones=()):
+        self.version = version
+        self.center_lat = center_lat
+        self.center_lng = center_lng
+        self.radius_km = radius_km
+        self.farm = CircleZone("farm", center_lat, center_lng, radius_km)
+        self.index = ZoneIndex([self.farm] + list(zones))
+
+    @property
+    def zones(self):
+        """The named zones, without the farm circle"""
+        return [z for z in self.index.zones if z is not self.farm]
+
+
+_lock = threading.RLock()
+_active_config = GeofenceConfig(0, -1.2921, 36.8219, 0.5)
+
+
+def get_config():
+    return _active_config
+
+
+def get_zone_index():
+    return _active_config.index
+
+
+def set_config(config):
+    """Atomically swap in a new configuration"""
+    global _active_config
+    with _lock:
+        _active_config = config
+    return config
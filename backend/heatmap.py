@@ -0,0 +1,96 @@
+"""Occupancy heatmap aggregation: fix counts per grid cell and time bucket.
+
+Every ingested fix is binned as it is written. The cell is a BASE_CELL_DEG
+square (~55 m), counted once in its hour and once in its day. A heatmap for
+any range reads only these counts, never the position history:
+
+- whole days in the range come from daily buckets, the partial days at
+  either edge from hourly buckets (ranges are rounded out to the hour)
+- coarser zoom levels merge 2**level x 2**level base cells on read
+
+Counts are fixes, so a collar reporting twice as often weighs twice as much.
+"""
+import math
+from collections import Counter
+
+from trackstore import to_epoch
+
+BASE_CELL_DEG = 0.0005
+MAX_LEVEL = 10  # 0.5 degree cells
+
+HOUR = 3600
+DAY = 86400
+PERIODS = (HOUR, DAY)
+
+
+def cell_of(lat, lng):
+    return math.floor(lat / BASE_CELL_DEG), math.floor(lng / BASE_CELL_DEG)
+
+
+def bin_positions(positions):
+    """Counter of (period, bucket, lat_cell, lng_cell) for (animal_id, datetime, lat, lng, status) fixes"""
+    counts = Counter()
+    for _, seen_at, lat, lng, _ in positions:
+        if lat is None or lng is None:
+            continue
+        ts = to_epoch(seen_at)
+        lat_cell, lng_cell = cell_of(lat, lng)
+        for period in PERIODS:
+            counts[(period, ts - ts % period, lat_cell, lng_cell)] += 1
+    return counts
+
+
+def bucket_ranges(start, end, hourly_since=None):
+    """(period, first_bucket, end_bucket) ranges covering epoch [start, end).
+
+    The range is rounded out to whole hours. Whole days inside it use daily
+    buckets and the hours before and after use hourly ones. Hourly buckets
+    before ``hourly_since`` may have been purged, so an edge before it is
+    rounded out to the whole day instead.
+    """
+    start -= start % HOUR
+    end += -end % HOUR
+    if hourly_since is not None:
+        if start < hourly_since:
+            start -= start % DAY
+        if end < hourly_since:
+            end += -end % DAY
+    first_day = start + -start % DAY
+    last_day = end - end % DAY
+    if first_day >= last_day:
+        return [(HOUR, start, end)] if start < end else []
+    ranges = [(HOUR, start, first_day), (DAY, first_day, last_day), (HOUR, last_day, end)]
+    return [r for r in ranges if r[1] < r[2]]
+
+
+def cell_deg(level):
+    return BASE_CELL_DEG * 2 ** level
+
+
+def coarsen(cells, level):
+    """Merge (lat_cell, lng_cell, count) base cells into cells of a coarser level"""
+    merged = Counter()
+    for lat_cell, lng_cell, count in cells:
+        merged[(lat_cell >> level, lng_cell >> level)] += count
+    return merged
+
+
+def cell_center(lat_cell, lng_cell, level):
+    size = cell_deg(level)
+    return (lat_cell + 0.5) * size, (lng_cell + 0.5) * size
+
+
+def level_for_zoom(zoom, cells_per_tile=32):
+    """The level whose cells are about 1/cells_per_tile of a web-map tile wide"""
+    target = 360 / 2 ** zoom / cells_per_tile
+    return max(0, min(MAX_LEVEL, round(math.log2(target / BASE_CELL_DEG))))
+
+
+def tile_bounds(zoom, x, y):
+    """(min_lat, min_lng, max_lat, max_lng) of a web-mercator tile"""
+    n = 2 ** zoom
+
+    def lat(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return lat(y + 1), x / n * 360 - 180, lat(y), (x + 1) / n * 360 - 180
@@ -0,0 +1,168 @@
+"""Parsing helpers for GPS fixes sent by collars and gateways.
+
+Fixes are normalised into ``Fix`` tuples before they reach the database code in
+``app.py`` so the single and batch GPS endpoints share one ingest path.
+
+Besides JSON, collars on constrained links can send BINARY_CONTENT_TYPE: a
+body of fixed 30-byte little-endian records, one per fix::
+
+    offset  size  field
+    0       16    device_id   ASCII, NUL-padded
+    16      4     lat         int32, degrees * 1e7  (INT32_MIN = not reported)
+    20      4     lng         int32, degrees * 1e7  (INT32_MIN = not reported)
+    24      1     battery     uint8, percent        (255 = not reported)
+    25      1     signal      uint8, percent        (255 = not reported)
+    26      4     timestamp   uint32, epoch seconds (0 = not reported)
+
+A JSON fix of the same content is typically 100-130 bytes.
+"""
+import calendar
+import os
+import struct
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# Upper bound on fixes accepted by one /api/gps/batch request
+MAX_BATCH_FIXES = 5000
+
+# How far past the server clock a fix may be dated. A fix from further in
+# the future would become last_seen and make every later fix look stale.
+MAX_CLOCK_SKEW = timedelta(seconds=int(os.environ.get("MAX_CLOCK_SKEW_SECONDS", 300)))
+
+# lat/lng/battery/signal are None when the packet did not carry them,
+# timestamp is None when the device did not report when the fix was taken
+Fix = namedtuple('Fix', ['device_id', 'lat', 'lng', 'battery', 'signal', 'timestamp'])
+
+BINARY_CONTENT_TYPE = "application/x-tracker-fix"
+FIX_RECORD = struct.Struct("<16siiBBI")
+BINARY_COORD_SCALE = 10000000
+NO_COORD = -2 ** 31
+NO_READING = 0xFF
+
+
+def parse_timestamp(value):
+    """Parse an epoch number or ISO-8601 string into a naive UTC datetime"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ValueError("Invalid timestamp")
+    if isinstance(value, str) and value.replace(".", "", 1).isdigit():
+        value = float(value)
+    if isinstance(value, (int, float)):
+        # Accept epoch milliseconds as well as seconds
+        if value > 1e11:
+            value = value / 1000.0
+        return _from_epoch(value)
+    if isinstance(value, str):
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is not None:
+            try:
+                parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+            except OverflowError:
+                raise ValueError("Invalid timestamp")
+        return parsed
+    raise ValueError("Invalid timestamp")
+
+
+def _from_epoch(value):
+    try:
+        return datetime.utcfromtimestamp(value)
+    except (OverflowError, OSError, ValueError):
+        raise ValueError("Invalid timestamp")
+
+
+def fix_timestamp(timestamp, now=None):
+    """Reject a fix time more than MAX_CLOCK_SKEW ahead of ``now``; returns it unchanged"""
+    if timestamp is not None and timestamp > (now or datetime.utcnow()) + MAX_CLOCK_SKEW:
+        raise ValueError("Timestamp is in the future")
+    return timestamp
+
+
+def _optional_float(data, key):
+    value = data.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid {key}")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {key}")
+
+
+def fix_from_json(data):
+    """Build a ``Fix`` from a JSON object, raising ValueError if it is unusable"""
+    if not isinstance(data, dict):
+        raise ValueError("Fix must be an object")
+
+    device_id = data.get("device_id")
+    if not device_id:
+        raise ValueError("Device ID required")
+
+    lat = _optional_float(data, "lat")
+    lng = _optional_float(data, "lng")
+    if lat is not None and not -90 <= lat <= 90:
+        raise ValueError("Invalid lat")
+    if lng is not None and not -180 <= lng <= 180:
+        raise ValueError("Invalid lng")
+
+    return Fix(
+        device_id=str(device_id),
+        lat=lat,
+        lng=lng,
+        battery=_optional_float(data, "battery"),
+        signal=_optional_float(data, "signal"),
+        timestamp=fix_timestamp(parse_timestamp(data.get("timestamp"))),
+    )
+
+
+def unpack_records(data):
+    """Split a binary body into raw record tuples, raising ValueError if it is truncated"""
+    if len(data) % FIX_RECORD.size:
+        raise ValueError(f"Body must be a whole number of {FIX_RECORD.size}-byte fix records")
+    return list(FIX_RECORD.iter_unpack(data))
+
+
+def fix_from_record(record):
+    """Build a ``Fix`` from one unpacked binary record, raising ValueError if it is unusable"""
+    device_id, lat, lng, battery, signal, timestamp = record
+    try:
+        device_id = device_id.rstrip(b"\0").decode("ascii")
+    except UnicodeDecodeError:
+        raise ValueError("Invalid device_id")
+    if not device_id:
+        raise ValueError("Device ID required")
+
+    lat = None if lat == NO_COORD else lat / BINARY_COORD_SCALE
+    lng = None if lng == NO_COORD else lng / BINARY_COORD_SCALE
+    if lat is not None and not -90 <= lat <= 90:
+        raise ValueError("Invalid lat")
+    if lng is not None and not -180 <= lng <= 180:
+        raise ValueError("Invalid lng")
+
+    return Fix(
+        device_id=device_id,
+        lat=lat,
+        lng=lng,
+        battery=None if battery == NO_READING else float(battery),
+        signal=None if signal == NO_READING else float(signal),
+        timestamp=fix_timestamp(_from_epoch(timestamp)) if timestamp else None,
+    )
+
+
+def pack_fixes(fixes):
+    """Encode Fix tuples as a binary body (for gateways, simulators and benchmarks)"""
+    out = bytearray()
+    for fix in fixes:
+        device_id = fix.device_id.encode("ascii")
+        if len(device_id) > 16:
+            raise ValueError("device_id longer than 16 bytes")
+        out += FIX_RECORD.pack(
+            device_id,
+            NO_COORD if fix.lat is None else round(fix.lat * BINARY_COORD_SCALE),
+            NO_COORD if fix.lng is None else round(fix.lng * BINARY_COORD_SCALE),
+            NO_READING if fix.battery is None else max(0, min(100, round(fix.battery))),
+            NO_READING if fix.signal is None else max(0, min(100, round(fix.signal))),
+            int(calendar.timegm(fix.timestamp.utctimetuple())) if fix.timestamp else 0,
+        )
+    return bytes(out)
@@ -0,0 +1,184 @@
+"""Write-behind queue for GPS ingest with group commit.
+
+Requests validate their fixes, put them on this queue and return; a single
+background worker drains the queue and hands fixes to the ingest function in
+groups, bounded by size and by a time window, so many requests share one
+transaction and one fsync. One worker consuming in FIFO order keeps fixes,
+and therefore alerts, in order per animal.
+
+Every submit() gets a Ticket with a token. Requests answered before their
+fixes commit hand the token out, and ``ticket(token)`` looks up the outcome
+for as long as the ticket is among the last ``keep_results`` finished.
+Tokens are local to the process that queued the fixes.
+"""
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Durability modes
+ACK_AFTER_ENQUEUE = "enqueue"
+ACK_AFTER_FLUSH = "flush"
+
+
+class QueueFull(Exception):
+    """Raised by submit() when accepting the fixes would exceed the queue bound"""
+
+
+class Ticket:
+    """Completion handle for one submit() call"""
+
+    def __init__(self):
+        self.token = uuid.uuid4().hex
+        self._done = threading.Event()
+        self.results = None
+        self.error = None
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the fixes are committed; returns False on timeout"""
+        return self._done.wait(timeout)
+
+    def _finish(self, results=None, error=None):
+        self.results = results
+        self.error = error
+        self._done.set()
+
+
+class WriteBehindQueue:
+    def __init__(self, flush_fn, max_size=20000, flush_size=1000, flush_interval=0.2, keep_results=10000):
+        # flush_fn(fixes) -> one result per fix, committing them in one transaction
+        self.flush_fn = flush_fn
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.keep_results = keep_results
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._tickets = {}  # token -> Ticket, queued or among the last keep_results finished
+        self._finished = deque()
+        self._thread = None
+        self._stopping = False
+
+        self.enqueued = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failed = 0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, fixes):
+        """Queue fixes for the next group commit and return their Ticket"""
+        with self._lock:
+            if self._stopping:
+                raise QueueFull("Ingest queue is shutting down")
+            if self._pending + len(fixes) > self.max_size:
+                self.rejected += len(fixes)
+                raise QueueFull("Ingest queue is full")
+            self._pending += len(fixes)
+            self.enqueued += len(fixes)
+            ticket = Ticket()
+            self._tickets[ticket.token] = ticket
+
+        self._queue.put((fixes, ticket))
+        return ticket
+
+    def ticket(self, token):
+        """The Ticket for a token, or None if it is unknown or its result was discarded"""
+        with self._lock:
+            return self._tickets.get(token)
+
+    def stop(self, timeout=30):
+        """Stop accepting fixes, flush everything queued, then end the worker"""
+        with self._lock:
+            self._stopping = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            group = [item]
+            size = len(item[0])
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while size < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                group.append(item)
+                size += len(item[0])
+
+            self._flush(group)
+            if stop:
+                # Drain anything queued behind the sentinel before exiting
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        return
+                    if item is not None:
+                        self._flush([item])
+
+    def _flush(self, group):
+        fixes = [fix for group_fixes, _ in group for fix in group_fixes]
+        started = time.monotonic()
+        try:
+            results = self.flush_fn(fixes)
+        except Exception as e:
+            logger.exception("Write-behind flush of %d fixes failed", len(fixes))
+            self.failed += len(fixes)
+            for _, ticket in group:
+                ticket._finish(error=e)
+        else:
+            offset = 0
+            for group_fixes, ticket in group:
+                ticket._finish(results=results[offset:offset + len(group_fixes)])
+                offset += len(group_fixes)
+            self.flushed += len(fixes)
+        finally:
+            self.batches += 1
+            self.last_flush_ms = (time.monotonic() - started) * 1000
+            with self._lock:
+                self._pending -= len(fixes)
+                self._finished.extend(ticket.token for _, ticket in group)
+                while len(self._finished) > self.keep_results:
+                    self._tickets.pop(self._finished.popleft(), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "depth": self._pending,
+                "max_size": self.max_size,
+                "enqueued": self.enqueued,
+                "rejected": self.rejected,
+                "flushed": self.flushed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "last_flush_ms": round(self.last_flush_ms, 2)
+            }
@@ -0,0 +1,186 @@
+"""Retention for the tracking history: hourly rollups, archiving and purging.
+
+Position chunks, alerts and heatmap counts grow with every fix. A
+maintenance pass (``app.run_maintenance``) keeps them bounded:
+
+- position chunks older than ``positions_days`` are downsampled to hourly
+  rollups (fix count and mean position per animal per hour), then deleted
+- read alerts older than ``alerts_days`` are archived to gzipped JSON lines
+  and deleted. Unread alerts are kept unless ``unread_alerts_days`` is set;
+  purging one adjusts the unread counters as marking it read would
+- hourly heatmap counts older than ``hourly_days`` are deleted; the daily
+  counts stay, and older heatmap ranges are rounded out to whole days
+- the legacy ``tracking`` and ``history`` tables, where an older database
+  still has them, are rolled up and purged the same way
+
+Every step works in batches of at most ``batch_size`` rows, each in its own
+short transaction, with a pause between batches. Live ingest therefore
+never waits long for the write lock. A pass can be stopped at any point and
+the next one carries on.
+
+From the backend directory, once or as a long-running job:
+
+    python maintenance.py
+    python maintenance.py --every 3600 --alerts-days 30
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from heatmap import HOUR
+
+# Days of history to keep of each kind; None keeps it forever
+Retention = namedtuple("Retention", ["positions_days", "alerts_days", "unread_alerts_days", "hourly_days", "history_days"])
+
+
+def retention_days(value):
+    """A retention in days from an option or environment value; "" or "never" is None"""
+    if value is None or str(value).strip().lower() in ("", "never"):
+        return None
+    days = float(value)
+    if days < 0:
+        raise ValueError("Retention cannot be negative")
+    return days
+
+
+RETENTION = Retention(
+    positions_days=retention_days(os.environ.get("POSITION_RETENTION_DAYS", 30)),
+    alerts_days=retention_days(os.environ.get("ALERT_RETENTION_DAYS", 90)),
+    unread_alerts_days=retention_days(os.environ.get("UNREAD_ALERT_RETENTION_DAYS")),
+    hourly_days=retention_days(os.environ.get("HOURLY_HEATMAP_RETENTION_DAYS", 30)),
+    history_days=retention_days(os.environ.get("HISTORY_RETENTION_DAYS", 365)),
+)
+
+# Chunks, alerts or legacy rows per transaction, and the pause after each
+BATCH_SIZE = int(os.environ.get("MAINTENANCE_BATCH_SIZE", 200))
+PAUSE_SECONDS = float(os.environ.get("MAINTENANCE_PAUSE_SECONDS", 0.05))
+ARCHIVE_DIR = os.environ.get("MAINTENANCE_ARCHIVE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "instance", "alert-archive"
+)
+
+
+def cutoff(days, now=None):
+    """The datetime before which history older than ``days`` falls, or None to keep all"""
+    if days is None:
+        return None
+    return (now or datetime.utcnow()) - timedelta(days=days)
+
+
+def hourly_rollups(fixes):
+    """Rollup rows for (animal_id, ts, lat, lng) fixes: count and mean position per animal per hour"""
+    sums = {}
+    for animal_id, ts, lat, lng in fixes:
+        key = (animal_id, ts - ts % HOUR)
+        entry = sums.get(key)
+        if entry is None:
+            entry = sums[key] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += lat
+        entry[2] += lng
+    return [
+        {"animal_id": animal_id, "hour": hour, "fixes": n, "lat": sum_lat / n, "lng": sum_lng / n}
+        for (animal_id, hour), (n, sum_lat, sum_lng) in sums.items()
+    ]
+
+
+class AlertArchive:
+    """Purged alerts as gzipped JSON lines, one file per pass, created on the first write.
+
+    Each write is flushed and synced before the caller commits its delete,
+    so an alert is never lost. If a pass fails between the two, the alert
+    is archived again by the next pass.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = None
+        self.written = 0
+        self._raw = None
+        self._file = None
+
+    def write(self, alerts):
+        if not alerts:
+            return
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.path = os.path.join(self.directory, f"alerts-{datetime.utcnow():%Y%m%dT%H%M%S}.jsonl.gz")
+            self._raw = open(self.path, "ab")
+            self._file = gzip.GzipFile(fileobj=self._raw, mode="ab")
+        for alert in alerts:
+            self._file.write(json.dumps(alert, default=str).encode() + b"\n")
+        self._file.flush()
+        os.fsync(self._raw.fileno())
+        self.written += len(alerts)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._raw.close()
+            self._file = self._raw = None
+
+
+# ============ CLI ============
+
+def _megabytes(value):
+    return "?" if value is None else f"{value / 1e6:.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll up, archive and purge old tracking history")
+    parser.add_argument("--positions-days", type=retention_days, default=RETENTION.positions_days,
+                        help="raw fixes kept before hourly rollup; 'never' keeps them")
+    parser.add_argument("--alerts-days", type=retention_days, default=RETENTION.alerts_days,
+                        help="read alerts kept before they are archived and purged")
+    parser.add_argument("--unread-alerts-days", type=retention_days, default=RETENTION.unread_alerts_days,
+                        help="unread alerts kept before they are archived and purged; unset keeps them")
+    parser.add_argument("--hourly-days", type=retention_days, default=RETENTION.hourly_days,
+                        help="hourly heatmap counts kept; daily counts are never purged")
+    parser.add_argument("--history-days", type=retention_days, default=RETENTION.history_days,
+                        help="rows kept in the legacy history table, if present")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=PAUSE_SECONDS, help="seconds between batches")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--no-archive", action="store_true", help="purge alerts without archiving them")
+    parser.add_argument("--every", type=float, help="repeat the pass every this many seconds")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="VACUUM a SQLite database afterwards to shrink the file (blocks writers meanwhile)")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL, as for the API")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    import app as tracker  # the Flask app: models and the maintenance steps
+
+    retention = Retention(args.positions_days, args.alerts_days, args.unread_alerts_days,
+                          args.hourly_days, args.history_days)
+
+    def progress(stage, totals):
+        print(f"{stage}: " + ", ".join(f"{key} {value}" for key, value in totals.items()), flush=True)
+
+    while True:
+        archive = None if args.no_archive else AlertArchive(args.archive_dir)
+        try:
+            with tracker.app.app_context():
+                summary = tracker.run_maintenance(retention, args.batch_size, args.pause, archive, progress)
+                if args.vacuum:
+                    summary["database"].update(tracker.vacuum_database())
+        finally:
+            if archive is not None:
+                archive.close()
+
+        database = summary["database"]
+        print(f"Done in {summary['seconds']}s: database {_megabytes(database['bytes_before'])} -> "
+              f"{_megabytes(database['bytes_after'])}, {_megabytes(database['freed_bytes'])} freed for reuse"
+              + (f", alerts archived to {archive.path}" if archive is not None and archive.path else ""),
+              flush=True)
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
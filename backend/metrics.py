@@ -0,0 +1,208 @@
+"""Request and SQL instrumentation exposed in the Prometheus text format.
+
+``RequestMetrics`` keeps per-endpoint histograms of latency, request and
+response size, and SQL statements and time per request. SQL is measured by
+SQLAlchemy cursor events attached with ``instrument_engine``. Statements run
+outside a request, such as write-behind flushes, only count towards the
+totals.
+
+If ``slow_ms`` is set, each request also records its statements, and
+requests slower than the threshold are logged with them to the
+``slow_requests`` logger.
+
+Metrics are per process. Under gunicorn each worker reports its own values.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+
+slow_log = logging.getLogger("slow_requests")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+
+# Slow-request log entries keep at most this many statements of this length
+MAX_LOGGED_STATEMENTS = 200
+MAX_STATEMENT_CHARS = 500
+
+# Stats keys that only ever grow (registry, rule engine, hub, queue and
+# gateway counts); render exports them as counters, everything else as gauges
+COUNTER_KEYS = frozenset((
+    "hits", "misses", "evictions",
+    "evaluations", "fired", "suppressed", "syncs",
+    "published", "dropped", "rejected",
+    "enqueued", "flushed", "failed", "batches",
+    "frames", "received", "invalid", "duplicates", "applied",
+))
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v[0]), v[1]) for k, v in self._series.items())
+        for label_values, counts, total in series:
+            labels = _labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in pairs)
+
+
+class _Trace:
+    __slots__ = ("started", "statements", "sql_seconds", "captured")
+
+    def __init__(self, capture):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.captured = [] if capture else None
+
+
+class RequestMetrics:
+    def __init__(self, slow_ms=None):
+        self.slow_ms = slow_ms
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.slow_requests = 0
+
+        labels = ("method", "endpoint")
+        self.latency = Histogram("tracker_request_duration_seconds", "Request latency",
+                                 labels + ("status",), LATENCY_BUCKETS)
+        self.request_size = Histogram("tracker_request_size_bytes", "Request body size", labels, SIZE_BUCKETS)
+        self.response_size = Histogram("tracker_response_size_bytes", "Response body size", labels, SIZE_BUCKETS)
+        self.statements = Histogram("tracker_request_sql_statements", "SQL statements per request",
+                                    labels, STATEMENT_BUCKETS)
+        self.sql_time = Histogram("tracker_request_sql_seconds", "Time spent in SQL per request",
+                                  labels, LATENCY_BUCKETS)
+
+    # ---- request lifecycle ----
+
+    def start(self):
+        self._local.trace = _Trace(capture=self.slow_ms is not None)
+
+    def finish(self, method, endpoint, status, request_bytes=None, response_bytes=None):
+        """Record the current request; returns its duration in seconds"""
+        trace = getattr(self._local, "trace", None)
+        if trace is None:
+            return None
+        self._local.trace = None
+        duration = time.perf_counter() - trace.started
+        labels = (method, endpoint)
+
+        self.latency.observe(labels + (str(status),), duration)
+        if request_bytes is not None:
+            self.request_size.observe(labels, request_bytes)
+        if response_bytes is not None:
+            self.response_size.observe(labels, response_bytes)
+        self.statements.observe(labels, trace.statements)
+        self.sql_time.observe(labels, trace.sql_seconds)
+
+        if self.slow_ms is not None and duration * 1000 >= self.slow_ms:
+            with self._lock:
+                self.slow_requests += 1
+            slow_log.warning(json.dumps({
+                "method": method,
+                "endpoint": endpoint,
+                "status": status,
+                "duration_ms": round(duration * 1000, 2),
+                "sql_statements": trace.statements,
+                "sql_ms": round(trace.sql_seconds * 1000, 2),
+                "statements": trace.captured
+            }))
+        return duration
+
+    # ---- SQL hooks ----
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        with self._lock:
+            self.sql_statements += 1
+            self.sql_seconds += elapsed
+        trace = getattr(self._local, "trace", None)
+        if trace is None:
+            return
+        trace.statements += 1
+        trace.sql_seconds += elapsed
+        if trace.captured is not None and len(trace.captured) < MAX_LOGGED_STATEMENTS:
+            trace.captured.append({"sql": statement[:MAX_STATEMENT_CHARS], "ms": round(elapsed * 1000, 3)})
+
+    def instrument_engine(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+
+    # ---- exposition ----
+
+    def render(self, stats=None):
+        """Prometheus text for the histograms plus ``stats``: {prefix: stats dict}.
+
+        Numeric values in each stats dict become ``tracker_<prefix>_<key>``
+        gauges, or ``tracker_<prefix>_<key>_total`` counters for the keys in
+        COUNTER_KEYS; other values are skipped.
+        """
+        lines = []
+        for histogram in (self.latency, self.request_size, self.response_size, self.statements, self.sql_time):
+            lines.extend(histogram.render())
+
+        with self._lock:
+            totals = (
+                ("tracker_sql_statements_total", "SQL statements executed", self.sql_statements),
+                ("tracker_sql_seconds_total", "Time spent executing SQL", round(self.sql_seconds, 6)),
+                ("tracker_slow_requests_total", "Requests over the slow-request threshold", self.slow_requests),
+            )
+        for name, help, value in totals:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} counter", f"{name} {value}"]
+
+        for prefix, values in (stats or {}).items():
+            for key, value in (values or {}).items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                if key in COUNTER_KEYS:
+                    name, kind = f"tracker_{prefix}_{key}_total", "counter"
+                else:
+                    name, kind = f"tracker_{prefix}_{key}", "gauge"
+                lines += [f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
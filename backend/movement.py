@@ -0,0 +1,82 @@
+"""Running per-animal, per-day movement statistics.
+
+Each fix closes a segment from the animal's previous fix. ``fold_fixes``
+adds segments to a day's totals, starting from the day's stored last fix
+(its tail), so ingest never re-reads the position history:
+
+- distance: haversine metres, skipping implausible jumps (GPS glitches)
+- moving / idle seconds: segments slower than IDLE_SPEED_MS are idle
+- inside / outside seconds: the segment's time counts toward the status
+  the animal had at its start
+- max speed
+
+A segment belongs to the day of the fix that ends it. Gaps longer than
+MAX_GAP_SECONDS (a collar offline) close no segment, so an animal is never
+credited with movement or dwell time it was not seen doing.
+"""
+import os
+from collections import namedtuple
+
+from geofence import haversine_km
+
+IDLE_SPEED_MS = float(os.environ.get("STATS_IDLE_SPEED_MS", 0.05))
+MAX_GAP_SECONDS = int(os.environ.get("STATS_MAX_GAP_SECONDS", 3600))
+# Faster than a galloping cow: a position glitch, not movement
+MAX_SPEED_MS = 15.0
+
+# The last fix folded into a day: epoch seconds, lat, lng and IN/OUT status
+Tail = namedtuple("Tail", ["ts", "lat", "lng", "status"])
+
+TOTAL_COLUMNS = ("fixes", "distance_m", "moving_seconds", "idle_seconds",
+                 "inside_seconds", "outside_seconds", "max_speed_ms")
+
+
+def empty_totals():
+    return dict.fromkeys(TOTAL_COLUMNS, 0)
+
+
+def fold_fixes(totals, tail, fixes):
+    """Add ``fixes`` (Tail tuples, oldest first) to ``totals`` in place.
+
+    ``tail`` is the fix before them, or None. Returns the new tail.
+    """
+    for fix in fixes:
+        totals["fixes"] += 1
+        if tail is not None:
+            seconds = fix.ts - tail.ts
+            if 0 < seconds <= MAX_GAP_SECONDS:
+                metres = haversine_km(tail.lat, tail.lng, fix.lat, fix.lng) * 1000
+                speed = metres / seconds
+                if speed <= MAX_SPEED_MS:
+                    totals["distance_m"] += metres
+                    totals["max_speed_ms"] = max(totals["max_speed_ms"], speed)
+                if speed < IDLE_SPEED_MS:
+                    totals["idle_seconds"] += seconds
+                else:
+                    totals["moving_seconds"] += seconds
+                if tail.status == "OUT":
+                    totals["outside_seconds"] += seconds
+                else:
+                    totals["inside_seconds"] += seconds
+            elif seconds <= 0:
+                continue  # a repeat of the tail's instant adds nothing
+        tail = fix
+    return tail
+
+
+def summarize(row):
+    """A stats row (any object with the TOTAL_COLUMNS attributes) as a JSON-ready dict"""
+    tracked = row.moving_seconds + row.idle_seconds
+    return {
+        "day": row.day.isoformat(),
+        "fixes": row.fixes,
+        "distance_m": round(row.distance_m, 1),
+        "moving_seconds": row.moving_seconds,
+        "idle_seconds": row.idle_seconds,
+        "inside_seconds": row.inside_seconds,
+        "outside_seconds": row.outside_seconds,
+        "max_speed_ms": round(row.max_speed_ms, 2),
+        # Over the time spent moving, and over all tracked time
+        "avg_moving_speed_ms": round(row.distance_m / row.moving_seconds, 2) if row.moving_seconds else 0.0,
+        "avg_speed_ms": round(row.distance_m / tracked, 3) if tracked else 0.0
+    }
@@ -0,0 +1,135 @@
+"""Process-local device_id -> animal state cache for the ingest hot path.
+
+The mapping from collar to animal almost never changes, so ingest resolves
+devices here and only goes to the database to write. The cache is bounded
+(least recently used entries are evicted) and must be invalidated by every
+path that creates, renames, re-keys or deletes an animal.
+
+Cached states are shared by every request thread and the write-behind
+worker. Each state carries its own lock; code that reads and then changes
+a state (ingest, Bluetooth reports, patches) holds it for the whole
+change, so concurrent fixes for one animal apply one after the other.
+"""
+import threading
+from collections import OrderedDict
+
+
+class AnimalState:
+    """The slice of an Animal row that ingest reads and writes"""
+
+    # Animal columns loaded into a state
+    FIELDS = ("id", "name", "device_id", "lat", "lng", "status",
+              "battery_level", "signal_strength", "last_seen")
+    __slots__ = FIELDS + ("lock",)
+
+    # Columns written back to the animal table after a change
+    WRITABLE = ("lat", "lng", "status", "battery_level", "signal_strength", "last_seen")
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field))
+        self.lock = threading.RLock()
+
+    def values(self):
+        """The WRITABLE columns, for writing the state back"""
+        with self.lock:
+            return {field: getattr(self, field) for field in self.WRITABLE}
+
+    def update(self, **values):
+        with self.lock:
+            for field, value in values.items():
+                setattr(self, field, value)
+
+
+class DeviceRegistry:
+    def __init__(self, loader, max_size=50000):
+        # loader(device_ids) -> iterable of AnimalState for the IDs that exist
+        self.loader = loader
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._by_animal = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _store(self, state):
+        self._entries[state.device_id] = state
+        self._entries.move_to_end(state.device_id)
+        self._by_animal[state.id] = state.device_id
+        while len(self._entries) > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self._by_animal.pop(evicted.id, None)
+            self.evictions += 1
+
+    def get(self, device_id):
+        return self.get_many([device_id]).get(device_id)
+
+    def get_many(self, device_ids):
+        """Resolve many device IDs, loading all misses with one loader call"""
+        found = {}
+        missing = []
+        with self._lock:
+            for device_id in set(device_ids):
+                state = self._entries.get(device_id)
+                if state is None:
+                    missing.append(device_id)
+                else:
+                    self._entries.move_to_end(device_id)
+                    found[device_id] = state
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            loaded = list(self.loader(missing))
+            with self._lock:
+                for state in loaded:
+                    self._store(state)
+                    found[state.device_id] = state
+        return found
+
+    def warm(self, states):
+        with self._lock:
+            for state in states:
+                self._store(state)
+
+    def get_by_animal(self, animal_id):
+        with self._lock:
+            device_id = self._by_animal.get(animal_id)
+            return self._entries.get(device_id) if device_id is not None else None
+
+    def patch(self, animal_id, **values):
+        """Update a cached entry in place after a bulk write, if it is cached"""
+        with self._lock:
+            device_id = self._by_animal.get(animal_id)
+            state = self._entries.get(device_id) if device_id is not None else None
+        if state is not None:
+            state.update(**values)
+
+    def invalidate(self, *device_ids):
+        with self._lock:
+            for device_id in device_ids:
+                state = self._entries.pop(device_id, None)
+                if state is not None:
+                    self._by_animal.pop(state.id, None)
+
+    def invalidate_animal(self, animal_id):
+        with self._lock:
+            device_id = self._by_animal.pop(animal_id, None)
+            if device_id is not None:
+                self._entries.pop(device_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_animal.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,85 @@
+"""Douglas-Peucker simplification of animal trajectories.
+
+Segments are refined in order of their largest deviation (a priority queue
+instead of plain recursion), so the same pass honours either a distance
+tolerance, a point budget, or both: it stops when the worst remaining error
+is below the tolerance or when the budget is spent. Either way the points
+kept are the ones that carry the most shape.
+"""
+import heapq
+import math
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000
+# Metres per pixel at zoom 0 on the equator for 256 px web-mercator tiles
+METERS_PER_PIXEL_Z0 = 156543.03
+
+
+def tolerance_for_zoom(zoom, lat=0.0, pixels=1.0):
+    """Ground distance (m) covered by ``pixels`` screen pixels at a map zoom"""
+    return pixels * METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+def _project(lats, lngs):
+    # Local equirectangular projection in metres; accurate at paddock scale
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    lat0 = math.radians(float(lats.mean()))
+    xs = np.radians(lngs) * EARTH_RADIUS_M * math.cos(lat0)
+    ys = np.radians(lats) * EARTH_RADIUS_M
+    return xs, ys
+
+
+def _farthest(xs, ys, first, last):
+    """(distance, index) of the point between first and last farthest from that chord"""
+    if last - first < 2:
+        return 0.0, None
+    px = xs[first + 1:last]
+    py = ys[first + 1:last]
+    dx = xs[last] - xs[first]
+    dy = ys[last] - ys[first]
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        dist = np.hypot(px - xs[first], py - ys[first])
+    else:
+        t = np.clip(((px - xs[first]) * dx + (py - ys[first]) * dy) / length_sq, 0, 1)
+        dist = np.hypot(px - (xs[first] + t * dx), py - (ys[first] + t * dy))
+    i = int(dist.argmax())
+    return float(dist[i]), first + 1 + i
+
+
+def simplify_indices(lats, lngs, tolerance_m=None, max_points=None):
+    """Indices of the points to keep, in order. Endpoints are always kept."""
+    n = len(lats)
+    if n <= 2 or (tolerance_m is None and max_points is None):
+        return list(range(n))
+
+    xs, ys = _project(lats, lngs)
+    keep = {0, n - 1}
+    budget = max(max_points, 2) if max_points else n
+    tolerance = tolerance_m or 0.0
+
+    heap = []
+    dist, index = _farthest(xs, ys, 0, n - 1)
+    if index is not None:
+        heapq.heappush(heap, (-dist, index, 0, n - 1))
+
+    while heap and len(keep) < budget:
+        neg_dist, index, first, last = heapq.heappop(heap)
+        if -neg_dist <= tolerance:
+            break
+        keep.add(index)
+        for a, b in ((first, index), (index, last)):
+            dist, split = _farthest(xs, ys, a, b)
+            if split is not None:
+                heapq.heappush(heap, (-dist, split, a, b))
+
+    return sorted(keep)
+
+
+def simplify_track(lats, lngs, zoom=None, tolerance_m=None, max_points=None):
+    """simplify_indices() with the tolerance derived from a map zoom if given"""
+    if zoom is not None and tolerance_m is None and len(lats):
+        tolerance_m = tolerance_for_zoom(zoom, float(np.mean(lats)))
+    return simplify_indices(lats, lngs, tolerance_m, max_points)
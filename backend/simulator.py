@@ -0,0 +1,209 @@
+"""Vectorised herd movement for demos, load generation and capacity tests.
+
+Every step moves the whole herd at once with NumPy:
+
+- each animal switches between resting, grazing and walking on a Markov chain
+- its heading is a correlated random walk, the previous heading plus a turn
+  drawn for its behaviour, so tracks meander like grazing rather than jitter
+- past ``home_range`` of the fence radius, headings are pulled back toward
+  the farm centre; a weaker pull means more animals stray out
+- batteries drain at a per-collar rate, faster while walking, and signal
+  strength wanders around a per-collar baseline
+
+The same herd and seed always produce the same tracks. Writing them is up to
+the caller: ``app.simulate_herd`` either bulk-writes each step or feeds it
+through the ingest path. From the backend directory:
+
+    python simulator.py --animals 100000 --steps 1000 --mode bulk
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import insert
+
+from ingest import Fix
+
+METRES_PER_DEGREE = 111320.0
+
+GRAZING = {
+    # Per behaviour: resting, grazing, walking
+    "speed": (0.0, 0.08, 0.9),  # metres per second
+    "turn_sd": (0.0, 0.9, 0.3),  # radians per step
+    "initial": (0.3, 0.6, 0.1),
+    # Row = current behaviour, column = next behaviour, per step
+    "transitions": (
+        (0.90, 0.09, 0.01),
+        (0.05, 0.90, 0.05),
+        (0.02, 0.28, 0.70),
+    ),
+    "home_range": 0.8,  # share of the fence radius roamed freely
+    "home_pull": 0.3,  # share of the bearing home turned per step beyond it
+    "drain_per_hour": (0.2, 0.8),  # battery percent, drawn per collar
+    "walking_drain": 2.0,  # drain multiplier while walking
+    "signal_sd": 4.0,
+}
+
+WALKING = 2
+
+
+def _wrap(angles):
+    """Wrap radians into [-pi, pi)"""
+    return (angles + np.pi) % (2 * np.pi) - np.pi
+
+
+class HerdSimulator:
+    def __init__(self, lats, lngs, center, radius_km, battery=None, signal=None,
+                 step_seconds=30, seed=None, model=GRAZING):
+        self.rng = rng = np.random.default_rng(seed)
+        self.step_seconds = step_seconds
+        self.center_lat, self.center_lng = center
+        self.radius_m = radius_km * 1000
+        self.steps = 0
+
+        self.lat = np.array(lats, dtype=float)
+        self.lng = np.array(lngs, dtype=float)
+        count = len(self.lat)
+        self.battery = np.full(count, 100.0) if battery is None else np.array(battery, dtype=float)
+        self.signal = np.full(count, 100.0) if signal is None else np.array(signal, dtype=float)
+
+        self.speed = np.array(model["speed"], dtype=float)
+        self.turn_sd = np.array(model["turn_sd"], dtype=float)
+        self.transitions = np.cumsum(model["transitions"], axis=1)
+        self.home_range = model["home_range"]
+        self.home_pull = model["home_pull"]
+        self.walking_drain = model["walking_drain"]
+        self.signal_sd = model["signal_sd"]
+
+        self.behaviour = rng.choice(len(self.speed), count, p=model["initial"])
+        self.heading = rng.uniform(-np.pi, np.pi, count)
+        self.drain = rng.uniform(*model["drain_per_hour"], count)
+        self.signal_base = np.clip(self.signal, 20, 100)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def step(self):
+        """Advance every animal by one step; returns (lats, lngs, battery, signal)"""
+        rng = self.rng
+        count = len(self)
+
+        draws = rng.random(count)
+        self.behaviour = (draws[:, None] > self.transitions[self.behaviour]).sum(axis=1)
+        self.behaviour = np.minimum(self.behaviour, len(self.speed) - 1)
+
+        cos_lat = np.cos(np.radians(self.lat))
+        north = (self.center_lat - self.lat) * METRES_PER_DEGREE
+        east = (self.center_lng - self.lng) * METRES_PER_DEGREE * cos_lat
+        straying = np.hypot(north, east) > self.home_range * self.radius_m
+        home = np.arctan2(east, north)
+
+        self.heading += rng.normal(0, 1, count) * self.turn_sd[self.behaviour]
+        self.heading += np.where(straying, self.home_pull, 0.0) * _wrap(home - self.heading)
+        self.heading = _wrap(self.heading)
+
+        # Gamma(2, 0.5) has mean 1: some steps are short, a few long
+        distance = self.speed[self.behaviour] * self.step_seconds * rng.gamma(2.0, 0.5, count)
+        self.lat = np.clip(self.lat + distance * np.cos(self.heading) / METRES_PER_DEGREE, -90, 90)
+        self.lng = self.lng + distance * np.sin(self.heading) / (METRES_PER_DEGREE * cos_lat)
+        self.lng = _wrap(np.radians(self.lng)) * 180 / np.pi
+
+        hours = self.step_seconds / 3600
+        drain = self.drain * hours * np.where(self.behaviour == WALKING, self.walking_drain, 1.0)
+        self.battery = np.maximum(self.battery - drain, 0.0)
+        self.signal += 0.2 * (self.signal_base - self.signal) + rng.normal(0, self.signal_sd, count)
+        self.signal = np.clip(self.signal, 0, 100)
+
+        self.steps += 1
+        return self.lat, self.lng, self.battery, self.signal
+
+    def fixes(self, device_ids, timestamp):
+        """The current positions as ingest ``Fix`` tuples, all taken at ``timestamp``"""
+        return [
+            Fix(device_id, lat, lng, battery, signal, timestamp)
+            for device_id, lat, lng, battery, signal in zip(
+                device_ids,
+                self.lat.tolist(),
+                self.lng.tolist(),
+                np.round(self.battery, 1).tolist(),
+                np.round(self.signal, 1).tolist()
+            )
+        ]
+
+
+# ============ CLI ============
+
+DEVICE_PREFIX = "SIM-"
+
+
+def seed_herd(tracker, animals, seed):
+    """Bulk insert SIM-* animals inside the fence until there are ``animals``"""
+    Animal = tracker.Animal
+    db = tracker.db
+    existing = Animal.query.filter(Animal.device_id.like(f"{DEVICE_PREFIX}%")).count()
+    if existing >= animals:
+        return
+
+    config = tracker.get_config()
+    rng = np.random.default_rng(seed)
+    count = animals - existing
+    distance = config.radius_km * 1000 * GRAZING["home_range"] * np.sqrt(rng.random(count))
+    bearing = rng.uniform(-np.pi, np.pi, count)
+    lats = config.center_lat + distance * np.cos(bearing) / METRES_PER_DEGREE
+    lngs = config.center_lng + distance * np.sin(bearing) / (METRES_PER_DEGREE * np.cos(np.radians(lats)))
+    statuses = tracker.check_geofence_many(lats, lngs)
+    battery = rng.uniform(30, 100, count)
+    signal = rng.uniform(40, 100, count)
+
+    now = datetime.utcnow()
+    version = tracker.next_version()
+    rows = [{
+        "name": f"Sim {i}",
+        "species": "Cattle",
+        "device_id": f"{DEVICE_PREFIX}{i:06d}",
+        "lat": float(lats[n]),
+        "lng": float(lngs[n]),
+        "status": str(statuses[n]),
+        "battery_level": float(battery[n]),
+        "signal_strength": float(signal[n]),
+        "last_seen": now,
+        "version": version
+    } for n, i in enumerate(range(existing, animals))]
+    for chunk in tracker._chunks(rows, 5000):
+        db.session.execute(insert(Animal), chunk)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate herd movement against the tracker database")
+    parser.add_argument("--animals", type=int, default=0,
+                        help=f"seed {DEVICE_PREFIX}* animals up to this many and move only them; 0 moves the whole herd")
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--step-seconds", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--mode", choices=("bulk", "ingest"), default="bulk")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL, as for the API")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    import app as tracker  # the Flask app: models, ingest path and zones
+
+    def progress(step, summary):
+        print(f"step {step}/{args.steps}: {summary['fixes']} fixes, {summary['exited']} exits, "
+              f"{summary['fixes_per_second']:.0f} fixes/s", flush=True)
+
+    with tracker.app.app_context():
+        prefix = None
+        if args.animals:
+            seed_herd(tracker, args.animals, args.seed)
+            prefix = DEVICE_PREFIX
+        started = time.perf_counter()
+        summary = tracker.simulate_herd(args.steps, args.step_seconds, args.seed, args.mode, prefix, progress)
+    print(f"Done in {time.perf_counter() - started:.1f}s: {summary}")
+
+
+if __name__ == "__main__":
+    main()
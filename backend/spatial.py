@@ -0,0 +1,326 @@
+"""In-memory grid index over the herd's current positions.
+
+Points are bucketed into uniform lat/lng cells, so radius and bounding-box
+queries only visit the cells the query area overlaps, and k-nearest searches
+widen ring by ring around the query cell until no unvisited cell can hold a
+closer point. Each query costs roughly O(points near the query area), not
+O(herd).
+
+The index is process-local. ``sync`` brings it up to a herd change version
+from a loader that returns only the animals changed since the version it
+already holds. That way, writes from other workers, the gateway and bulk
+simulations all reach it without hooks on each write path.
+"""
+import heapq
+import math
+import threading
+
+from geofence import KM_PER_DEGREE, haversine_km
+
+# ~110 m at the equator; a 200 m radius query visits about 5 x 5 cells
+DEFAULT_CELL_DEG = 0.001
+
+# Map clusters: one grid per web-map zoom, each cell this many screen pixels
+# wide. Above CLUSTER_MAX_ZOOM every animal is returned on its own.
+CLUSTER_CELL_PX = 64
+CLUSTER_MAX_ZOOM = 17
+
+
+def cluster_cell_deg(zoom):
+    """Degrees covered by CLUSTER_CELL_PX pixels of a 256 px tile at ``zoom``"""
+    return 360 / 2 ** zoom * CLUSTER_CELL_PX / 256
+
+
+class PointIndex:
+    def __init__(self, cell_deg=DEFAULT_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.version = None
+        self._cells = {}
+        self._points = {}  # id -> (lat, lng, cell, payload)
+        self._bounds = None  # (min_row, max_row, min_col, max_col) ever occupied
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self.syncs = 0
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def upsert(self, point_id, lat, lng, payload=None):
+        """Add or move a point; a point without coordinates is removed"""
+        if lat is None or lng is None:
+            self.remove(point_id)
+            return
+        cell = self._cell(lat, lng)
+        with self._lock:
+            old = self._points.get(point_id)
+            if old is not None and old[2] != cell:
+                self._discard(point_id, old[2])
+            self._points[point_id] = (lat, lng, cell, payload)
+            self._cells.setdefault(cell, set()).add(point_id)
+            row, col = cell
+            if self._bounds is None:
+                self._bounds = (row, row, col, col)
+            else:
+                min_row, max_row, min_col, max_col = self._bounds
+                self._bounds = (min(min_row, row), max(max_row, row), min(min_col, col), max(max_col, col))
+
+    def remove(self, point_id):
+        with self._lock:
+            old = self._points.pop(point_id, None)
+            if old is not None:
+                self._discard(point_id, old[2])
+
+    def _discard(self, point_id, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(point_id)
+            if not members:
+                del self._cells[cell]
+
+    def sync(self, version, load_changes):
+        """Catch up to ``version``.
+
+        ``load_changes(since)`` returns ``(rows, deleted_ids)``, where rows
+        are ``(id, lat, lng, payload)`` tuples changed after ``since``. On
+        the first sync ``since`` is None and everything should be returned.
+        Returns True if anything was loaded.
+        """
+        if self.version is not None and version <= self.version:
+            return False
+        with self._sync_lock:
+            if self.version is not None and version <= self.version:
+                return False
+            rows, deleted = load_changes(self.version)
+            with self._lock:
+                for point_id in deleted:
+                    self.remove(point_id)
+                for point_id, lat, lng, payload in rows:
+                    self.upsert(point_id, lat, lng, payload)
+                self.version = version
+                self.syncs += 1
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+            self._bounds = None
+            self.version = None
+
+    # ============ QUERIES ============
+
+    def _cells_between(self, min_lat, min_lng, max_lat, max_lng):
+        """Candidate point IDs in the cells overlapping a box"""
+        low_row, low_col = self._cell(min_lat, min_lng)
+        high_row, high_col = self._cell(max_lat, max_lng)
+        if (high_row - low_row + 1) * (high_col - low_col + 1) > len(self._cells):
+            # Sparser than the box: walking the occupied cells is cheaper
+            return [
+                point_id
+                for (row, col), members in self._cells.items()
+                if low_row <= row <= high_row and low_col <= col <= high_col
+                for point_id in members
+            ]
+        candidates = []
+        for row in range(low_row, high_row + 1):
+            for col in range(low_col, high_col + 1):
+                members = self._cells.get((row, col))
+                if members:
+                    candidates.extend(members)
+        return candidates
+
+    def within_bbox(self, min_lat, min_lng, max_lat, max_lng):
+        """(id, lat, lng, payload) for every point inside the box"""
+        with self._lock:
+            results = []
+            for point_id in self._cells_between(min_lat, min_lng, max_lat, max_lng):
+                lat, lng, _, payload = self._points[point_id]
+                if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+                    results.append((point_id, lat, lng, payload))
+            return results
+
+    def within_radius(self, lat, lng, radius_km):
+        """(distance_km, id, lat, lng, payload) within the radius, nearest first"""
+        dlat = radius_km / KM_PER_DEGREE
+        dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        with self._lock:
+            results = []
+            for point_id in self._cells_between(lat - dlat, lng - dlng, lat + dlat, lng + dlng):
+                p_lat, p_lng, _, payload = self._points[point_id]
+                distance = haversine_km(lat, lng, p_lat, p_lng)
+                if distance <= radius_km:
+                    results.append((distance, point_id, p_lat, p_lng, payload))
+        results.sort(key=lambda r: (r[0], r[1]))
+        return results
+
+    def nearest(self, lat, lng, k, max_km=None, exclude=None):
+        """The k nearest points as (distance_km, id, lat, lng, payload), nearest first.
+
+        Rings of cells are searched outward from the query cell. After ring
+        r, every unvisited point is at least r cell widths away, so the
+        search stops once the k-th best is within that distance. When the
+        rings would cover more cells than are occupied (a query far from
+        the herd, or a sparse index) the occupied cells are scanned instead.
+        """
+        if k <= 0:
+            return []
+        row, col = self._cell(lat, lng)
+        # The narrower side of a cell, in km, at the query latitude
+        cell_km = self.cell_deg * KM_PER_DEGREE * min(max(math.cos(math.radians(lat)), 1e-6), 1)
+        best = []  # heap of (-distance, -id, lat, lng, payload) holding the k best
+
+        def offer(point_id):
+            if point_id == exclude:
+                return
+            p_lat, p_lng, _, payload = self._points[point_id]
+            distance = haversine_km(lat, lng, p_lat, p_lng)
+            if max_km is not None and distance > max_km:
+                return
+            entry = (-distance, -point_id, p_lat, p_lng, payload)
+            if len(best) < k:
+                heapq.heappush(best, entry)
+            elif entry > best[0]:
+                heapq.heapreplace(best, entry)
+
+        with self._lock:
+            if not self._cells:
+                return []
+            min_row, max_row, min_col, max_col = self._bounds
+            max_ring = max(row - min_row, max_row - row, col - min_col, max_col - col, 0)
+
+            ring = 0
+            while ring <= max_ring:
+                if (2 * ring + 1) ** 2 > 4 * len(self._cells):
+                    best.clear()
+                    for members in self._cells.values():
+                        for point_id in members:
+                            offer(point_id)
+                    break
+                for cell in self._ring(row, col, ring):
+                    for point_id in self._cells.get(cell, ()):
+                        offer(point_id)
+                covered_km = ring * cell_km
+                if len(best) == k and -best[0][0] <= covered_km:
+                    break
+                if max_km is not None and covered_km > max_km:
+                    break
+                ring += 1
+
+        return [(-d, -point_id, p_lat, p_lng, payload)
+                for d, point_id, p_lat, p_lng, payload in sorted(best, reverse=True)]
+
+    @staticmethod
+    def _ring(row, col, ring):
+        if ring == 0:
+            yield (row, col)
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield (row - ring, c)
+            yield (row + ring, c)
+        for r in range(row - ring + 1, row + ring):
+            yield (r, col - ring)
+            yield (r, col + ring)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "points": len(self._points),
+                "cells": len(self._cells),
+                "cell_deg": self.cell_deg,
+                "version": self.version,
+                "syncs": self.syncs
+            }
+
+
+class ClusterIndex(PointIndex):
+    """A PointIndex that also keeps map clusters for every zoom up to max_zoom.
+
+    Each zoom has a grid of cells CLUSTER_CELL_PX pixels wide. A cell holds
+    its point count, coordinate sums (for the centroid), how many of its
+    points have an OUT status and the sum of their ids, which is the lone
+    point's id when the count is 1 (so point ids must be integers). Adding,
+    moving or removing a point adjusts one cell per zoom, so clusters are
+    never rebuilt.
+    """
+
+    def __init__(self, cell_deg=DEFAULT_CELL_DEG, max_zoom=CLUSTER_MAX_ZOOM):
+        super().__init__(cell_deg)
+        self.max_zoom = max_zoom
+        self._sizes = [cluster_cell_deg(zoom) for zoom in range(max_zoom + 1)]
+        self._clusters = [{} for _ in self._sizes]
+
+    def _account(self, point_id, lat, lng, payload, sign):
+        out = sign if payload and payload.get("status") == "OUT" else 0
+        for size, clusters in zip(self._sizes, self._clusters):
+            key = (math.floor(lat / size), math.floor(lng / size))
+            entry = clusters.get(key)
+            if entry is None:
+                entry = clusters[key] = [0, 0.0, 0.0, 0, 0]
+            entry[0] += sign
+            entry[1] += sign * lat
+            entry[2] += sign * lng
+            entry[3] += out
+            entry[4] += sign * point_id
+            if not entry[0]:
+                del clusters[key]
+
+    def upsert(self, point_id, lat, lng, payload=None):
+        if lat is None or lng is None:
+            self.remove(point_id)
+            return
+        with self._lock:
+            old = self._points.get(point_id)
+            if old is not None:
+                self._account(point_id, old[0], old[1], old[3], -1)
+            super().upsert(point_id, lat, lng, payload)
+            self._account(point_id, lat, lng, payload, 1)
+
+    def remove(self, point_id):
+        with self._lock:
+            old = self._points.get(point_id)
+            if old is not None:
+                self._account(point_id, old[0], old[1], old[3], -1)
+            super().remove(point_id)
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+            self._clusters = [{} for _ in self._sizes]
+
+    def clusters(self, zoom, min_lat, min_lng, max_lat, max_lng):
+        """What a map shows of the box at ``zoom``: (clusters, points).
+
+        Clusters are (lat, lng, count, out, key) at their centroid and points
+        are (id, lat, lng, payload) for animals alone in their cell, or for
+        every animal past max_zoom. Only centroids inside the box count, so
+        adjacent tiles never repeat a cluster.
+        """
+        if zoom > self.max_zoom:
+            return [], self.within_bbox(min_lat, min_lng, max_lat, max_lng)
+
+        size = self._sizes[zoom]
+        low_row, low_col = math.floor(min_lat / size), math.floor(min_lng / size)
+        high_row, high_col = math.floor(max_lat / size), math.floor(max_lng / size)
+        clusters, points = [], []
+        with self._lock:
+            grid = self._clusters[zoom]
+            if (high_row - low_row + 1) * (high_col - low_col + 1) > len(grid):
+                keys = [(row, col) for row, col in grid if low_row <= row <= high_row and low_col <= col <= high_col]
+            else:
+                keys = [(row, col) for row in range(low_row, high_row + 1)
+                        for col in range(low_col, high_col + 1) if (row, col) in grid]
+
+            for row, col in keys:
+                count, sum_lat, sum_lng, out, id_sum = grid[(row, col)]
+                lat, lng = sum_lat / count, sum_lng / count
+                if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+                    continue
+                if count == 1:
+                    lat, lng, _, payload = self._points[id_sum]
+                    points.append((id_sum, lat, lng, payload))
+                else:
+                    clusters.append((lat, lng, count, out, f"{zoom}/{row}/{col}"))
+        return clusters, points
@@ -0,0 +1,89 @@
+"""Backend-specific engine tuning and index migrations.
+
+``engine_options`` sizes the connection pool to the gunicorn thread count.
+``tune_engine`` applies the SQLite connection profile:
+
+- WAL journaling, so readers never block the writer
+- ``synchronous=NORMAL``, which is durable across application crashes and
+  fsyncs at checkpoints instead of on every commit
+- a memory-mapped read window
+- a busy timeout, so writers queue instead of failing with "database is locked"
+
+``ensure_indexes`` creates model indexes that ``create_all()`` skips on
+existing tables, plus hot-path indexes on legacy tables that may or may
+not be present.
+"""
+import os
+
+from sqlalchemy import event, inspect, text
+
+SQLITE_PROFILE = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 10000)),
+    "cache_size": int(os.environ.get("SQLITE_CACHE_KB", 16384)) * -1,  # negative = KiB
+    "temp_store": "MEMORY",
+}
+
+# Indexes for tables that are not mapped in app.py but may exist in older
+# databases: (name, table, columns)
+LEGACY_INDEXES = [
+    ("ix_tracking_animal_time", "tracking", ("animal_id", "timestamp", "id")),
+    ("ix_history_event_time", "history", ("event_type", "timestamp", "id")),
+    ("ix_history_animal_time", "history", ("animal_id", "timestamp", "id")),
+]
+
+
+def engine_options(database_url):
+    """SQLALCHEMY_ENGINE_OPTIONS for a database URL.
+
+    The pool holds DB_POOL_SIZE connections, plus DB_MAX_OVERFLOW more under
+    bursts. The defaults together match the 32 gthread threads a gunicorn
+    worker runs, so a thread never waits on the pool.
+    """
+    options = {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 22)),
+        "pool_timeout": 30,
+    }
+    if database_url.startswith("sqlite"):
+        if ":memory:" in database_url or database_url.rstrip("/") == "sqlite:":
+            return {}  # in-memory databases use a single shared connection
+    else:
+        # Server connections can be dropped by proxies or restarts
+        options["pool_pre_ping"] = True
+        options["pool_recycle"] = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    return options
+
+
+def tune_engine(engine, profile=None):
+    """Apply the SQLite PRAGMA profile to every new connection; no-op elsewhere"""
+    if engine.dialect.name != "sqlite":
+        return
+    profile = dict(SQLITE_PROFILE, **(profile or {}))
+
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in profile.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+
+def ensure_indexes(engine, metadata):
+    """Create missing indexes for every mapped table and the legacy tables"""
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for name, table, columns in LEGACY_INDEXES:
+            if table not in tables:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if not set(columns) <= existing:
+                continue
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
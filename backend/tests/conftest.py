@@ -0,0 +1,47 @@
+"""Shared fixtures: the Flask app on a throwaway SQLite database.
+
+The app module configures itself on import, so DATABASE_URL is set before
+anything imports it. Tests share one database and create their own animals
+with unique device IDs.
+"""
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+_db_dir = tempfile.mkdtemp(prefix="tracker-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'tracker.db')}"
+os.environ.setdefault("GEOFENCE_CHECK_SECONDS", "0")
+
+import app as tracker  # noqa: E402
+
+_serial = itertools.count(1)
+
+
+@pytest.fixture
+def tracker_app():
+    return tracker
+
+
+@pytest.fixture
+def client():
+    return tracker.app.test_client()
+
+
+@pytest.fixture
+def make_animal(client):
+    """Register an animal at the fence centre; returns its JSON"""
+
+    def make(name=None, **fields):
+        n = next(_serial)
+        body = {"name": name or f"Test {n}", "device_id": f"TEST-{n:06d}", **fields}
+        response = client.post("/api/animals", json=body)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()["animal"]
+
+    return make
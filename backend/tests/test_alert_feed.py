@@ -0,0 +1,89 @@
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+
+@pytest.fixture
+def alerting_animal(tracker_app, make_animal):
+    """An animal with 130 unread alerts"""
+    animal = make_animal()
+    with tracker_app.app.app_context():
+        tracker_app.insert_alerts([
+            {"animal_id": animal["id"], "alert_type": "TEST", "message": f"alert {n}"} for n in range(130)
+        ])
+        tracker_app.db.session.commit()
+    return animal
+
+
+def own(alerts, animal):
+    return [a for a in alerts if a["animal_id"] == animal["id"]]
+
+
+def test_unpaged_request_returns_every_unread_alert(client, alerting_animal):
+    response = client.get("/api/alerts")
+    assert len(own(response.get_json(), alerting_animal)) == 130
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_pages_follow_the_link_header_and_keep_their_size(client, alerting_animal):
+    seen = []
+    url = "/api/alerts?limit=50"
+    pages = 0
+    while url:
+        response = client.get(url)
+        page = response.get_json()
+        assert len(page) <= 50
+        seen.extend(page)
+        pages += 1
+        link = response.headers.get("Link")
+        if not link:
+            break
+        target = urlparse(link[1:link.index(">")])
+        assert parse_qs(target.query)["limit"] == ["50"]
+        assert parse_qs(target.query)["cursor"] == [response.headers["X-Next-Cursor"]]
+        url = f"{target.path}?{target.query}"
+
+    assert pages > 1
+    ids = [a["id"] for a in seen]
+    assert len(ids) == len(set(ids))
+    assert len(own(seen, alerting_animal)) == 130
+    keys = [(a["created_at"], a["id"]) for a in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_malformed_cursor_is_a_400(client):
+    assert client.get("/api/alerts?cursor=not-a-cursor").status_code == 400
+
+
+def test_pagination_headers_are_readable_cross_origin(client, alerting_animal):
+    response = client.get("/api/alerts?limit=10", headers={"Origin": "http://dashboard.example"})
+    exposed = {h.strip().lower() for h in response.headers["Access-Control-Expose-Headers"].split(",")}
+    assert {"x-next-cursor", "link", "x-herd-version", "etag"} <= exposed
+
+
+def unread_of(client, alert_type):
+    return client.get("/api/alerts/summary").get_json()["by_type"].get(alert_type, 0)
+
+
+def test_summary_counters_follow_inserts_and_reads(client, tracker_app, make_animal):
+    animal = make_animal()
+    with tracker_app.app.app_context():
+        tracker_app.insert_alerts([
+            {"animal_id": animal["id"], "alert_type": alert_type, "message": "summary"}
+            for alert_type in ["SUMMARY_A"] * 3 + ["SUMMARY_B"] * 2
+        ])
+        tracker_app.db.session.commit()
+    alerts = [a for a in client.get("/api/alerts").get_json() if a["animal_id"] == animal["id"]]
+    summary = client.get("/api/alerts/summary").get_json()
+    assert (summary["by_type"]["SUMMARY_A"], summary["by_type"]["SUMMARY_B"]) == (3, 2)
+    assert summary["newest_id"] >= max(a["id"] for a in alerts)
+
+    first = min(a["id"] for a in alerts if a["alert_type"] == "SUMMARY_A")
+    client.post(f"/api/alerts/{first}/read")
+    client.post(f"/api/alerts/{first}/read")
+    assert unread_of(client, "SUMMARY_A") == 2
+
+    response = client.post("/api/alerts/read", json={"up_to": summary["newest_id"], "alert_type": "SUMMARY_B"})
+    assert response.get_json()["acknowledged"] == 2
+    assert (unread_of(client, "SUMMARY_A"), unread_of(client, "SUMMARY_B")) == (2, 0)
+    assert client.post("/api/alerts/read", json={"up_to": "all"}).status_code == 400
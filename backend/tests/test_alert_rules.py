@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from alert_rules import DEFAULT_RULES, RESOLVE, TRIGGER, AlertEngine, compile_rules, load_rules
+
+
+def collar(**values):
+    return SimpleNamespace(**dict({"id": 1, "name": "Daisy", "status": "IN",
+                                   "battery_level": 90, "signal_strength": 90}, **values))
+
+
+def test_every_default_rule_resolves_with_a_message():
+    engine = AlertEngine(load_rules())
+    animal = collar()
+    now = datetime(2024, 1, 1)
+    engine.prime(animal)
+
+    animal.status, animal.battery_level, animal.signal_strength = "OUT", 15, 10
+    assert {e.kind for e in engine.evaluate(animal, now)} == {TRIGGER}
+
+    animal.status, animal.battery_level, animal.signal_strength = "IN", 60, 60
+    resolved = engine.evaluate(animal, now + timedelta(minutes=1))
+    assert {e.kind for e in resolved} == {RESOLVE}
+    assert {e.alert_type for e in resolved} == {f"{r['alert_type']}_CLEARED" for r in DEFAULT_RULES}
+    assert all(e.message and "Daisy" in e.message for e in resolved)
+
+
+def test_rules_without_a_clear_message_get_a_default_and_empty_means_silent():
+    spec = {"name": "hot", "alert_type": "HOT", "field": "temperature", "op": ">", "threshold": 40,
+            "message": "{name} is at {value}"}
+    engine = AlertEngine(compile_rules([spec, dict(spec, name="quiet", clear_message="")]))
+    animal = collar(temperature=20)
+    engine.prime(animal)
+    animal.temperature = 41
+    engine.evaluate(animal, datetime(2024, 1, 1))
+    animal.temperature = 38
+    (resolved,) = engine.evaluate(animal, datetime(2024, 1, 1, 0, 1))
+    assert resolved.rule == "hot"
+    assert resolved.message == "RESOLVED: Daisy temperature is back to 38"
+
+
+def test_returning_animal_writes_a_read_exit_cleared_alert(client, tracker_app, make_animal):
+    animal = make_animal()
+    fix = {"device_id": animal["device_id"]}
+    cleared_before = client.get("/api/alerts/summary").get_json()["by_type"].get("EXIT_CLEARED", 0)
+    client.post("/api/gps", json=dict(fix, lat=animal["lat"] + 5, lng=animal["lng"] + 5))
+    client.post("/api/gps", json=dict(fix, lat=animal["lat"], lng=animal["lng"]))
+
+    # The resolution is kept in history but does not add to the unread feed
+    unread = [a for a in client.get("/api/alerts").get_json() if a["animal_id"] == animal["id"]]
+    assert [a["alert_type"] for a in unread] == ["EXIT"]
+    assert client.get("/api/alerts/summary").get_json()["by_type"].get("EXIT_CLEARED", 0) == cleared_before
+    with tracker_app.app.app_context():
+        cleared = tracker_app.Alert.query.filter_by(animal_id=animal["id"], alert_type="EXIT_CLEARED").one()
+    assert cleared.is_read and cleared.message
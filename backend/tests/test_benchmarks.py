@@ -0,0 +1,40 @@
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import herd_bench  # noqa: E402
+
+
+def test_summary_reports_percentiles_and_sql_per_request():
+    result = herd_bench.summarize([0.001 * n for n in range(1, 101)], 2.0, statements=[2, 4], errors=1)
+    assert result["requests"] == 100
+    assert result["throughput_rps"] == 50
+    assert result["p50_ms"] == 50.5
+    assert result["max_ms"] == 100
+    assert (result["sql_per_request"], result["sql_max"], result["errors"]) == (3, 4, 1)
+
+
+def test_every_read_and_ingest_scenario_runs_cleanly(tracker_app):
+    rng = random.Random(1)
+    assert herd_bench.seed_herd(tracker_app, 20, rng) >= 20
+    # set_geofence would leave the shared fence resized
+    plan = [s for s in herd_bench.scenarios(20, rng) if s[0] != "set_geofence"]
+    results = herd_bench.run_test_client(tracker_app, plan, requests=5)
+    assert set(results) == {s[0] for s in plan}
+    assert all(r["errors"] == 0 and r["sql_per_request"] is not None for r in results.values())
+
+
+def test_compare_prints_the_change_per_endpoint(tmp_path, capsys):
+    endpoint = {"p50_ms": 2.0, "p95_ms": 4.0, "p99_ms": 8.0, "throughput_rps": 100.0, "sql_per_request": 5}
+    for name, scale in (("before", 1), ("after", 0.5)):
+        (tmp_path / f"{name}.json").write_text(json.dumps({
+            "meta": {"commit": name},
+            "results": {"client": {"gps_update": {k: v * scale for k, v in endpoint.items()}}}
+        }))
+    herd_bench.compare(tmp_path / "before.json", tmp_path / "after.json")
+    output = capsys.readouterr().out
+    assert "before -> after" in output
+    assert "p50_ms       2.0 ->       1.0 ( -50.0%)" in output
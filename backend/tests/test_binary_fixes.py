@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+
+from ingest import BINARY_CONTENT_TYPE, FIX_RECORD, Fix, fix_from_record, pack_fixes, unpack_records
+
+
+def test_records_round_trip_with_unreported_fields():
+    stamp = datetime(2024, 1, 1, 12, 0, 0)
+    fixes = [Fix("COW-1", -1.2921, 36.8219, 55.0, 80.0, stamp), Fix("COW-2", None, None, None, None, None)]
+    body = pack_fixes(fixes)
+    assert len(body) == 2 * FIX_RECORD.size == 60
+    assert [fix_from_record(r) for r in unpack_records(body)] == fixes
+
+
+@pytest.mark.parametrize("record, message", [
+    ((b"", 0, 0, 0, 0, 0), "Device ID required"),
+    ((b"\xff\xfe", 0, 0, 0, 0, 0), "Invalid device_id"),
+    ((b"COW-1", 91 * 10 ** 7, 0, 0, 0, 0), "Invalid lat"),
+    ((b"COW-1", 0, -181 * 10 ** 7, 0, 0, 0), "Invalid lng"),
+])
+def test_unusable_records_raise_value_error(record, message):
+    with pytest.raises(ValueError, match=message):
+        fix_from_record(FIX_RECORD.unpack(FIX_RECORD.pack(*record)))
+
+
+def test_truncated_bodies_and_long_device_ids_are_refused():
+    with pytest.raises(ValueError):
+        unpack_records(b"\0" * 29)
+    with pytest.raises(ValueError):
+        pack_fixes([Fix("D" * 17, 0, 0, None, None, None)])
+
+
+def test_binary_fixes_ingest_like_json(client, make_animal):
+    one, two = make_animal(), make_animal()
+    fixes = [Fix(a["device_id"], a["lat"], a["lng"], 42, 70, None) for a in (one, two)]
+
+    response = client.post("/api/gps", data=pack_fixes(fixes[:1]), content_type=BINARY_CONTENT_TYPE)
+    assert response.status_code == 200
+    assert response.get_json()["animal"]["status"] == "IN"
+    assert client.get(f"/api/animals/{one['id']}").get_json()["battery_level"] == 42
+    assert client.post("/api/gps", data=pack_fixes(fixes), content_type=BINARY_CONTENT_TYPE).status_code == 400
+
+    batch = client.post("/api/gps/batch", data=pack_fixes(fixes), content_type=BINARY_CONTENT_TYPE).get_json()
+    assert batch["accepted"] == 2
+    assert client.post("/api/gps/batch", data=b"\0" * 31, content_type=BINARY_CONTENT_TYPE).status_code == 400
@@ -0,0 +1,60 @@
+from sqlalchemy import event
+
+
+def own_alerts(client, animal):
+    return [a for a in client.get("/api/alerts").get_json() if a["animal_id"] == animal["id"]]
+
+
+def status_of(client, animal):
+    return client.get(f"/api/animals/{animal['id']}").get_json()["status"]
+
+
+def test_missing_device_goes_out_with_one_bluetooth_alert(client, make_animal):
+    animal = make_animal()
+    report = {"device_ids": [], "not_found_ids": [animal["device_id"]]}
+
+    response = client.post("/api/bluetooth/status", json=report)
+    assert response.status_code == 200
+    assert response.get_json()["updated"] == [animal["device_id"]]
+    assert status_of(client, animal) == "OUT"
+
+    assert client.post("/api/bluetooth/status", json=report).get_json()["updated"] == []
+    (alert,) = own_alerts(client, animal)
+    assert alert["alert_type"] == "EXIT"
+    assert "out of Bluetooth range" in alert["message"]
+
+
+def test_detected_device_comes_back_in(client, make_animal):
+    animal = make_animal()
+    client.post("/api/bluetooth/status", json={"not_found_ids": [animal["device_id"]]})
+    response = client.post("/api/bluetooth/status", json={"device_ids": [animal["device_id"], "TEST-UNKNOWN"]})
+    assert response.get_json()["updated"] == [animal["device_id"]]
+    assert status_of(client, animal) == "IN"
+
+
+def scan_statements(client, tracker_app, found, missing):
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    with tracker_app.app.app_context():
+        engine = tracker_app.db.engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = client.post("/api/bluetooth/status", json={
+            "device_ids": [a["device_id"] for a in found],
+            "not_found_ids": [a["device_id"] for a in missing]
+        })
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert len(response.get_json()["updated"]) == len(found) + len(missing)
+    return len(statements)
+
+
+def test_scan_cost_does_not_grow_with_the_number_of_devices(client, tracker_app, make_animal):
+    small = [make_animal() for _ in range(4)]
+    large = [make_animal() for _ in range(40)]
+    assert scan_statements(client, tracker_app, small[:2], small[2:]) == \
+        scan_statements(client, tracker_app, large[:20], large[20:])
+    assert {status_of(client, a) for a in large[20:]} == {"OUT"}
@@ -0,0 +1,50 @@
+def herd_version(client):
+    return int(client.get("/api/animals").headers["X-Herd-Version"])
+
+
+def test_every_herd_write_takes_a_new_version(client, make_animal):
+    before = herd_version(client)
+    animal = make_animal()
+    after_create = herd_version(client)
+    client.post("/api/gps", json={"device_id": animal["device_id"], "lat": animal["lat"], "lng": animal["lng"]})
+    after_fix = herd_version(client)
+    assert before < after_create < after_fix
+
+
+def test_since_returns_only_changes_and_deletions(client, make_animal):
+    untouched = make_animal()
+    moved, removed = make_animal(), make_animal()
+    since = herd_version(client)
+
+    client.post("/api/gps", json={"device_id": moved["device_id"], "lat": moved["lat"], "lng": moved["lng"]})
+    client.delete(f"/api/animals/{removed['id']}")
+
+    body = client.get(f"/api/animals?since={since}").get_json()
+    assert body["version"] == herd_version(client)
+    changed = {a["id"] for a in body["animals"]}
+    assert moved["id"] in changed
+    assert untouched["id"] not in changed
+    assert removed["id"] in body["deleted"]
+
+    assert client.get(f"/api/animals?since={body['version']}").get_json()["animals"] == []
+
+
+def test_unchanged_herd_revalidates_with_304(client, make_animal):
+    make_animal()
+    first = client.get("/api/animals")
+    etag = first.headers["ETag"]
+    assert client.get("/api/animals", headers={"If-None-Match": etag}).status_code == 304
+
+    make_animal()
+    assert client.get("/api/animals", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_batch_ingest_stamps_its_animals_with_one_version(client, make_animal):
+    herd = [make_animal() for _ in range(3)]
+    since = herd_version(client)
+    client.post("/api/gps/batch", json={"fixes": [
+        {"device_id": a["device_id"], "lat": a["lat"], "lng": a["lng"]} for a in herd
+    ]})
+    body = client.get(f"/api/animals?since={since}").get_json()
+    assert {a["id"] for a in herd} <= {a["id"] for a in body["animals"]}
+    assert body["version"] == since + 1
@@ -0,0 +1,61 @@
+from registry import AnimalState, DeviceRegistry
+
+
+class Loader:
+    """Loads states for devices named COW-<id>, recording each call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, device_ids):
+        self.calls.append(sorted(device_ids))
+        return [AnimalState(id=int(d.split("-")[1]), device_id=d, name=d) for d in device_ids if d.startswith("COW-")]
+
+
+def test_misses_load_in_one_call_and_hits_stay_in_memory():
+    loader = Loader()
+    registry = DeviceRegistry(loader)
+    found = registry.get_many(["COW-1", "COW-2", "GOAT-1"])
+    assert set(found) == {"COW-1", "COW-2"}
+    assert registry.get("COW-1") is found["COW-1"]
+    assert loader.calls == [["COW-1", "COW-2", "GOAT-1"]]
+    assert registry.stats() == dict(registry.stats(), hits=1, misses=3, size=2)
+
+
+def test_least_recently_used_devices_are_evicted():
+    registry = DeviceRegistry(Loader(), max_size=2)
+    registry.get_many(["COW-1", "COW-2"])
+    registry.get("COW-1")
+    registry.get("COW-3")
+    assert registry.get_by_animal(2) is None
+    assert registry.get_by_animal(1) is not None
+    assert registry.stats()["evictions"] == 1
+
+
+def test_invalidated_devices_are_loaded_again():
+    loader = Loader()
+    registry = DeviceRegistry(loader)
+    first = registry.get("COW-1")
+    registry.invalidate_animal(1)
+    assert registry.get("COW-1") is not first
+    registry.invalidate("COW-1")
+    registry.get("COW-1")
+    assert len(loader.calls) == 3
+
+
+def test_patch_updates_a_cached_state_in_place():
+    registry = DeviceRegistry(Loader())
+    state = registry.get("COW-1")
+    registry.patch(1, status="OUT", lat=1.5)
+    registry.patch(99, status="OUT")
+    assert (state.status, state.lat) == ("OUT", 1.5)
+
+
+def test_renamed_device_is_no_longer_resolved_by_the_api(client, make_animal):
+    animal = make_animal()
+    fix = {"lat": animal["lat"], "lng": animal["lng"]}
+    assert client.post("/api/gps", json=dict(fix, device_id=animal["device_id"])).status_code == 200
+
+    client.put(f"/api/animals/{animal['id']}", json={"device_id": animal["device_id"] + "-B"})
+    assert client.post("/api/gps", json=dict(fix, device_id=animal["device_id"])).status_code == 404
+    assert client.post("/api/gps", json=dict(fix, device_id=animal["device_id"] + "-B")).status_code == 200
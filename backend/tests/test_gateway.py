@@ -0,0 +1,124 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from gateway import Gateway, parse_frames, parse_text_frame
+
+
+def frame(animal, lat=None, lng=None):
+    lat = animal["lat"] if lat is None else lat
+    lng = animal["lng"] if lng is None else lng
+    return f"${animal['device_id']},{lat},{lng},80,90,\n".encode()
+
+
+def run_gateway(tracker_app, *frames):
+    """Feed frames through a gateway bound to the app; returns its stats after one flush"""
+    gateway = Gateway(tracker_app.flush_fixes)
+    for data in frames:
+        gateway.feed(data)
+    asyncio.run(gateway.flush())
+    return gateway.stats()
+
+
+def elsewhere(tracker_app, *statements):
+    """Run writes the way another process would: straight to the database, bypassing this process's caches"""
+    with tracker_app.app.app_context():
+        session = tracker_app.db.session
+        version = session.execute(update(tracker_app.SyncCounter)
+                                  .values(value=tracker_app.SyncCounter.value + 1)
+                                  .returning(tracker_app.SyncCounter.value)).scalar_one()
+        for statement in statements:
+            session.execute(statement(version))
+        session.commit()
+
+
+def test_text_frames_parse_and_bad_lines_are_counted():
+    fix = parse_text_frame(b"$COW-1,-1.5,36.8,,55,1700000000")
+    assert (fix.device_id, fix.lat, fix.lng, fix.battery, fix.signal) == ("COW-1", -1.5, 36.8, None, 55.0)
+    fixes, invalid = parse_frames(b"$COW-1,1,2\n$COW-2,91,0\n$,1,2\n")
+    assert [f.device_id for f in fixes] == ["COW-1"]
+    assert invalid == 2
+
+
+def test_retransmitted_frames_are_applied_once(tracker_app, make_animal):
+    animal = make_animal()
+    data = f"${animal['device_id']},{animal['lat']},{animal['lng']},80,90,1700000000\n".encode()
+    stats = run_gateway(tracker_app, data, data)
+    assert (stats["applied"], stats["duplicates"]) == (1, 1)
+
+
+def test_cache_entries_survive_the_gateways_own_writes(tracker_app, make_animal):
+    animal = make_animal()
+    run_gateway(tracker_app, frame(animal))
+    run_gateway(tracker_app, frame(animal))
+    assert tracker_app.device_registry.get_by_animal(animal["id"]) is not None
+
+
+def test_animal_deleted_by_another_process_is_rejected_without_orphan_rows(tracker_app, make_animal):
+    animal = make_animal()
+    assert run_gateway(tracker_app, frame(animal))["applied"] == 1
+
+    animals = tracker_app.Animal.__table__
+    chunks = tracker_app.PositionChunk.__table__
+    tombstones = tracker_app.AnimalTombstone.__table__
+    elsewhere(tracker_app,
+              lambda v: chunks.delete().where(chunks.c.animal_id == animal["id"]),
+              lambda v: tombstones.insert().values(animal_id=animal["id"], version=v),
+              lambda v: animals.delete().where(animals.c.id == animal["id"]))
+
+    stats = run_gateway(tracker_app, frame(animal))
+    assert (stats["applied"], stats["rejected"]) == (0, 1)
+    with tracker_app.app.app_context():
+        assert tracker_app.PositionChunk.query.filter_by(animal_id=animal["id"]).count() == 0
+
+
+def test_animal_re_keyed_by_another_process_is_looked_up_again(tracker_app, make_animal):
+    animal = make_animal()
+    run_gateway(tracker_app, frame(animal))
+    animals = tracker_app.Animal.__table__
+    elsewhere(tracker_app, lambda v: animals.update().where(animals.c.id == animal["id"])
+              .values(device_id=animal["device_id"] + "-NEW", version=v))
+
+    assert run_gateway(tracker_app, frame(animal))["rejected"] == 1
+    assert run_gateway(tracker_app, frame(dict(animal, device_id=animal["device_id"] + "-NEW")))["applied"] == 1
+
+
+@pytest.fixture
+def move_fence(tracker_app):
+    """Moves the fence north from another process; moved back afterwards"""
+    fences = tracker_app.Geofence.__table__
+    moved = []
+
+    def move(degrees):
+        elsewhere(tracker_app, lambda v: fences.update().values(center_lat=fences.c.center_lat + degrees,
+                                                                version=fences.c.version + 1))
+        moved.append(degrees)
+
+    yield move
+    move(-sum(moved))
+    with tracker_app.app.app_context():
+        tracker_app.refresh_geofence_config()
+
+
+def test_fence_moved_by_another_process_applies_on_the_next_flush(tracker_app, make_animal, move_fence):
+    animal = make_animal()
+    run_gateway(tracker_app, frame(animal))
+    move_fence(1)
+    run_gateway(tracker_app, frame(animal))
+    assert tracker_app.device_registry.get_by_animal(animal["id"]).status == "OUT"
+
+
+def test_api_requests_see_fixes_written_by_another_process(tracker_app, client, make_animal):
+    animal = make_animal()
+    start = datetime(2026, 3, 2, 12)
+    fix = {"device_id": animal["device_id"], "lat": animal["lat"], "lng": animal["lng"]}
+    assert client.post("/api/gps", json=dict(fix, timestamp=start.isoformat())).status_code == 200
+
+    animals = tracker_app.Animal.__table__
+    elsewhere(tracker_app, lambda v: animals.update().where(animals.c.id == animal["id"])
+              .values(last_seen=start + timedelta(minutes=10), version=v))
+
+    late = client.post("/api/gps", json=dict(fix, timestamp=(start + timedelta(minutes=5)).isoformat()))
+    assert late.status_code == 409
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from geofence import CircleZone, PolygonZone, ZoneIndex, zone_from_dict
+
+SQUARE = [(0, 0), (0, 1), (1, 1), (1, 0)]
+
+
+def test_lookup_finds_every_zone_holding_a_point():
+    paddock = PolygonZone("paddock", SQUARE)
+    water = CircleZone("water", 0.5, 0.5, 5)
+    index = ZoneIndex([paddock, water, CircleZone("far", 40, 40, 1)])
+    assert {z.name for z in index.lookup(0.5, 0.5)} == {"paddock", "water"}
+    assert [z.name for z in index.lookup(0.9, 0.9)] == ["paddock"]
+    assert index.lookup(2, 2) == []
+
+
+def test_exclusion_zones_win_over_paddocks():
+    index = ZoneIndex([PolygonZone("paddock", SQUARE), CircleZone("quarry", 0.5, 0.5, 1, "exclusion")])
+    assert index.status(0.5, 0.5) == "OUT"
+    assert index.status(0.1, 0.1) == "IN"
+    assert index.status(5, 5) == "OUT"
+
+
+def test_zones_too_large_for_the_grid_are_still_found():
+    index = ZoneIndex([CircleZone("ranch", 0, 0, 500)], cell_deg=0.01)
+    assert index.oversized
+    assert index.status(1, 1) == "IN"
+
+
+@pytest.mark.parametrize("data", [
+    {"lat": 0, "lng": 0, "radius": 1},
+    {"name": "z", "lat": 0, "lng": 0, "radius": 0},
+    {"name": "z", "lat": 95, "lng": 0, "radius": 1},
+    {"name": "z", "points": [[0, 0], [1, 1]]},
+    {"name": "z", "points": [[0, 0], [1, 1], [1]]},
+    {"name": "z", "zone_type": "moat", "lat": 0, "lng": 0, "radius": 1},
+    {"name": "z", "lat": "north", "lng": 0, "radius": 1},
+])
+def test_invalid_zone_definitions_raise_value_error(data):
+    with pytest.raises(ValueError):
+        zone_from_dict(data)
+
+
+def test_zones_added_over_the_api_drive_lookups(client):
+    zone = {"name": "Test far paddock", "points": [[10, 10], [10, 10.01], [10.01, 10.01], [10.01, 10]]}
+    response = client.post("/api/geofence/zones", json=zone)
+    assert response.status_code == 200
+    zone_id = response.get_json()["zone"]["id"]
+    try:
+        assert client.post("/api/geofence/zones", json=zone).status_code == 400
+        body = client.get("/api/geofence/lookup?lat=10.005&lng=10.005").get_json()
+        assert body["status"] == "IN"
+        assert [z["name"] for z in body["zones"]] == ["Test far paddock"]
+    finally:
+        client.delete(f"/api/geofence/zones/{zone_id}")
+    assert client.get("/api/geofence/lookup?lat=10.005&lng=10.005").get_json()["status"] == "OUT"
+
+
+def test_vectorised_status_matches_the_point_lookup():
+    rng = np.random.default_rng(7)
+    index = ZoneIndex([
+        PolygonZone("paddock", SQUARE),
+        CircleZone("water", 1.2, 0.5, 30),
+        CircleZone("quarry", 0.3, 0.3, 10, "exclusion"),
+    ])
+    lats, lngs = rng.uniform(-0.5, 1.5, 2000), rng.uniform(-0.5, 1.5, 2000)
+    expected = [index.status(lat, lng) == "IN" for lat, lng in zip(lats, lngs)]
+    assert index.inside_many(lats, lngs).tolist() == expected
+
+
+@pytest.fixture
+def fence(client):
+    """Restores the farm fence after the test moves it"""
+    original = client.get("/api/geofence").get_json()
+    yield original
+    client.post("/api/geofence", json={k: original[k] for k in ("lat", "lng", "radius")})
+
+
+def test_moving_the_fence_rechecks_the_herd_in_bulk(client, make_animal, fence):
+    animal = make_animal()
+    response = client.post("/api/geofence", json={"lat": fence["lat"] + 1, "lng": fence["lng"],
+                                                  "radius": fence["radius"]})
+    assert response.get_json()["animals_updated"] >= 1
+    assert client.get(f"/api/animals/{animal['id']}").get_json()["status"] == "OUT"
+    alerts = [a for a in client.get("/api/alerts").get_json() if a["animal_id"] == animal["id"]]
+    assert [a["alert_type"] for a in alerts] == ["EXIT"]
+
+
+def move_fence_elsewhere(tracker_app, lat):
+    """Change the fence as another worker would: in the database only"""
+    with tracker_app.app.app_context():
+        fences = tracker_app.Geofence.__table__
+        tracker_app.db.session.execute(fences.update().values(center_lat=lat, version=fences.c.version + 1))
+        tracker_app.db.session.commit()
+
+
+def test_workers_reload_the_fence_when_its_version_moves(client, tracker_app, fence, monkeypatch):
+    move_fence_elsewhere(tracker_app, fence["lat"] + 1)
+    assert client.get("/api/geofence").get_json()["lat"] == fence["lat"] + 1
+
+    monkeypatch.setattr(tracker_app, "GEOFENCE_CHECK_SECONDS", 3600)
+    move_fence_elsewhere(tracker_app, fence["lat"] + 2)
+    assert client.get("/api/geofence").get_json()["lat"] == fence["lat"] + 1
+
+
+@pytest.mark.parametrize("body", [
+    {"lat": None, "lng": 36.82, "radius": 0.5},
+    {"lat": -1.29, "lng": 200, "radius": 0.5},
+    {"lat": -1.29, "lng": 36.82, "radius": 0},
+    {"lat": -1.29, "lng": 36.82, "radius": "wide"},
+])
+def test_invalid_fence_is_refused_and_the_api_keeps_working(client, fence, body):
+    response = client.post("/api/geofence", json=body)
+    assert response.status_code == 400
+    assert not response.get_json()["success"]
+    assert client.get("/api/geofence").get_json() == fence
+    assert client.get("/api/animals").status_code == 200
+
+
+def test_valid_fence_is_served_with_its_new_version(client, fence):
+    body = client.post("/api/geofence", json={"lat": fence["lat"], "lng": fence["lng"], "radius": 0.6}).get_json()
+    assert body["geofence"]["radius"] == 0.6
+    assert body["geofence"]["version"] == fence["version"] + 1
+    assert client.get("/api/geofence").get_json() == body["geofence"]
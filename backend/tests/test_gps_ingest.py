@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from ingest import FIX_RECORD, fix_from_json, fix_from_record, parse_timestamp
+
+
+def test_parse_timestamp_accepts_epoch_seconds_millis_and_iso():
+    assert parse_timestamp(1700000000) == datetime(2023, 11, 14, 22, 13, 20)
+    assert parse_timestamp(1700000000000) == datetime(2023, 11, 14, 22, 13, 20)
+    assert parse_timestamp("1700000000") == datetime(2023, 11, 14, 22, 13, 20)
+    assert parse_timestamp("2023-11-14T22:13:20Z") == datetime(2023, 11, 14, 22, 13, 20)
+    assert parse_timestamp("2023-11-15T01:13:20+03:00") == datetime(2023, 11, 14, 22, 13, 20)
+    assert parse_timestamp(None) is None
+    assert parse_timestamp("") is None
+
+
+@pytest.mark.parametrize("value", [1e20, float("inf"), float("nan"), "9" * 30, -1e20, True, "yesterday", [1]])
+def test_parse_timestamp_rejects_out_of_range_values_with_value_error(value):
+    with pytest.raises(ValueError):
+        parse_timestamp(value)
+
+
+def test_parse_timestamp_rejects_offsets_past_datetime_range():
+    with pytest.raises(ValueError):
+        parse_timestamp("0001-01-01T00:00:00+01:00")
+
+
+def test_fixes_dated_beyond_the_clock_skew_are_rejected():
+    future = datetime.utcnow() + timedelta(days=1)
+    with pytest.raises(ValueError, match="future"):
+        fix_from_json({"device_id": "D1", "lat": 1, "lng": 2, "timestamp": future.isoformat()})
+    with pytest.raises(ValueError, match="future"):
+        fix_from_record(FIX_RECORD.unpack(FIX_RECORD.pack(b"D1", 0, 0, 50, 50, int(future.timestamp()))))
+
+    near = datetime.utcnow() + timedelta(seconds=30)
+    assert fix_from_json({"device_id": "D1", "timestamp": near.isoformat()}).timestamp == near
+
+
+def test_gps_update_moves_the_animal(client, make_animal):
+    animal = make_animal()
+    response = client.post("/api/gps", json={
+        "device_id": animal["device_id"], "lat": animal["lat"], "lng": animal["lng"], "battery": 80
+    })
+    assert response.status_code == 200
+    assert response.get_json()["animal"]["status"] == "IN"
+
+
+@pytest.mark.parametrize("timestamp", [1e20, "1e400", (datetime.utcnow() + timedelta(days=365)).isoformat()])
+def test_gps_update_rejects_bad_timestamps_with_400(client, make_animal, timestamp):
+    animal = make_animal()
+    response = client.post("/api/gps", json={"device_id": animal["device_id"], "lat": 0, "lng": 0, "timestamp": timestamp})
+    assert response.status_code == 400
+    assert not response.get_json()["success"]
+
+
+def test_gps_batch_rejects_only_the_fix_with_a_bad_timestamp(client, make_animal):
+    good, bad, future = make_animal(), make_animal(), make_animal()
+    response = client.post("/api/gps/batch", json={"fixes": [
+        {"device_id": good["device_id"], "lat": good["lat"], "lng": good["lng"]},
+        {"device_id": bad["device_id"], "lat": 0, "lng": 0, "timestamp": 1e20},
+        {"device_id": future["device_id"], "lat": 0, "lng": 0,
+         "timestamp": (datetime.utcnow() + timedelta(days=2)).isoformat()},
+        {"device_id": "TEST-UNKNOWN", "lat": 0, "lng": 0},
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["accepted"] == 1
+    assert [r["success"] for r in body["results"]] == [True, False, False, False]
+    assert body["results"][1]["message"] == "Invalid timestamp"
+    assert body["results"][3]["message"] == "Device not registered"
+
+
+def test_a_rejected_future_fix_does_not_block_later_fixes(client, make_animal):
+    animal = make_animal()
+    client.post("/api/gps", json={
+        "device_id": animal["device_id"], "lat": 0, "lng": 0,
+        "timestamp": (datetime.utcnow() + timedelta(days=30)).isoformat()
+    })
+    response = client.post("/api/gps", json={"device_id": animal["device_id"], "lat": animal["lat"], "lng": animal["lng"]})
+    assert response.status_code == 200
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from heatmap import (BASE_CELL_DEG, DAY, HOUR, MAX_LEVEL, bin_positions, bucket_ranges, cell_of, coarsen,
+                     level_for_zoom, tile_bounds)
+
+MIDNIGHT = 1700006400  # 2023-11-15 00:00 UTC
+
+
+def test_each_fix_counts_once_in_its_hour_and_its_day():
+    seen = datetime(2023, 11, 15, 10, 30)
+    counts = bin_positions([(1, seen, 0.0001, 0.0001, "IN"), (2, seen, 0.0002, 0.0002, "IN"),
+                            (3, seen, None, None, "OUT")])
+    assert counts == {(HOUR, MIDNIGHT + 10 * HOUR, 0, 0): 2, (DAY, MIDNIGHT, 0, 0): 2}
+
+
+def test_ranges_use_whole_days_in_the_middle_and_hours_at_the_edges():
+    start, end = MIDNIGHT - 2 * HOUR - 5, MIDNIGHT + 2 * DAY + 90 * 60
+    assert bucket_ranges(start, end) == [
+        (HOUR, MIDNIGHT - 3 * HOUR, MIDNIGHT),
+        (DAY, MIDNIGHT, MIDNIGHT + 2 * DAY),
+        (HOUR, MIDNIGHT + 2 * DAY, MIDNIGHT + 2 * DAY + 2 * HOUR),
+    ]
+    assert bucket_ranges(MIDNIGHT + 60, MIDNIGHT + 120) == [(HOUR, MIDNIGHT, MIDNIGHT + HOUR)]
+    # Hourly counts before the cutoff may be gone, so that edge rounds out to the day
+    assert bucket_ranges(start, end, hourly_since=MIDNIGHT + DAY)[0] == (DAY, MIDNIGHT - DAY, MIDNIGHT + 2 * DAY)
+
+
+def test_coarser_levels_merge_base_cells():
+    assert coarsen([(0, 0, 1), (1, 1, 2), (2, 0, 4), (-1, 0, 8)], 1) == {(0, 0): 3, (1, 0): 4, (-1, 0): 8}
+    assert level_for_zoom(0) == MAX_LEVEL
+    assert level_for_zoom(22) == 0
+    min_lat, min_lng, max_lat, max_lng = tile_bounds(1, 1, 0)
+    assert (min_lat, min_lng, max_lng) == (0, 0, 180) and 85 < max_lat < 86
+
+
+def test_heatmap_counts_ingested_fixes(client, make_animal):
+    animal = make_animal()
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(days=3)
+    for n in range(6):
+        client.post("/api/gps", json={"device_id": animal["device_id"], "lat": 50.0001 + (n % 2) * BASE_CELL_DEG,
+                                      "lng": 50, "timestamp": (start + timedelta(hours=n * 10)).isoformat()})
+
+    box = "min_lat=49.99&min_lng=49.99&max_lat=50.01&max_lng=50.01"
+    window = f"start={start.isoformat()}&end={datetime.utcnow().isoformat()}"
+    body = client.get(f"/api/heatmap?{box}&{window}").get_json()
+    assert sorted(n for lat, lng, n in body["cells"]) == [3, 3]
+    assert {cell_of(lat, lng) for lat, lng, n in body["cells"]} == {cell_of(50.0001, 50), cell_of(50.0001 + BASE_CELL_DEG, 50)}
+
+    coarse = client.get(f"/api/heatmap?{box}&{window}&level=4").get_json()
+    assert [n for lat, lng, n in coarse["cells"]] == [6]
+    assert client.get("/api/heatmap?min_lat=1").status_code == 400
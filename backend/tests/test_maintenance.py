@@ -0,0 +1,86 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from maintenance import AlertArchive, Retention, hourly_rollups, retention_days
+
+HOUR_START = 1700000000 - 1700000000 % 3600
+
+
+def test_rollups_average_each_animal_hour():
+    rows = hourly_rollups([(1, HOUR_START + 10, 1.0, 2.0), (1, HOUR_START + 20, 3.0, 4.0),
+                           (1, HOUR_START + 3600, 5.0, 5.0), (2, HOUR_START + 30, 0.0, 0.0)])
+    assert sorted((r["animal_id"], r["hour"], r["fixes"], r["lat"], r["lng"]) for r in rows) == [
+        (1, HOUR_START, 2, 2.0, 3.0), (1, HOUR_START + 3600, 1, 5.0, 5.0), (2, HOUR_START, 1, 0.0, 0.0)
+    ]
+
+
+def test_retention_values_parse_never_as_keep_forever():
+    assert retention_days("never") is None
+    assert retention_days("") is None
+    assert retention_days("7.5") == 7.5
+    with pytest.raises(ValueError):
+        retention_days(-1)
+
+
+def test_archive_appends_gzipped_json_lines(tmp_path):
+    archive = AlertArchive(str(tmp_path))
+    archive.write([])
+    assert archive.path is None
+    archive.write([{"id": 1, "created_at": datetime(2024, 1, 1)}])
+    archive.write([{"id": 2, "created_at": datetime(2024, 1, 2)}])
+    archive.close()
+    with gzip.open(archive.path) as f:
+        assert [json.loads(line)["id"] for line in f] == [1, 2]
+    assert archive.written == 2
+
+
+def test_a_pass_rolls_up_old_fixes_and_purges_old_alerts_and_hours(client, tracker_app, make_animal, tmp_path,
+                                                                   monkeypatch):
+    # Ten days of everything; other tests' data is newer, so this pass only touches this test's rows
+    retention = Retention(10, 10, None, 10, None)
+    monkeypatch.setattr(tracker_app, "RETENTION", retention)
+    animal = make_animal()
+    old = (datetime.utcnow() - timedelta(days=20)).replace(minute=0, second=0, microsecond=0)
+    for n, lat in enumerate((50.0, 50.002)):
+        client.post("/api/gps", json={"device_id": animal["device_id"], "lat": lat, "lng": 50,
+                                      "timestamp": (old + timedelta(minutes=10 * n)).isoformat()})
+    client.post("/api/gps", json={"device_id": animal["device_id"], "lat": 50, "lng": 50})
+
+    Alert = tracker_app.Alert
+    with tracker_app.app.app_context():
+        tracker_app.insert_alerts([{"animal_id": animal["id"], "alert_type": "RETENTION", "message": m}
+                                   for m in ("read", "unread")])
+        tracker_app.db.session.execute(update(Alert).where(Alert.animal_id == animal["id"])
+                                       .values(created_at=old))
+        tracker_app.db.session.execute(update(Alert).where(Alert.animal_id == animal["id"], Alert.message == "read")
+                                       .values(is_read=True))
+        tracker_app.db.session.commit()
+        tracker_app.count_alerts(["RETENTION"], delta=-1)
+        tracker_app.db.session.commit()
+
+        archive = AlertArchive(str(tmp_path))
+        summary = tracker_app.run_maintenance(retention, pause=0, archive=archive)
+        archive.close()
+
+    assert summary["positions"]["fixes"] >= 2
+    assert summary["heatmap"]["hours"] >= 1
+    with gzip.open(archive.path) as f:
+        purged = [json.loads(line) for line in f]
+    assert [a["message"] for a in purged if a["animal_id"] == animal["id"]] == ["read"]
+
+    window = f"start={old.isoformat()}&end={(old + timedelta(hours=1)).isoformat()}"
+    body = client.get(f"/api/animals/{animal['id']}/positions?{window}").get_json()
+    assert body["positions"] == []
+    (rollup,) = body["hourly"]
+    assert (rollup["fixes"], rollup["lat"], rollup["timestamp"]) == (2, pytest.approx(50.001), old.isoformat())
+
+    remaining = [a["message"] for a in client.get("/api/alerts").get_json() if a["animal_id"] == animal["id"]]
+    assert "unread" in remaining
+    assert client.get("/api/alerts/summary").get_json()["by_type"].get("RETENTION") == 1
+
+    heat = client.get(f"/api/heatmap?{window}&min_lat=49.9&min_lng=49.9&max_lat=50.1&max_lng=50.1").get_json()
+    assert sum(n for lat, lng, n in heat["cells"]) == 2  # from the daily counts, which are kept
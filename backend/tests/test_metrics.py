@@ -0,0 +1,41 @@
+from metrics import RequestMetrics
+
+
+def exposition(body):
+    types, samples = {}, {}
+    for line in body.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split()
+            types[name] = kind
+        elif line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return types, samples
+
+
+def test_cumulative_stats_are_counters_and_levels_are_gauges():
+    types, samples = exposition(RequestMetrics().render({
+        "device_cache": {"size": 3, "hits": 10, "misses": 2, "evictions": 0},
+        "ingest_queue": {"depth": 4, "applied": 7, "dropped": 1, "active": True, "mode": "flush"},
+    }))
+    assert types["tracker_device_cache_hits_total"] == "counter"
+    assert types["tracker_device_cache_misses_total"] == "counter"
+    assert types["tracker_ingest_queue_applied_total"] == "counter"
+    assert types["tracker_ingest_queue_dropped_total"] == "counter"
+    assert types["tracker_device_cache_size"] == "gauge"
+    assert types["tracker_ingest_queue_depth"] == "gauge"
+    assert samples["tracker_device_cache_hits_total"] == 10
+    assert samples["tracker_ingest_queue_active"] == 1
+    assert "tracker_device_cache_hits" not in types
+    assert not any("mode" in name for name in types)
+
+
+def test_metrics_endpoint_types_worker_stats(client, make_animal):
+    make_animal()
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    types, samples = exposition(response.get_data(as_text=True))
+    assert types["tracker_device_cache_hits_total"] == "counter"
+    assert types["tracker_event_hub_published_total"] == "counter"
+    assert types["tracker_event_hub_subscribers"] == "gauge"
+    assert all(name.endswith("_total") for name, kind in types.items() if kind == "counter")
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from movement import MAX_GAP_SECONDS, Tail, empty_totals, fold_fixes
+
+# 0.001 degrees of latitude in metres
+STEP_M = 111.195
+
+
+def test_segments_split_into_moving_idle_inside_and_outside_time():
+    fixes = [
+        Tail(0, 0.0, 0.0, "IN"),
+        Tail(60, 0.001, 0.0, "OUT"),      # 111 m in a minute: moving, inside
+        Tail(660, 0.001, 0.0, "OUT"),     # stood still for 10 minutes, outside
+        Tail(660, 0.002, 0.0, "OUT"),     # a repeat of the same instant adds nothing
+        Tail(670, 0.5, 0.0, "IN"),        # a 55 km jump in 10 s is a glitch
+        Tail(670 + MAX_GAP_SECONDS + 1, 0.6, 0.0, "IN"),  # the collar was offline
+    ]
+    totals = empty_totals()
+    tail = fold_fixes(totals, None, fixes)
+    assert tail == fixes[-1]
+    assert totals["fixes"] == 6
+    assert totals["distance_m"] == pytest.approx(STEP_M, abs=0.01)
+    assert (totals["moving_seconds"], totals["idle_seconds"]) == (70, 600)
+    assert (totals["inside_seconds"], totals["outside_seconds"]) == (60, 610)
+    assert totals["max_speed_ms"] == pytest.approx(STEP_M / 60, abs=0.01)
+
+
+def test_folding_in_batches_matches_folding_at_once():
+    fixes = [Tail(30 * n, 0.0001 * (n % 7), 0.0001 * n, "OUT" if n % 5 else "IN") for n in range(50)]
+    at_once, batched = empty_totals(), empty_totals()
+    fold_fixes(at_once, None, fixes)
+    tail = None
+    for first in range(0, 50, 8):
+        tail = fold_fixes(batched, tail, fixes[first:first + 8])
+    assert batched == pytest.approx(at_once)
+
+
+def test_daily_stats_are_kept_on_ingest(client, make_animal):
+    animal = make_animal()
+    midnight = datetime.combine(datetime.utcnow().date() - timedelta(days=2), datetime.min.time())
+    for minutes, lat_steps in ((-2, 0), (-1, 1), (1, 2), (2, 2)):
+        client.post("/api/gps", json={"device_id": animal["device_id"], "lat": 10 + lat_steps * 0.001, "lng": 10,
+                                      "timestamp": (midnight + timedelta(minutes=minutes)).isoformat()})
+
+    body = client.get(f"/api/animals/{animal['id']}/stats?start={(midnight - timedelta(days=1)).date()}"
+                      f"&end={midnight.date()}").get_json()
+    before, after = body["days"]
+    assert (before["fixes"], after["fixes"]) == (2, 2)
+    # The segment across midnight belongs to the day of the fix that ends it
+    assert before["distance_m"] == pytest.approx(STEP_M, abs=0.1)
+    assert after["distance_m"] == pytest.approx(STEP_M, abs=0.1)
+    assert (after["moving_seconds"], after["idle_seconds"]) == (120, 60)
+    assert body["total"]["outside_seconds"] == 240
+
+    daily = client.get(f"/api/stats/daily?day={midnight.date()}&limit=500").get_json()
+    assert animal["id"] in [a["animal_id"] for a in daily["animals"]]
+    assert client.get(f"/api/animals/{animal['id']}/stats?start=tomorrow").status_code == 400
+
+
+def test_deleted_animal_leaves_no_stats_to_a_reused_id(client, make_animal):
+    animal = make_animal()
+    day = datetime.utcnow().date() - timedelta(days=3)
+    noon = datetime.combine(day, datetime.min.time()) + timedelta(hours=12)
+    for minutes in (0, 1):
+        client.post("/api/gps", json={"device_id": animal["device_id"], "lat": 10 + minutes * 0.001, "lng": 10,
+                                      "timestamp": (noon + timedelta(minutes=minutes)).isoformat()})
+    assert client.delete(f"/api/animals/{animal['id']}").get_json()["success"]
+
+    # SQLite hands the highest deleted id to the next row
+    reused = make_animal()
+    assert reused["id"] == animal["id"]
+    body = client.get(f"/api/animals/{reused['id']}/stats?start={day}&end={day}").get_json()
+    assert body["days"] == []
+    daily = client.get(f"/api/stats/daily?day={day}&limit=500").get_json()
+    assert reused["id"] not in [a["animal_id"] for a in daily["animals"]]
@@ -0,0 +1,65 @@
+import threading
+from datetime import datetime, timedelta
+
+from trackstore import CHUNK_SECONDS, chunk_start, decode_fixes, encode_fixes, from_epoch, to_epoch, to_micro
+
+
+def test_chunks_round_trip_and_append_after_their_last_fix():
+    fixes = [(1700000000 + 30 * n, to_micro(-1.2921 + n * 1e-5), to_micro(36.8219 - n * 1e-5)) for n in range(100)]
+    data = encode_fixes(fixes[:60]) + encode_fixes(fixes[60:], last=fixes[59])
+    decoded = list(decode_fixes(data))
+    assert [(ts, to_micro(lat), to_micro(lng)) for ts, lat, lng in decoded] == fixes
+    assert len(encode_fixes(fixes[1:], last=fixes[0])) <= 6 * 99
+
+
+def test_decode_filters_to_the_requested_window():
+    fixes = [(ts, 0, 0) for ts in (100, 200, 300, 400)]
+    assert [f[0] for f in decode_fixes(encode_fixes(fixes), start=200, end=300)] == [200, 300]
+
+
+def test_history_spans_chunks_and_honours_the_window(client, make_animal):
+    animal = make_animal()
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(seconds=2 * CHUNK_SECONDS)
+    stamps = [start + timedelta(seconds=CHUNK_SECONDS // 4 * n) for n in range(8)]
+    for n, stamp in enumerate(stamps):
+        client.post("/api/gps", json={"device_id": animal["device_id"], "lat": animal["lat"] + n * 1e-4,
+                                      "lng": animal["lng"], "timestamp": stamp.isoformat()})
+
+    url = f"/api/animals/{animal['id']}/positions"
+    body = client.get(f"{url}?start={stamps[0].isoformat()}&end={stamps[-1].isoformat()}").get_json()
+    assert [p["timestamp"] for p in body["positions"]] == [s.isoformat() for s in stamps]
+    assert body["positions"][3]["lat"] == round(animal["lat"] + 3e-4, 6)
+
+    window = client.get(f"{url}?start={stamps[2].isoformat()}&end={stamps[5].isoformat()}").get_json()
+    assert window["total_points"] == 4
+    assert client.get(f"{url}?start=yesterday").status_code == 400
+
+
+def test_concurrent_appends_for_one_animal_keep_every_fix(tracker_app, make_animal):
+    animal = make_animal()
+    start = from_epoch(chunk_start(to_epoch(datetime(2026, 3, 2, 12))))
+    writers, per_writer = 6, 20
+    barrier = threading.Barrier(writers)
+
+    def write(n):
+        fixes = [(animal["id"], start + timedelta(seconds=writers * k + n), animal["lat"] + n * 1e-5, animal["lng"], "IN")
+                 for k in range(per_writer)]
+        with tracker_app.app.app_context():
+            barrier.wait()
+            tracker_app.append_positions(fixes)
+            tracker_app.record_movement(fixes)
+            tracker_app.db.session.commit()
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with tracker_app.app.app_context():
+        chunks = tracker_app.PositionChunk.query.filter_by(animal_id=animal["id"]).all()
+        stats = tracker_app.AnimalDayStats.query.filter_by(animal_id=animal["id"]).all()
+        decoded = [fix for chunk in chunks for fix in decode_fixes(chunk.data)]
+    assert sum(chunk.count for chunk in chunks) == len(decoded) == writers * per_writer
+    assert sorted(ts for ts, _, _ in decoded) == [to_epoch(start) + k for k in range(writers * per_writer)]
+    assert sum(row.fixes for row in stats) == writers * per_writer
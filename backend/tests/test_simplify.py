@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from simplify import simplify_indices, simplify_track, tolerance_for_zoom
+
+# A zig-zag walk: 200 points, corners every 20 points about 100 m apart
+STEPS = np.arange(200)
+LATS = -1.29 + (STEPS % 40 < 20) * (STEPS % 20) * 5e-5 + (STEPS % 40 >= 20) * (20 - STEPS % 20) * 5e-5
+LNGS = 36.82 + STEPS * 1e-5
+
+
+def test_straight_runs_collapse_to_their_corners():
+    keep = simplify_indices(LATS, LNGS, tolerance_m=1)
+    assert keep[0] == 0 and keep[-1] == 199
+    assert set(range(0, 200, 20)) <= set(keep)
+    assert len(keep) <= 12
+
+
+def test_point_budget_keeps_the_endpoints_and_the_largest_deviations():
+    keep = simplify_indices(LATS, LNGS, max_points=5)
+    assert len(keep) == 5
+    assert keep == sorted(keep) and keep[0] == 0 and keep[-1] == 199
+
+
+def test_lower_zooms_keep_fewer_points():
+    assert tolerance_for_zoom(10) > tolerance_for_zoom(18)
+    assert len(simplify_track(LATS, LNGS, zoom=12)) <= len(simplify_track(LATS, LNGS, zoom=20))
+    assert simplify_track(LATS[:2], LNGS[:2], zoom=5) == [0, 1]
+
+
+def test_history_endpoint_simplifies_on_request(client, make_animal):
+    animal = make_animal()
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(hours=2)
+    for n in range(40):
+        client.post("/api/gps", json={"device_id": animal["device_id"], "lat": float(LATS[n]),
+                                      "lng": float(LNGS[n]), "timestamp": (start + timedelta(minutes=n)).isoformat()})
+
+    url = f"/api/animals/{animal['id']}/positions?start={start.isoformat()}"
+    body = client.get(f"{url}&max_points=4").get_json()
+    assert body["total_points"] == 40
+    assert len(body["positions"]) == 4
+    assert len(client.get(url).get_json()["positions"]) == 40
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from trackstore import to_epoch
+
+
+def simulate(tracker_app, animal, mode, steps=10, step_seconds=60):
+    with tracker_app.app.app_context():
+        summary = tracker_app.simulate_herd(steps, step_seconds, seed=1, mode=mode, device_prefix=animal["device_id"])
+        fixes = list(tracker_app.read_positions(animal["id"], 0, 2 ** 31))
+        last_seen = tracker_app.db.session.get(tracker_app.Animal, animal["id"]).last_seen
+    return summary, [ts for ts, lat, lng in fixes], last_seen
+
+
+@pytest.mark.parametrize("mode", ["bulk", "ingest"])
+def test_run_ends_now_and_starts_after_the_newest_fix(client, tracker_app, make_animal, mode):
+    animal = make_animal()
+    newest = datetime.utcnow() - timedelta(minutes=2, seconds=30)
+    client.post("/api/gps", json={"device_id": animal["device_id"], "lat": animal["lat"], "lng": animal["lng"],
+                                  "timestamp": newest.isoformat()})
+
+    summary, stamps, last_seen = simulate(tracker_app, animal, mode)
+    now = datetime.utcnow()
+    assert summary["steps"] == 3
+    simulated = stamps[1:]
+    assert len(simulated) == summary["steps"]
+    assert all(to_epoch(newest) < ts <= to_epoch(now) for ts in simulated)
+    assert last_seen <= now
+
+
+@pytest.mark.parametrize("mode", ["bulk", "ingest"])
+def test_herd_seen_just_now_is_not_moved_into_the_future(client, tracker_app, make_animal, mode):
+    animal = make_animal()
+    client.post("/api/gps", json={"device_id": animal["device_id"], "lat": animal["lat"], "lng": animal["lng"]})
+
+    summary, stamps, last_seen = simulate(tracker_app, animal, mode)
+    assert summary["steps"] == 0
+    assert len(stamps) == 1
+    assert last_seen <= datetime.utcnow()
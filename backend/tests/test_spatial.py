@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from geofence import haversine_km
+from spatial import ClusterIndex, PointIndex, cluster_cell_deg
+
+ZOOM = 10
+SIZE = cluster_cell_deg(ZOOM)
+
+
+def shown(index, zoom=ZOOM, box=(-1, -1, 1, 1)):
+    clusters, points = index.clusters(zoom, *box)
+    return [(count, out) for lat, lng, count, out, key in clusters], sorted(p[0] for p in points)
+
+
+def test_radius_and_nearest_queries_only_return_matching_points():
+    index = PointIndex()
+    index.upsert(1, 0.0, 0.0)
+    index.upsert(2, 0.0005, 0.0)
+    index.upsert(3, 0.5, 0.5)
+    assert sorted(p[0] for p in index.within_bbox(-0.001, -0.001, 0.001, 0.001)) == [1, 2]
+    assert [p[1] for p in index.nearest(0.0004, 0.0, 2)] == [2, 1]
+
+
+def test_lone_point_on_a_shared_cell_edge_is_returned_once():
+    index = ClusterIndex()
+    index.upsert(1, SIZE, 0.01)  # on the edge between rows 0 and 1
+    index.upsert(2, SIZE / 2, 0.01)
+    assert shown(index) == ([], [1, 2])
+
+
+def test_clusters_follow_moves_and_removals():
+    index = ClusterIndex()
+    index.upsert(1, 0.01, 0.01, {"status": "OUT"})
+    index.upsert(2, 0.02, 0.02, {"status": "IN"})
+    index.upsert(3, 0.5, 0.5)
+    assert shown(index) == ([(2, 1)], [3])
+
+    index.upsert(1, 0.49, 0.49, {"status": "OUT"})
+    assert shown(index) == ([(2, 1)], [2])
+
+    index.remove(3)
+    clusters, points = index.clusters(ZOOM, -1, -1, 1, 1)
+    assert clusters == []
+    assert sorted((p[0], p[3]) for p in points) == [(1, {"status": "OUT"}), (2, {"status": "IN"})]
+
+
+def test_grid_queries_match_a_brute_force_scan():
+    rng = random.Random(3)
+    index = PointIndex()
+    points = {n: (rng.uniform(-1.30, -1.28), rng.uniform(36.81, 36.83)) for n in range(500)}
+    for n, (lat, lng) in points.items():
+        index.upsert(n, lat, lng)
+    for n in range(0, 500, 5):
+        index.remove(n)
+        del points[n]
+
+    lat, lng = -1.291, 36.821
+    distances = sorted((haversine_km(lat, lng, *p), n) for n, p in points.items())
+    assert [r[1] for r in index.within_radius(lat, lng, 0.4)] == [n for d, n in distances if d <= 0.4]
+    assert [r[1] for r in index.nearest(lat, lng, 7)] == [n for d, n in distances[:7]]
+    assert [r[1] for r in index.nearest(lat, lng, 7, exclude=distances[0][1])] == [n for d, n in distances[1:8]]
+    assert index.nearest(-1.0, 37.5, 3, max_km=1) == []
+
+
+def test_spatial_endpoints_follow_fixes_and_deletions(client, make_animal):
+    herd = [make_animal() for _ in range(3)]
+    # An empty corner of the map, ~0 m, ~55 m and ~330 m from the first animal
+    for animal, offset in zip(herd, (0, 0.0005, 0.003)):
+        client.post("/api/gps", json={"device_id": animal["device_id"], "lat": 30 + offset, "lng": 30})
+    ids = [a["id"] for a in herd]
+
+    nearby = client.get("/api/animals/nearby?lat=30&lng=30&radius_m=100").get_json()
+    assert [a["id"] for a in nearby["animals"]] == ids[:2]
+    assert nearby["animals"][1]["distance_m"] == pytest.approx(55.6, abs=0.5)
+
+    nearest = client.get(f"/api/animals/nearest?animal_id={ids[0]}&k=2").get_json()
+    assert [a["id"] for a in nearest["animals"]] == ids[1:]
+
+    within = client.get("/api/animals/within?min_lat=29.9&min_lng=29.9&max_lat=30.001&max_lng=30.1").get_json()
+    assert sorted(a["id"] for a in within["animals"]) == ids[:2]
+
+    client.delete(f"/api/animals/{ids[1]}")
+    assert [a["id"] for a in client.get("/api/animals/nearby?lat=30&lng=30&radius_m=100").get_json()["animals"]] \
+        == ids[:1]
+    assert client.get("/api/animals/nearby?lat=95&lng=30").status_code == 400
+    assert client.get("/api/animals/nearest?animal_id=999999").status_code == 404
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Index, Integer, MetaData, Table, create_engine, inspect, text
+
+from storage import engine_options, ensure_indexes, tune_engine
+
+
+def test_pool_options_depend_on_the_backend():
+    assert engine_options("sqlite://") == {}
+    assert engine_options("sqlite:///:memory:") == {}
+    assert "pool_pre_ping" not in engine_options("sqlite:////tmp/tracker.db")
+    server = engine_options("postgresql://farm@db/tracker")
+    assert server["pool_pre_ping"] and server["pool_size"] + server["max_overflow"] == 32
+
+
+def test_every_sqlite_connection_gets_the_profile(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tuned.db'}")
+    tune_engine(engine, {"busy_timeout": 1234})
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+
+
+def test_missing_indexes_are_created_on_existing_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE tracking (id INTEGER PRIMARY KEY, animal_id INTEGER, timestamp TEXT)"))
+        conn.execute(text("CREATE TABLE history (id INTEGER PRIMARY KEY, animal_id INTEGER)"))
+        conn.execute(text("CREATE TABLE alert (id INTEGER PRIMARY KEY, is_read BOOLEAN)"))
+
+    metadata = MetaData()
+    alert = Table("alert", metadata, Column("id", Integer, primary_key=True), Column("is_read", Integer))
+    Index("ix_alert_unread", alert.c.is_read, alert.c.id)
+
+    ensure_indexes(engine, metadata)
+    ensure_indexes(engine, metadata)  # idempotent
+    inspector = inspect(engine)
+    assert [i["name"] for i in inspector.get_indexes("alert")] == ["ix_alert_unread"]
+    assert [i["name"] for i in inspector.get_indexes("tracking")] == ["ix_tracking_animal_time"]
+    # history lacks the columns its indexes need, so it is left alone
+    assert inspector.get_indexes("history") == []
@@ -0,0 +1,124 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from ingest_queue import ACK_AFTER_ENQUEUE, ACK_AFTER_FLUSH, QueueFull, WriteBehindQueue
+
+
+@pytest.fixture
+def write_behind(tracker_app, monkeypatch):
+    """Switch the app to write-behind ingest; yields a function to set the durability mode"""
+    queue = WriteBehindQueue(tracker_app.flush_fixes, max_size=100, flush_interval=0.01)
+    queue.start()
+    monkeypatch.setattr(tracker_app, "write_behind", queue)
+    monkeypatch.setattr(tracker_app, "INGEST_DURABILITY", ACK_AFTER_FLUSH)
+
+    def durability(mode):
+        monkeypatch.setattr(tracker_app, "INGEST_DURABILITY", mode)
+        return queue
+
+    yield durability
+    queue.stop()
+
+
+def wait_committed(client, status_url):
+    for _ in range(200):
+        body = client.get(status_url).get_json()
+        if body["status"] != "pending":
+            return body
+        time.sleep(0.01)
+    raise AssertionError("fixes never committed")
+
+
+def fix_for(animal, **fields):
+    return dict({"device_id": animal["device_id"], "lat": animal["lat"], "lng": animal["lng"]}, **fields)
+
+
+def test_queue_commits_submissions_in_order_as_one_group():
+    flushed = []
+    queue = WriteBehindQueue(lambda fixes: flushed.append(list(fixes)) or [{"success": True} for _ in fixes],
+                             flush_interval=0.05)
+    tickets = [queue.submit([n]) for n in range(5)]
+    queue.start()
+    assert all(t.wait(2) for t in tickets)
+    queue.stop()
+    assert flushed == [[0, 1, 2, 3, 4]]
+    assert queue.ticket(tickets[0].token).results == [{"success": True}]
+
+
+def test_queue_rejects_fixes_past_its_bound():
+    queue = WriteBehindQueue(lambda fixes: [], max_size=2)
+    queue.submit([1, 2])
+    with pytest.raises(QueueFull):
+        queue.submit([3])
+    assert queue.stats()["rejected"] == 1
+
+
+def test_flush_mode_answers_with_the_committed_result(client, make_animal, write_behind):
+    animal = make_animal()
+    response = client.post("/api/gps", json=fix_for(animal))
+    assert response.status_code == 200
+    assert response.get_json()["animal"]["status"] == "IN"
+
+
+def test_enqueue_mode_answers_202_with_a_token_that_reports_the_outcome(client, make_animal, write_behind):
+    write_behind(ACK_AFTER_ENQUEUE)
+    animal = make_animal()
+    response = client.post("/api/gps", json=fix_for(animal))
+    assert response.status_code == 202
+    body = wait_committed(client, response.get_json()["status_url"])
+    assert body["status"] == "committed"
+    assert body["results"][0]["animal_id"] == animal["id"]
+
+
+def test_stale_fixes_get_409_in_both_durability_modes(client, make_animal, write_behind):
+    animal = make_animal()
+    now = datetime.utcnow()
+    assert client.post("/api/gps", json=fix_for(animal, timestamp=now.isoformat())).status_code == 200
+
+    stale = fix_for(animal, timestamp=(now - timedelta(minutes=1)).isoformat())
+    assert client.post("/api/gps", json=stale).status_code == 409
+    write_behind(ACK_AFTER_ENQUEUE)
+    assert client.post("/api/gps", json=stale).status_code == 409
+
+    body = client.post("/api/gps/batch", json={"fixes": [stale]}).get_json()
+    assert body["results"][0]["message"] == "Stale fix ignored"
+
+
+def test_slow_flush_answers_202_and_commits_once(client, tracker_app, make_animal, write_behind, monkeypatch):
+    queue = write_behind(ACK_AFTER_FLUSH)
+    release = threading.Event()
+    flush = queue.flush_fn
+
+    def slow_flush(fixes):
+        release.wait(5)
+        return flush(fixes)
+
+    monkeypatch.setattr(queue, "flush_fn", slow_flush)
+    monkeypatch.setattr(tracker_app, "INGEST_FLUSH_TIMEOUT", 0.05)
+    animal = make_animal()
+
+    response = client.post("/api/gps", json=fix_for(animal))
+    assert response.status_code == 202
+    token = response.get_json()["token"]
+    assert client.get(f"/api/gps/queue/{token}").get_json()["status"] == "pending"
+
+    release.set()
+    assert wait_committed(client, f"/api/gps/queue/{token}")["status"] == "committed"
+    with tracker_app.app.app_context():
+        positions = list(tracker_app.read_positions(animal["id"], 0, 2 ** 31))
+    assert len(positions) == 1
+
+
+def test_full_queue_answers_503(client, make_animal, write_behind, monkeypatch):
+    queue = write_behind(ACK_AFTER_ENQUEUE)
+    monkeypatch.setattr(queue, "max_size", 0)
+    response = client.post("/api/gps", json=fix_for(make_animal()))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_unknown_tokens_are_404(client, write_behind):
+    assert client.get("/api/gps/queue/nope").status_code == 404
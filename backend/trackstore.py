@@ -0,0 +1,75 @@
+"""Compact encoding for the per-animal position history.
+
+Fixes are grouped into time-partitioned chunks (one row per animal per
+CHUNK_SECONDS). Inside a chunk each fix is stored as three zigzag varints:
+the deltas of timestamp (seconds), latitude and longitude (micro-degrees,
+~0.1 m) from the previous fix. A collar moving a few metres a minute costs
+4-6 bytes per fix instead of a full row of floats, and appending only needs
+the chunk's last fix, which is kept on the chunk row.
+"""
+import calendar
+from datetime import datetime
+
+CHUNK_SECONDS = 6 * 3600
+COORD_SCALE = 1000000
+
+
+def to_epoch(dt):
+    return calendar.timegm(dt.utctimetuple())
+
+
+def from_epoch(ts):
+    return datetime.utcfromtimestamp(ts)
+
+
+def chunk_start(ts):
+    return ts - ts % CHUNK_SECONDS
+
+
+def to_micro(coord):
+    return int(round(coord * COORD_SCALE))
+
+
+def _write_varint(out, value):
+    value = (value << 1) ^ (value >> 63)  # zigzag: small negatives stay small
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_fixes(fixes, last=None):
+    """Encode (ts, lat_micro, lng_micro) tuples following ``last``.
+
+    ``last`` is the previous fix in the chunk, or None for a new chunk, in
+    which case the first fix is stored relative to zero.
+    """
+    out = bytearray()
+    prev_ts, prev_lat, prev_lng = last or (0, 0, 0)
+    for ts, lat, lng in fixes:
+        _write_varint(out, ts - prev_ts)
+        _write_varint(out, lat - prev_lat)
+        _write_varint(out, lng - prev_lng)
+        prev_ts, prev_lat, prev_lng = ts, lat, lng
+    return bytes(out)
+
+
+def decode_fixes(data, start=None, end=None):
+    """Yield (ts, lat, lng) from an encoded chunk, optionally within [start, end]"""
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append((value >> 1) ^ -(value & 1))
+        value = shift = 0
+
+    ts = lat = lng = 0
+    for i in range(0, len(values), 3):
+        ts += values[i]
+        lat += values[i + 1]
+        lng += values[i + 2]
+        if (start is None or ts >= start) and (end is None or ts <= end):
+            yield ts, lat / COORD_SCALE, lng / COORD_SCALE
@@ -28,6 +28,16 @@ export default function AlertPanel({ alerts = [], onRefresh }) {
     }
   };
 
+  const markAllAsRead = async () => {
+    try {
+      // Alerts are newest first, so the first id covers everything shown
+      await api.post('/alerts/read', { up_to: alerts[0].id });
+      onRefresh();
+    } catch (error) {
+      console.error('Failed to mark alerts as read:', error);
+    }
+  };
+
   const getAlertColor = (alertType) => {
     switch (alertType) {
       case 'EXIT': return 'border-red-500 bg-red-50';
@@ -120,6 +130,12 @@ export default function AlertPanel({ alerts = [], onRefresh }) {
           >
             View on Map
           </button>
+          <button
+            onClick={markAllAsRead}
+            className="w-full mt-2 bg-gray-200 text-gray-700 py-2 rounded-lg text-sm hover:bg-gray-300"
+          >
+            Mark All as Read
+          </button>
         </div>
       )}
     </div>
@@ -3,6 +3,15 @@ import MapView from './MapView';
 import AlertPanel from './AlertPanel';
 import BluetoothScanner from './BluetoothScanner';
 import api from '../services/api';
+import { subscribe, streamSupported } from '../services/stream';
+
+// With the live stream, polling is only a safety net for missed events
+const POLL_INTERVAL = streamSupported ? 30000 : 3000;
+
+const mergeById = (items, deltas) => {
+  const byId = new Map(deltas.map(d => [d.id, d]));
+  return items.map(item => (byId.has(item.id) ? { ...item, ...byId.get(item.id) } : item));
+};
 
 export default function Dashboard() {
   const [animals, setAnimals] = useState([]);
@@ -25,8 +34,20 @@ export default function Dashboard() {
       setUser(demoUser);
     }
     fetchData();
-    const interval = setInterval(fetchData, 3000);
-    return () => clearInterval(interval);
+    const interval = setInterval(fetchData, POLL_INTERVAL);
+    const unsubscribers = [
+      subscribe('open', fetchData),
+      subscribe('herd', fetchData),
+      subscribe('positions', (deltas) => setAnimals(prev => mergeById(prev, deltas))),
+      subscribe('alerts', (newAlerts) => setAlerts(prev => [...[...newAlerts].reverse(), ...prev])),
+      subscribe('alerts_read', ({ ids, up_to, alert_type }) => setAlerts(prev => prev.filter(a =>
+        !ids.includes(a.id) && !(up_to && a.id <= up_to && (!alert_type || a.alert_type === alert_type))
+      ))),
+    ];
+    return () => {
+      clearInterval(interval);
+      unsubscribers.forEach(unsubscribe => unsubscribe());
+    };
   }, []);
 
   const fetchData = async () => {
@@ -1,6 +1,7 @@
-import { useState, useEffect } from 'react';
-import { MapContainer, TileLayer, Circle, Marker, Popup } from 'react-leaflet';
+import { useState, useEffect, useCallback, useRef } from 'react';
+import { MapContainer, TileLayer, Circle, Marker, Popup, useMap, useMapEvents } from 'react-leaflet';
 import L from 'leaflet';
+import api from '../services/api';
 
 // Fix for default marker icons in React-Leaflet
 delete L.Icon.Default.prototype._getIconUrl;
@@ -33,6 +34,92 @@ const outsideIcon = new L.Icon({
 const DEFAULT_CENTER = [-1.2921, 36.8219];
 const FARM_RADIUS = 500; // meters
 
+// Larger herds are clustered by the server, for the visible area only
+const CLUSTER_THRESHOLD = 300;
+// Positions stream in continuously; re-fetch clusters at most this often
+const CLUSTER_REFRESH_MS = 2000;
+
+const clusterIcon = (count, outCount) => {
+  const size = count < 100 ? 34 : count < 1000 ? 42 : 50;
+  const color = outCount > 0 ? '#dc2626' : '#16a34a';
+  return L.divIcon({
+    html: `<div style="width:${size}px;height:${size}px;line-height:${size}px;border-radius:50%;background:${color};opacity:0.85;color:white;font-weight:bold;text-align:center;border:2px solid white">${count}</div>`,
+    className: '',
+    iconSize: [size, size],
+  });
+};
+
+function AnimalMarker({ animal }) {
+  const isInside = animal.status === 'IN';
+
+  return (
+    <Marker
+      position={[animal.lat, animal.lng]}
+      icon={isInside ? insideIcon : outsideIcon}
+    >
+      <Popup>
+        <div className="text-center">
+          <h3 className="font-bold text-lg">{animal.name}</h3>
+          <p className="text-sm">{animal.species}</p>
+          <p className="text-sm font-mono mt-1">{animal.device_id}</p>
+          <p className={`text-sm font-bold mt-2 ${isInside ? 'text-green-600' : 'text-red-600'}`}>
+            {isInside ? '✅ Inside Farm' : '🚨 Outside Farm!'}
+          </p>
+          <p className="text-xs text-gray-500 mt-1">
+            {animal.lat?.toFixed(4)}, {animal.lng?.toFixed(4)}
+          </p>
+        </div>
+      </Popup>
+    </Marker>
+  );
+}
+
+function ClusterLayer({ animals }) {
+  const map = useMap();
+  const [features, setFeatures] = useState([]);
+  const lastFetch = useRef(0);
+
+  const fetchClusters = useCallback(async () => {
+    lastFetch.current = Date.now();
+    const bounds = map.getBounds().pad(0.2);
+    const bbox = [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()]
+      .map(v => v.toFixed(6))
+      .join(',');
+    try {
+      const res = await api.get('/map/clusters', { params: { zoom: map.getZoom(), bbox } });
+      setFeatures(res.data.features);
+    } catch (error) {
+      console.error('Error fetching clusters:', error);
+    }
+  }, [map]);
+
+  useMapEvents({ moveend: fetchClusters });
+
+  useEffect(() => {
+    const wait = Math.max(0, lastFetch.current + CLUSTER_REFRESH_MS - Date.now());
+    const timer = setTimeout(fetchClusters, wait);
+    return () => clearTimeout(timer);
+  }, [animals, fetchClusters]);
+
+  return features.map((feature) => {
+    const [lng, lat] = feature.geometry.coordinates;
+    const props = feature.properties;
+    if (!props.cluster) {
+      return <AnimalMarker key={props.id} animal={{ ...props, lat, lng }} />;
+    }
+    return (
+      <Marker
+        key={props.cluster_id}
+        position={[lat, lng]}
+        icon={clusterIcon(props.point_count, props.out_count)}
+        eventHandlers={{
+          click: () => map.setView([lat, lng], Math.min(map.getZoom() + 2, map.getMaxZoom())),
+        }}
+      />
+    );
+  });
+}
+
 export default function MapView({ animals = [] }) {
   const [geofence, setGeofence] = useState({ lat: -1.2921, lng: 36.8219, radius: 0.5 });
 
@@ -79,33 +166,13 @@ export default function MapView({ animals = [] }) {
         </Marker>
         
         {/* Animal markers */}
-        {animals.map((animal) => {
-          if (!animal.lat || !animal.lng) return null;
-          
-          const isInside = animal.status === 'IN';
-          
-          return (
-            <Marker
-              key={animal.id}
-              position={[animal.lat, animal.lng]}
-              icon={isInside ? insideIcon : outsideIcon}
-            >
-              <Popup>
-                <div className="text-center">
-                  <h3 className="font-bold text-lg">{animal.name}</h3>
-                  <p className="text-sm">{animal.species}</p>
-                  <p className="text-sm font-mono mt-1">{animal.device_id}</p>
-                  <p className={`text-sm font-bold mt-2 ${isInside ? 'text-green-600' : 'text-red-600'}`}>
-                    {isInside ? '✅ Inside Farm' : '🚨 Outside Farm!'}
-                  </p>
-                  <p className="text-xs text-gray-500 mt-1">
-                    {animal.lat?.toFixed(4)}, {animal.lng?.toFixed(4)}
-                  </p>
-                </div>
-              </Popup>
-            </Marker>
-          );
-        })}
+        {animals.length > CLUSTER_THRESHOLD ? (
+          <ClusterLayer animals={animals} />
+        ) : (
+          animals.map((animal) => (
+            animal.lat && animal.lng ? <AnimalMarker key={animal.id} animal={animal} /> : null
+          ))
+        )}
       </MapContainer>
       
       {/* Legend */}
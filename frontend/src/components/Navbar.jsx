@@ -1,6 +1,7 @@
 import { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { trackingAPI } from '../services/api';
+import { subscribe, streamSupported } from '../services/stream';
 
 export default function Navbar({ user, onLogout }) {
   const [alertCount, setAlertCount] = useState(0);
@@ -8,14 +9,25 @@ export default function Navbar({ user, onLogout }) {
 
   useEffect(() => {
     fetchAlertCount();
-    const interval = setInterval(fetchAlertCount, 5000);
-    return () => clearInterval(interval);
+    const interval = setInterval(fetchAlertCount, streamSupported ? 30000 : 5000);
+    const unsubscribers = [
+      subscribe('open', fetchAlertCount),
+      subscribe('alerts', (newAlerts) => setAlertCount(count => count + newAlerts.length)),
+      subscribe('alerts_read', ({ ids, up_to }) => {
+        if (up_to) fetchAlertCount();
+        else setAlertCount(count => Math.max(0, count - ids.length));
+      }),
+    ];
+    return () => {
+      clearInterval(interval);
+      unsubscribers.forEach(unsubscribe => unsubscribe());
+    };
   }, []);
 
   const fetchAlertCount = async () => {
     try {
-      const res = await trackingAPI.getAlerts();
-      setAlertCount(res.data.length);
+      const res = await trackingAPI.getAlertSummary();
+      setAlertCount(res.data.unread);
     } catch (error) {
       // Ignore errors
     }
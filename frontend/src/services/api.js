@@ -1,6 +1,6 @@
 import axios from 'axios';
 
-const API_URL = 'https://animal-tracker-v1.onrender.com/api';
+export const API_URL = 'https://animal-tracker-v1.onrender.com/api';
 
 // Create axios instance
 const api = axios.create({
@@ -25,16 +25,20 @@ export const animalsAPI = {
   create: (data) => api.post('/animals', data),
   update: (id, data) => api.put(`/animals/${id}`, data),
   delete: (id) => api.delete(`/animals/${id}`),
+  getPositions: (id, params) => api.get(`/animals/${id}/positions`, { params }),
 };
 
 // ============ TRACKING API ============
 export const trackingAPI = {
   // Hardware sends GPS data here
   updateGPS: (data) => api.post('/gps', data),
+  updateGPSBatch: (fixes) => api.post('/gps/batch', { fixes }),
   
   // Get alerts
   getAlerts: () => api.get('/alerts'),
+  getAlertSummary: () => api.get('/alerts/summary'),
   markAlertRead: (id) => api.post(`/alerts/${id}/read`),
+  acknowledgeAlerts: (upTo, alertType) => api.post('/alerts/read', { up_to: upTo, alert_type: alertType }),
   
   // Geofence
   getGeofence: () => api.get('/geofence'),
@@ -48,6 +52,10 @@ export const trackingAPI = {
 export const geofenceAPI = {
   get: () => api.get('/geofence'),
   set: (data) => api.post('/geofence', data),
+  getZones: () => api.get('/geofence/zones'),
+  createZone: (data) => api.post('/geofence/zones', data),
+  deleteZone: (id) => api.delete(`/geofence/zones/${id}`),
+  lookup: (lat, lng) => api.get('/geofence/lookup', { params: { lat, lng } }),
 };
 
 // ============ HEALTH API ============
@@ -0,0 +1,46 @@
+import { API_URL } from './api';
+
+// One shared EventSource per tab; components subscribe to named events on it
+let source = null;
+const listeners = {};
+// A refused stream (503 when the server is at its stream cap) is not retried by the browser
+const RETRY_MS = 30000;
+
+const hasListeners = () => Object.values(listeners).some(list => list.length > 0);
+
+const dispatch = (event, data) => {
+  (listeners[event] || []).forEach(handler => handler(data));
+};
+
+const connect = () => {
+  source = new EventSource(`${API_URL}/stream`);
+  // Fired on first connect and on every reconnect: subscribers resync then
+  source.onopen = () => dispatch('open');
+  source.onerror = () => {
+    if (source && source.readyState === EventSource.CLOSED) {
+      source = null;
+      setTimeout(() => {
+        if (!source && hasListeners()) connect();
+      }, RETRY_MS);
+    }
+  };
+  ['positions', 'alerts', 'alerts_read', 'herd'].forEach(event => {
+    source.addEventListener(event, (e) => dispatch(event, JSON.parse(e.data)));
+  });
+};
+
+export const streamSupported = typeof window !== 'undefined' && 'EventSource' in window;
+
+// Returns an unsubscribe function
+export const subscribe = (event, handler) => {
+  if (!streamSupported) return () => {};
+  if (!source) connect();
+  listeners[event] = [...(listeners[event] || []), handler];
+  return () => {
+    listeners[event] = listeners[event].filter(h => h !== handler);
+    if (!hasListeners() && source) {
+      source.close();
+      source = null;
+    }
+  };
+};
@@ -16,6 +16,9 @@ import type {
 class ApiService {
   private client: AxiosInstance;
   private token: string | null = null;
+  // Local copy of the herd kept current with ?since=<version> delta sync
+  private herd = new Map<number, Animal>();
+  private herdVersion: number | null = null;
 
   constructor() {
     this.client = axios.create({
@@ -76,14 +79,31 @@ class ApiService {
 
   logout() {
     this.setToken(null);
+    this.herd.clear();
+    this.herdVersion = null;
   }
 
   // ==================== ANIMALS ====================
 
   async getAnimals(): Promise<Animal[]> {
     try {
-      const response = await this.client.get('/api/animals');
-      return response.data;
+      if (this.herdVersion === null) {
+        const response = await this.client.get('/api/animals');
+        this.herd = new Map(response.data.map((a: Animal) => [a.id, a]));
+        this.herdVersion = Number(response.headers['x-herd-version']);
+        return response.data;
+      }
+
+      const response = await this.client.get('/api/animals', {
+        params: { since: this.herdVersion },
+        validateStatus: (status) => status === 200 || status === 304,
+      });
+      if (response.status === 200) {
+        response.data.deleted.forEach((id: number) => this.herd.delete(id));
+        response.data.animals.forEach((a: Animal) => this.herd.set(a.id, a));
+        this.herdVersion = response.data.version;
+      }
+      return Array.from(this.herd.values());
     } catch (error: any) {
       if (error.response?.data) {
         return [];